@@ -0,0 +1,153 @@
+"""Excel 年間出力のベンチマーク（通常の Workbook vs write-only）
+
+一時的な SQLite に従業員とシフトを作り、1年分（12シート＋集計）の Excel を
+それぞれ別プロセスで作って、処理時間とピークメモリ（RSS）を比べる。
+
+    python benchmarks/excel_export.py --employees 500
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+
+def peak_rss_kb():
+    """このプロセスのピークメモリ（KB）。Linux では exec 後の値を /proc から読む"""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def setup_django(db_path):
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shift_manager.settings')
+    import django
+    django.setup()
+
+
+def prepare(db_path, num_employees, year, fill=0.65):
+    """ベンチマーク用のデータを作る"""
+    setup_django(db_path)
+    from django.core.management import call_command
+    from shifts.exports import date_range
+    from shifts.models import SHIFT_TIMES, Employee, Shift
+
+    call_command('migrate', verbosity=0)
+    rng = random.Random(0)
+    roles = [role for role, _ in Employee.ROLE_CHOICES]
+    employees = Employee.objects.bulk_create([
+        Employee(name=f"従業員{i}", role=rng.choice(roles), hourly_rate=rng.randint(1000, 1500))
+        for i in range(num_employees)
+    ])
+    days = date_range(date(year, 1, 1), date(year, 12, 31))
+    shifts = [
+        Shift(employee=emp, date=d, time_range=rng.choice(SHIFT_TIMES)).fill_times()
+        for emp in employees for d in days if rng.random() < fill
+    ]
+    Shift.objects.bulk_create(shifts, batch_size=2000)
+    return len(shifts)
+
+
+def naive_workbook(year):
+    """現在の月次出力をそのまま12か月＋集計に広げた場合（比較用）"""
+    import calendar
+
+    import openpyxl
+    from shifts.exports import WEEK_NAMES
+    from shifts.models import Employee
+
+    employees = sorted(Employee.objects.all(), key=lambda e: e.role_order())
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    totals = {emp.id: 0 for emp in employees}
+    for month in range(1, 13):
+        ws = wb.create_sheet(f"{month}月")
+        month_days = [date(year, month, d) for d in range(1, calendar.monthrange(year, month)[1] + 1)]
+        ws.append(["名前", "役職"] + [f"{d.day}日({WEEK_NAMES[d.weekday()]})" for d in month_days])
+        for emp in employees:
+            emp_shifts = {s.date: s for s in emp.shifts.filter(date__month=month, date__year=year)}
+            ws.append([emp.name, emp.get_role_display()] + [
+                emp_shifts[d].time_range if d in emp_shifts else "休" for d in month_days
+            ])
+            totals[emp.id] += sum(s.duration_minutes for s in emp_shifts.values())
+    ws = wb.create_sheet("集計")
+    ws.append(["名前", "役職", "勤務時間", "給与"])
+    for emp in employees:
+        hours = totals[emp.id] / 60
+        ws.append([emp.name, emp.get_role_display(), hours, int(round(hours * float(emp.hourly_rate or 0)))])
+    return wb
+
+
+def run(db_path, mode, year):
+    """1つのモードを実行して結果を JSON で出力する（子プロセス用）"""
+    import io
+
+    setup_django(db_path)
+    from shifts.exports import date_range, shift_workbook
+
+    import openpyxl  # noqa: F401  ライブラリ自体の読み込みは計測に含めない
+
+    before = peak_rss_kb()
+    start = time.perf_counter()
+    if mode == 'naive':
+        wb = naive_workbook(year)
+    else:
+        wb = shift_workbook(date_range(date(year, 1, 1), date(year, 12, 31)), summary=True)
+    buf = io.BytesIO()
+    wb.save(buf)
+    elapsed = time.perf_counter() - start
+    peak = peak_rss_kb()
+    print(json.dumps({
+        'mode': mode,
+        'seconds': round(elapsed, 2),
+        'peak_rss_mb': round(peak / 1024, 1),
+        'added_rss_mb': round((peak - before) / 1024, 1),
+        'size_kb': round(len(buf.getvalue()) / 1024),
+    }))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--employees', type=int, default=500)
+    parser.add_argument('--year', type=int, default=2025)
+    parser.add_argument('--run', choices=['prepare', 'naive', 'write_only'], help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run == 'prepare':
+        count = prepare(args.db, args.employees, args.year)
+        print(f"employees={args.employees} shifts={count} year={args.year}")
+        return
+    if args.run:
+        run(args.db, args.run, args.year)
+        return
+
+    # 計測が親プロセスのメモリに影響されないよう、データ作成も別プロセスで行う
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.sqlite3')
+        for mode in ('prepare', 'naive', 'write_only'):
+            output = subprocess.run(
+                [sys.executable, __file__, '--run', mode, '--db', db_path,
+                 '--year', str(args.year), '--employees', str(args.employees)],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            print(output.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""シフト表の行の描画のベンチマーク（セルごとのテンプレート vs {% shift_row %}）
+
+従業員×31日の行を、以前のテンプレート（セルごとの dict を {% for %} と {% if %} で描く）と、
+コードの配列から1回の join で描く {% shift_row %} の両方で描き、1行あたりの時間を比べる。
+DB は使わない。
+
+    python benchmarks/matrix_rows.py --employees 300
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+# 以前の shift_matrix.html の行の部分
+CELL_TEMPLATE = """
+    <tr>
+        <td>
+            <div class="name-role">
+                <span class="name">{{ emp.name }}</span>
+                <span class="role">({{ emp.role }})</span>
+                <span class="work-hours">{{ emp.work_hours|floatformat:1 }}時間</span>
+            </div>
+        </td>
+        {% for shift in emp.shifts %}
+            <td class="{% if shift.time_range == '9:00-17:00' %}shift-early
+                       {% elif shift.time_range == '11:00-19:00' %}shift-mid
+                       {% elif shift.time_range == '13:00-21:00' %}shift-late
+                       {% else %}shift-holiday{% endif %}">
+                {{ shift.time_range|default:"休" }}
+            </td>
+        {% endfor %}
+    </tr>
+"""
+
+
+def make_rows(num_employees, month_days, patterns, fill=0.65):
+    """同じ内容の行を、セルの dict 版とコードの配列版の両方で作る"""
+    rng = random.Random(0)
+    weekend = [d.weekday() >= 5 for d in month_days]
+    cell_rows, code_rows = [], []
+    for i in range(num_employees):
+        codes = [rng.randrange(1, len(patterns)) if rng.random() < fill else 0 for _ in month_days]
+        head = {'id': i, 'name': f"従業員{i}", 'role': 'アルバイト', 'work_minutes': sum(map(bool, codes)) * 480}
+        cell_rows.append(dict(head, work_hours=head['work_minutes'] / 60, shifts=[
+            {'date': d, 'is_weekend': weekend[j], 'time_range': patterns[codes[j]]}
+            for j, d in enumerate(month_days)
+        ]))
+        code_rows.append(dict(head, codes=codes))
+    return cell_rows, code_rows
+
+
+def measure(render, rows, repeat):
+    """rows を repeat 回描いて、一番速かった回の1行あたりの秒数を返す"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for row in rows:
+            render(row)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--employees', type=int, default=300)
+    parser.add_argument('--days', type=int, default=31)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shift_manager.settings')
+    import django
+    django.setup()
+    from django.template import engines
+    from django.template.loader import get_template
+    from shifts.matrix import ROW_TEMPLATE, SHIFT_PATTERNS
+
+    month_days = [date(2025, 1, 1) + timedelta(days=n) for n in range(args.days)]
+    cell_rows, code_rows = make_rows(args.employees, month_days, SHIFT_PATTERNS)
+    cell_template = engines['django'].from_string(CELL_TEMPLATE)
+    row_template = get_template(ROW_TEMPLATE)
+
+    per_cell = measure(lambda row: cell_template.render({'emp': row}), cell_rows, args.repeat)
+    tag = measure(lambda row: row_template.render({'emp': row, 'patterns': SHIFT_PATTERNS}), code_rows, args.repeat)
+
+    print(f"employees={args.employees} days={args.days}")
+    print(f"per-cell template: {per_cell * 1e6:8.1f} us/row  ({per_cell * args.employees * 1e3:.1f} ms/page)")
+    print(f"shift_row tag:     {tag * 1e6:8.1f} us/row  ({tag * args.employees * 1e3:.1f} ms/page)")
+    print(f"speedup: {per_cell / tag:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
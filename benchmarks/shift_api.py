@@ -0,0 +1,120 @@
+"""1か月分のシフトの取得方法のベンチマーク（HTML のシフト表 vs 行ごとの JSON vs 列形式の API）
+
+一時的な SQLite に従業員と1か月分のシフトを作り、それぞれの応答の大きさ（そのまま・gzip）と
+1回あたりの時間（中央値）を比べる。HTML は行のキャッシュが空の時と入っている時の両方を測る。
+
+    python benchmarks/shift_api.py --employees 300
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+
+def setup_django(tmp):
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.sqlite3')}"
+    os.environ['CACHE_DIR'] = os.path.join(tmp, 'cache')
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shift_manager.settings')
+    import django
+    django.setup()
+    from django.test.utils import setup_test_environment
+    setup_test_environment()  # テスト用クライアントで testserver に送れるように
+
+
+def prepare(num_employees, year, month, fill=0.65):
+    """ベンチマーク用のデータを作る"""
+    import calendar
+
+    from django.core.management import call_command
+    from shifts.models import SHIFT_TIMES, Employee, Shift
+    from shifts.summaries import rebuild_coverage, rebuild_summaries
+
+    call_command('migrate', verbosity=0)
+    rng = random.Random(0)
+    roles = [role for role, _ in Employee.ROLE_CHOICES]
+    employees = Employee.objects.bulk_create([
+        Employee(name=f"従業員{i}", role=rng.choice(roles), hourly_rate=rng.randint(1000, 1500))
+        for i in range(num_employees)
+    ])
+    days = [date(year, month, d) for d in range(1, calendar.monthrange(year, month)[1] + 1)]
+    shifts = [
+        Shift(employee=emp, date=d, time_range=rng.choice(SHIFT_TIMES)).fill_times()
+        for emp in employees for d in days if rng.random() < fill
+    ]
+    Shift.objects.bulk_create(shifts, batch_size=2000)
+    rebuild_summaries(days[0], days[-1])
+    rebuild_coverage(days[0], days[-1])
+    return len(shifts)
+
+
+def row_json(year, month):
+    """比較用: シフト1件を1つのオブジェクトにした JSON"""
+    from shifts.models import Shift
+
+    rows = Shift.objects.filter(date__year=year, date__month=month).values(
+        'employee_id', 'employee__name', 'employee__role', 'date', 'time_range',
+    )
+    return json.dumps(
+        [dict(row, date=row['date'].isoformat()) for row in rows], ensure_ascii=False,
+    ).encode()
+
+
+def measure(func, repeat):
+    """func() を repeat 回実行して (中央値の秒数, 最後の結果の bytes)"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), body
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--employees', type=int, default=300)
+    parser.add_argument('--year', type=int, default=2025)
+    parser.add_argument('--month', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(tmp)
+        from django.core.cache import caches
+        from django.test import Client
+        from django.urls import reverse
+
+        count = prepare(args.employees, args.year, args.month)
+        print(f"employees={args.employees} shifts={count} month={args.year}-{args.month:02d}")
+
+        client = Client()
+        matrix_url = f"{reverse('shift_matrix')}?year={args.year}&month={args.month}"
+        api_url = reverse('shift_month_api', args=[args.year, args.month])
+
+        def html_cold():
+            caches['matrix_rows'].clear()
+            return client.get(matrix_url).content
+
+        cases = [
+            ('html (row cache empty)', html_cold),
+            ('html (row cache warm)', lambda: client.get(matrix_url).content),
+            ('row-of-objects json', lambda: row_json(args.year, args.month)),
+            ('columnar api', lambda: client.get(api_url).content),
+        ]
+        print(f"{'':24} {'bytes':>10} {'gzip':>9} {'ms':>8}")
+        for name, func in cases:
+            seconds, body = measure(func, args.repeat)
+            print(f"{name:24} {len(body):10,} {len(gzip.compress(body)):9,} {seconds * 1e3:8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""ワーカーの起動時間を測る
+
+新しい Python プロセスで shift_manager.wsgi と URLconf（ビュー）を読み込む時間を計測する。
+重いライブラリが起動時に読み込まれていないかも確認する。
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --repeat 5 --max-ms 800   # 超えたら終了コード1
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# 起動時に読み込まれていてはいけないモジュール
+HEAVY_MODULES = ['matplotlib', 'japanize_matplotlib', 'openpyxl', 'numpy']
+
+MEASURE = """
+import json, os, sys, time
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shift_manager.settings')
+start = time.perf_counter()
+import shift_manager.wsgi
+wsgi_loaded = time.perf_counter()
+from importlib import import_module
+from django.conf import settings
+import_module(settings.ROOT_URLCONF)
+urls_loaded = time.perf_counter()
+print(json.dumps({
+    'wsgi_ms': (wsgi_loaded - start) * 1000,
+    'urls_ms': (urls_loaded - wsgi_loaded) * 1000,
+    'heavy_modules': [m for m in %r if m in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def measure_once():
+    env = dict(os.environ, SHIFTS_PRELOAD='')
+    output = subprocess.run(
+        [sys.executable, '-c', MEASURE], cwd=BASE_DIR, env=env,
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max-ms', type=float, default=None, help='合計時間（中央値）の上限')
+    args = parser.parse_args(argv)
+
+    runs = [measure_once() for _ in range(args.repeat)]
+    total = statistics.median(r['wsgi_ms'] + r['urls_ms'] for r in runs)
+    result = {
+        'wsgi_ms': round(statistics.median(r['wsgi_ms'] for r in runs), 1),
+        'urls_ms': round(statistics.median(r['urls_ms'] for r in runs), 1),
+        'total_ms': round(total, 1),
+        'heavy_modules': runs[-1]['heavy_modules'],
+    }
+    print(json.dumps(result, ensure_ascii=False))
+
+    if result['heavy_modules']:
+        print(f"heavy modules loaded at startup: {', '.join(result['heavy_modules'])}", file=sys.stderr)
+        return 1
+    if args.max_ms is not None and total > args.max_ms:
+        print(f"startup took {total:.0f}ms (limit {args.max_ms:.0f}ms)", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
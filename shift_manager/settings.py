@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 import dj_database_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -88,6 +89,29 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# データのバージョンを全ワーカーで共有するため、プロセス外（ファイル）に置く
+# （行のバージョンは従業員×月の数だけあるので、件数の上限は大きめにし、件数の確認は間引く）
+# シフト表の行の HTML はキーにバージョンを含み、古くなることはないので、ワーカーごとのメモリに置く
+
+CACHES = {
+    'default': {
+        'BACKEND': 'shifts.cache_backends.VersionFileCache',
+        'LOCATION': os.environ.get('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'shift_manager_cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 100000)),
+            'CULL_INTERVAL': int(os.environ.get('CACHE_CULL_INTERVAL', 100)),
+        },
+    },
+    'matrix_rows': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'matrix_rows',
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('MATRIX_ROW_CACHE_ENTRIES', 20000))},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -129,4 +153,30 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Shift generation
+# 自動作成したシフトを bulk_create する時の1回あたりの件数
+SHIFT_BULK_BATCH_SIZE = int(os.environ.get('SHIFT_BULK_BATCH_SIZE', 500))
+
+# 自動作成のモード（random / vectorized / anneal / flow / best）と、anneal の探索時間（秒）
+SHIFT_GENERATION_MODE = os.environ.get('SHIFT_GENERATION_MODE', 'random')
+SHIFT_GENERATION_TIME_BUDGET = float(os.environ.get('SHIFT_GENERATION_TIME_BUDGET', 2.0))
+
+# best モード: 候補の数・候補を作るモード・並列に動かすプロセス数
+SHIFT_GENERATION_CANDIDATES = int(os.environ.get('SHIFT_GENERATION_CANDIDATES', 8))
+SHIFT_GENERATION_CANDIDATE_MODE = os.environ.get('SHIFT_GENERATION_CANDIDATE_MODE', 'random')
+SHIFT_GENERATION_WORKERS = int(os.environ.get('SHIFT_GENERATION_WORKERS', os.cpu_count() or 1))
+
+# 自動作成をバックグラウンドのジョブで行うか（既定はリクエスト内で作成する）
+# '1' にする時は python manage.py run_generation_worker を別のプロセスで動かしておくこと
+SHIFT_GENERATION_ASYNC = os.environ.get('SHIFT_GENERATION_ASYNC', '0') == '1'
+# 実行中のまま この秒数を過ぎたジョブは、ワーカーが止まったものとして失敗にする
+SHIFT_GENERATION_JOB_TIMEOUT = int(os.environ.get('SHIFT_GENERATION_JOB_TIMEOUT', 900))
+
+# 起動後にバックグラウンドで matplotlib などを読み込んでおくか（最初のグラフ表示を速くする）
+SHIFTS_PRELOAD = os.environ.get('SHIFTS_PRELOAD', '') == '1'
+
+# シフト表の軽量表示（?view=virtual）で1回に読み込む行数
+SHIFT_MATRIX_ROW_BLOCK_SIZE = int(os.environ.get('SHIFT_MATRIX_ROW_BLOCK_SIZE', 50))
 
+# 給与グラフをキャッシュしておく最大数（ワーカーごと）
+SALARY_CHART_CACHE_SIZE = int(os.environ.get('SALARY_CHART_CACHE_SIZE', 32))
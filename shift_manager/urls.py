@@ -28,4 +28,7 @@ urlpatterns = [
     path('export/excel/', views.export_excel, name='export_excel'),
     path('export/csv/', views.export_csv, name='export_csv'),
     path('salary/', views.salary_view, name='salary_view'),
+    path('jobs/<int:pk>/', views.generation_job_status, name='generation_job_status'),
+    path('api/shifts/<int:year>/<int:month>/', views.shift_month_api, name='shift_month_api'),
+    path('shift_matrix/<int:year>/<int:month>/rows/', views.shift_matrix_rows, name='shift_matrix_rows'),
 ]
\ No newline at end of file
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Employee, Shift, Holiday
+from .jobs import regenerate_for_requested_off
+from .models import Employee, GenerationJob, Shift, Holiday, RequestedOff
 
 
 class HolidayInline(admin.TabularInline):
@@ -18,4 +19,24 @@ class ShiftAdmin(admin.ModelAdmin):
 @admin.register(Holiday)
 class HolidayAdmin(admin.ModelAdmin):
     list_display = ('employee', 'date')
-    list_filter = ('employee', 'date')
\ No newline at end of file
+    list_filter = ('employee', 'date')
+
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ('year', 'month', 'mode', 'status', 'days_done', 'days_total', 'score', 'created_at')
+    list_filter = ('status',)
+
+@admin.register(RequestedOff)
+class RequestedOffAdmin(admin.ModelAdmin):
+    list_display = ('employee', 'date')
+    list_filter = ('employee', 'date')
+    actions = ['regenerate_days']
+
+    @admin.action(description="選択した希望休の日のシフトを作り直す")
+    def regenerate_days(self, request, queryset):
+        ranges = regenerate_for_requested_off(queryset)
+        if ranges:
+            text = "、".join(f"{s:%m/%d}〜{e:%m/%d}" if s != e else f"{s:%m/%d}" for s, e in ranges)
+            self.message_user(request, f"{text} のシフトを作り直しました")
+        else:
+            self.message_user(request, "作り直しが必要な日はありませんでした")
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ShiftsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shifts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        if getattr(settings, 'SHIFTS_PRELOAD', False):
+            from .warmup import preload_in_background
+            preload_in_background()
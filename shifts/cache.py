@@ -0,0 +1,186 @@
+"""キャッシュ関連（データのバージョン管理と、プロセス内の LRU キャッシュ）
+
+シフト・希望休が変わるたびにその月の「バージョン」を、従業員が変わるたびに
+全月共通の従業員のバージョンを、必要人数（ShiftRequirement）が変わるたびに全月共通の
+必要人数のバージョンを新しくする（値は更新した時刻のナノ秒）。
+シフト表の行のキャッシュ用に、月ごとの「行のバージョン」（自動作成・取り込みでまとめて変えた時）と、
+従業員×月の「行のバージョン」（1件ずつ変えた時）も持つ。
+どのバージョンも、無ければ読んだ時にその時刻で作る。キャッシュから追い出されたキーも
+新しい値で作り直されるので、以前の値（＝古い行の HTML のキー）に戻ることはない。
+キャッシュのキーや ETag にバージョンを含めておけば、古い結果は自然に使われなくなる。
+バージョンは Django のキャッシュ（settings.CACHES）に置くので、
+複数の gunicorn ワーカーがあっても同じ値を見る。DB は読まない。
+ただし出力のように期間を自由に指定できるものは、無い月のバージョンを作る前にその月に
+データ（シフト・希望休）があるかを1回のクエリで確かめ、無い月はキーを作らずに
+EMPTY_MONTH_VERSION を使う（どんな期間を指定されてもキーが増え続けないように）。
+"""
+import calendar
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.functions import TruncMonth
+
+from .models import RequestedOff, Shift
+
+EMPLOYEE_VERSION_KEY = 'shifts:employee_version'
+REQUIREMENTS_VERSION_KEY = 'shifts:requirements_version'
+# 全ての月に共通のバージョン（month_versions の先頭に並べる）
+SHARED_VERSION_KEYS = (EMPLOYEE_VERSION_KEY, REQUIREMENTS_VERSION_KEY)
+MONTH_VERSION_KEY = 'shifts:month_version:{}-{:02d}'
+MONTH_ROWS_VERSION_KEY = 'shifts:month_rows_version:{}-{:02d}'
+ROW_VERSION_KEY = 'shifts:row_version:{}:{}-{:02d}'
+# シフトも希望休も無い月のバージョン（内容が「空」であることだけを表すので、前の状態とは重ならない）
+EMPTY_MONTH_VERSION = 0
+
+
+def _get_or_create_versions(keys):
+    """keys のバージョンを {キー: バージョン} で返す（get_many の1回。無いものは作る）"""
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            version = time.time_ns()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+            found[key] = version
+    return found
+
+
+def months_with_data(months):
+    """months のうち、シフトか希望休がある (年, 月) の集合（1回のクエリ）"""
+    first, last = min(months), max(months)
+    period = (date(*first, 1), date(*last, calendar.monthrange(*last)[1]))
+    querysets = [
+        model.objects.filter(date__range=period).annotate(month=TruncMonth('date')).values_list('month').order_by()
+        for model in (Shift, RequestedOff)
+    ]
+    found = {(d.year, d.month) for d, in querysets[0].union(querysets[1])}
+    return found & set(months)
+
+
+def month_versions(months, create_empty=True):
+    """[(年, 月), ...] のバージョンを返す（先頭は従業員・必要人数のバージョン。まだ無ければ作る）
+
+    キャッシュへの問い合わせは、月がいくつあっても get_many の1回だけ。
+    create_empty=False なら、キーの無い月はデータがある時だけ作り、無ければ EMPTY_MONTH_VERSION にする。
+    """
+    keys = {(year, month): MONTH_VERSION_KEY.format(year, month) for year, month in months}
+    found = cache.get_many([*SHARED_VERSION_KEYS, *keys.values()])
+    missing = [month for month, key in keys.items() if key not in found]
+    missing_shared = [key for key in SHARED_VERSION_KEYS if key not in found]
+    if missing or missing_shared:
+        if create_empty:
+            with_data = set(missing)
+        else:
+            with_data = months_with_data(missing) if missing else set()
+        found.update(_get_or_create_versions(
+            missing_shared + [keys[month] for month in missing if month in with_data]
+        ))
+    return (
+        *(found[key] for key in SHARED_VERSION_KEYS),
+        *(found.get(keys[month], EMPTY_MONTH_VERSION) for month in months),
+    )
+
+
+def row_versions(employee_ids, year, month):
+    """シフト表の行のバージョン {従業員ID: (従業員のバージョン, 月の行のバージョン, その人のその月のバージョン)}
+
+    行の内容は名前・役職とその月のシフトだけで決まるので、そのどれかが変わった時だけ変わる。
+    無いバージョンはここで作る（0 のような決まった値にすると、キャッシュから追い出された時に
+    以前のバージョンと同じ値になり、古い行の HTML を使ってしまう）。
+    全てある時は、従業員が何人でも get_many の1回だけ。
+    """
+    shared = [EMPLOYEE_VERSION_KEY, MONTH_ROWS_VERSION_KEY.format(year, month)]
+    keys = {emp_id: ROW_VERSION_KEY.format(emp_id, year, month) for emp_id in employee_ids}
+    found = _get_or_create_versions([*shared, *keys.values()])
+    prefix = tuple(found[key] for key in shared)
+    return {emp_id: (*prefix, found[key]) for emp_id, key in keys.items()}
+
+
+def month_version(year, month):
+    """1か月分のバージョン（その月のシフト・希望休と、従業員の変更で変わる）"""
+    return month_versions([(year, month)])
+
+
+def months_between(start, end):
+    """start〜end の日付を含む (年, 月) のリスト"""
+    months = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        months.append((year, month))
+        year, month = (year, month + 1) if month < 12 else (year + 1, 1)
+    return months
+
+
+def _set_new_versions(keys):
+    version = time.time_ns()
+    cache.set_many({key: version for key in keys}, None)
+
+
+def bump_month_versions(dates):
+    """dates を含む月のバージョンを新しくする（トランザクション中ならコミット後に）"""
+    keys = {MONTH_VERSION_KEY.format(d.year, d.month) for d in dates}
+    if keys:
+        transaction.on_commit(lambda: _set_new_versions(keys))
+
+
+def bump_month_rows_versions(dates):
+    """dates を含む月の、全員の行のバージョンを新しくする（まとめて変えた時。トランザクション中ならコミット後に）"""
+    keys = {MONTH_ROWS_VERSION_KEY.format(d.year, d.month) for d in dates}
+    if keys:
+        transaction.on_commit(lambda: _set_new_versions(keys))
+
+
+def bump_row_versions(employee_ids, dates):
+    """employee_ids の、dates を含む月の行のバージョンを新しくする（1件ずつ変えた時。トランザクション中ならコミット後に）"""
+    months = {(d.year, d.month) for d in dates}
+    keys = {
+        ROW_VERSION_KEY.format(emp_id, year, month)
+        for emp_id in employee_ids for year, month in months
+    }
+    if keys:
+        transaction.on_commit(lambda: _set_new_versions(keys))
+
+
+def bump_employee_version():
+    """従業員のバージョン（＝全ての月）を新しくする（トランザクション中ならコミット後に）"""
+    transaction.on_commit(lambda: _set_new_versions([EMPLOYEE_VERSION_KEY]))
+
+
+def bump_requirements_version():
+    """必要人数のバージョン（＝全ての月。行の HTML はそのまま）を新しくする（トランザクション中ならコミット後に）"""
+    transaction.on_commit(lambda: _set_new_versions([REQUIREMENTS_VERSION_KEY]))
+
+
+class LRUCache:
+    """件数に上限のある LRU キャッシュ（スレッドセーフ）"""
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
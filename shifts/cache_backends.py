@@ -0,0 +1,21 @@
+"""データのバージョン用のキャッシュのバックエンド
+
+FileBasedCache は set() のたびにディレクトリの一覧を取って件数を数える（_cull）。
+バージョンのような小さな値を何度も書くと、その一覧を取る時間が大半になるので、
+件数を数えるのを CULL_INTERVAL 回の書き込みに1回にする（上限を少し超えることはある）。
+"""
+from django.core.cache.backends.filebased import FileBasedCache
+
+
+class VersionFileCache(FileBasedCache):
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        options = params.get('OPTIONS', {})
+        self._cull_interval = max(int(options.get('CULL_INTERVAL', 100)), 1)
+        self._writes = 0
+
+    def _cull(self):
+        self._writes += 1
+        if self._writes % self._cull_interval:
+            return
+        super()._cull()
@@ -0,0 +1,48 @@
+"""給与グラフの描画とキャッシュ
+
+pyplot のグローバルな状態は使わず、Figure を直接作って描画する。
+描画結果（Base64 の PNG）は (年, 月, その月のバージョン) をキーに LRU キャッシュする。
+"""
+import base64  # バイナリデータ(画像やファイルなど)を文字列に変換して、テキストとして扱えるようにする
+import io  # メモリ上でファイルのようにデータを扱うためのモジュール
+
+import japanize_matplotlib  # noqa: F401  日本語フォントの設定
+from django.conf import settings
+from matplotlib.figure import Figure
+
+from .cache import LRUCache, month_version
+
+# キャッシュするグラフの最大数（settings.SALARY_CHART_CACHE_SIZE で変更可）
+chart_cache = LRUCache(getattr(settings, 'SALARY_CHART_CACHE_SIZE', 32))
+
+
+def render_salary_chart(year, month, names, salaries):
+    """従業員ごとの給与の横棒グラフを描き、Base64 の PNG 文字列で返す"""
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    bars = ax.barh(names, salaries, color="#ffa94d")  # 横棒グラフ
+
+    # グラフのタイトル・軸ラベル
+    ax.set_title(f"{year}年{month}月の給与", fontsize=14)
+    ax.set_xlabel("金額（円）", fontsize=12)
+    for label in ax.get_yticklabels():
+        label.set_horizontalalignment("right")
+
+    # 棒の横に給与金額を表示
+    for bar, value in zip(bars, salaries):
+        ax.text(value + 1000, bar.get_y() + bar.get_height()/2, f"{int(value):,}円", va='center', fontsize=10)
+
+    fig.tight_layout()
+    buf = io.BytesIO()  # 一時的なメモリ領域（仮のファイル）を作る
+    fig.savefig(buf, format='png')  # グラフをPNG画像としてメモリ上に保存
+    return base64.b64encode(buf.getvalue()).decode()  # 画像データをBase64形式の文字列に変換
+
+
+def salary_chart(year, month, names, salaries):
+    """キャッシュがあればそれを、無ければ描画してキャッシュに入れて返す"""
+    key = (year, month, month_version(year, month))
+    chart = chart_cache.get(key)
+    if chart is None:
+        chart = render_salary_chart(year, month, names, salaries)
+        chart_cache.set(key, chart)
+    return chart
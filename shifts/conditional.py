@@ -0,0 +1,108 @@
+"""月ごとのバージョンを使った条件付き GET（ETag / Last-Modified / 304）
+
+ETag と Last-Modified はキャッシュにある月のバージョン（cache.month_versions）だけから作るので、
+内容が変わっていなければ ORM もテンプレートも使わずに 304 Not Modified を返せる。
+"""
+import functools
+import hashlib
+from datetime import date, datetime, timezone
+
+from django.conf import settings
+from django.contrib import messages
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .cache import month_versions, months_between
+from .exports import parse_export_range
+
+
+def month_from_params(request):
+    """?year=&month=（無ければ今月）の [(年, 月)]"""
+    today = date.today()
+    try:
+        year = int(request.GET.get('year', today.year))
+        month = int(request.GET.get('month', today.month))
+    except ValueError:
+        return None
+    if not 1 <= month <= 12:
+        return None
+    return [(year, month)]
+
+
+def month_from_url(request, year, month):
+    """URL の <year>/<month> の [(年, 月)]"""
+    if not 1 <= month <= 12:
+        return None
+    return [(year, month)]
+
+
+def months_for_matrix(request):
+    """シフト表の対象月（自動作成ジョブの進捗を表示している間は条件付きにしない）"""
+    if 'job' in request.GET:
+        return None
+    return month_from_params(request)
+
+
+def months_for_export(request):
+    """Excel・CSV 出力の対象月（?period=year なら1年分、?start=&end= ならその期間。長すぎれば None）"""
+    if request.GET.get('period') == 'year':
+        try:
+            year = int(request.GET.get('year', date.today().year))
+        except ValueError:
+            return None
+        return [(year, month) for month in range(1, 13)]
+    try:
+        start, end = parse_export_range(request.GET)
+    except ValueError:
+        return None
+    return months_between(start, end)
+
+
+def _request_versions(request, months_func, per_user, create_empty, kwargs):
+    """このリクエストの対象月のバージョン（ETag と Last-Modified で2回読まないよう覚えておく）"""
+    if not hasattr(request, '_shift_versions'):
+        versions = None
+        if request.method in ('GET', 'HEAD'):
+            months = months_func(request, **kwargs)
+            if months and not (per_user and len(messages.get_messages(request))):
+                versions = month_versions(months, create_empty=create_empty)
+        request._shift_versions = versions
+    return request._shift_versions
+
+
+def conditional_on_months(months_func, per_user=False, create_empty=True):
+    """months_func(request, **URL の引数) の月のバージョンで ETag / Last-Modified を付けるデコレーター
+
+    per_user=True のページ（フォームやメッセージがある画面）は CSRF トークンも ETag に含め、
+    表示待ちのメッセージがある時は 304 にしない。
+    create_empty=False（期間を自由に指定できる出力）は、データの無い月のバージョンを作らない。
+    """
+    def etag(request, *args, **kwargs):
+        versions = _request_versions(request, months_func, per_user, create_empty, kwargs)
+        if versions is None:
+            return None
+        parts = [request.path, request.GET.urlencode(), *map(str, versions)]
+        if per_user:
+            parts.append(request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''))
+        return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        versions = _request_versions(request, months_func, per_user, create_empty, kwargs)
+        if versions is None:
+            return None
+        return datetime.fromtimestamp(max(versions) / 1e9, tz=timezone.utc)
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag, last_modified_func=last_modified)(view)
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if response.has_header('ETag'):
+                # 毎回サーバーに確認させる（変わっていなければ 304 で本文は送らない）
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        return wrapper
+
+    return decorator
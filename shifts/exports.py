@@ -0,0 +1,151 @@
+"""シフト表の出力（CSV・Excel）
+
+シフトは1回のクエリで従業員順に読み込み（.iterator()）、1人分ずつ行にして返す。
+メモリに載るのは従業員の一覧と1行分だけなので、期間が長くても使用量は変わらない。
+Excel は openpyxl の write-only モードで、行をそのままファイルに書き出す。
+"""
+import calendar
+import csv
+from datetime import date, timedelta
+
+from .models import Employee, Shift
+
+WEEK_NAMES = ['月', '火', '水', '木', '金', '土', '日']
+OFF_LABEL = "休"
+ITERATOR_CHUNK_SIZE = 2000
+MAX_EXPORT_DAYS = 366  # 1回に出力できる日数（1年分）
+
+
+def date_range(start, end):
+    """start から end まで（両端を含む）の日付リスト"""
+    return [start + timedelta(days=n) for n in range((end - start).days + 1)]
+
+
+def parse_export_range(params, today=None):
+    """リクエストの start/end（YYYY-MM-DD）か year/month から出力期間を決める
+
+    不正な値・MAX_EXPORT_DAYS より長い期間の場合は ValueError。
+    """
+    today = today or date.today()
+    if params.get('start') or params.get('end'):
+        start = date.fromisoformat(params.get('start') or params.get('end'))
+        end = date.fromisoformat(params.get('end') or params.get('start'))
+    else:
+        year = int(params.get('year', today.year))
+        month = int(params.get('month', today.month))
+        start = date(year, month, 1)
+        end = date(year, month, calendar.monthrange(year, month)[1])
+    if end < start:
+        raise ValueError("end must not be before start")
+    if (end - start).days >= MAX_EXPORT_DAYS:
+        raise ValueError(f"the period must be at most {MAX_EXPORT_DAYS} days")
+    return start, end
+
+
+def day_headers(days):
+    """見出し用の日付（1か月以内なら「1日(月)」、月をまたぐなら「10月1日(水)」）"""
+    multi_month = (days[0].year, days[0].month) != (days[-1].year, days[-1].month)
+    if multi_month:
+        return [f"{d.month}月{d.day}日({WEEK_NAMES[d.weekday()]})" for d in days]
+    return [f"{d.day}日({WEEK_NAMES[d.weekday()]})" for d in days]
+
+
+def ordered_employees():
+    """出力の並び順（役職順 → ID順）の従業員"""
+    return Employee.objects.order_by(Employee.role_order_expression(), 'id')
+
+
+def iter_employee_rows(days, employees=None):
+    """(従業員, [日ごとの勤務時間帯 or 休], [日ごとの勤務時間（分）]) を従業員の並び順に1人ずつ返す
+
+    従業員とシフトは別のクエリで読むので、その間に従業員が増えたり役職が変わったりすると、
+    従業員の一覧に無い人のシフトが混ざる。並び順で今の従業員より前のシフトは読み飛ばす
+    （止まったままにすると、それより後の全員が「休」になる）。
+    """
+    employees = ordered_employees() if employees is None else employees
+    day_index = {d: j for j, d in enumerate(days)}
+    shifts = (
+        Shift.objects.filter(date__range=(days[0], days[-1]))
+        .annotate(role_order=Employee.role_order_expression('employee__role'))
+        .order_by('role_order', 'employee_id', 'date', 'id')
+        .values_list('role_order', 'employee_id', 'date', 'time_range', 'duration_minutes')
+        .iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    )
+    current = next(shifts, None)
+    for emp in employees:
+        cells = [OFF_LABEL] * len(days)
+        minutes = [0] * len(days)
+        position = (emp.role_order(), emp.id)
+        while current is not None and current[:2] < position:
+            current = next(shifts, None)
+        while current is not None and current[:2] == position:
+            j = day_index[current[2]]
+            cells[j] = current[3]
+            minutes[j] = current[4]
+            current = next(shifts, None)
+        yield emp, cells, minutes
+
+
+class Echo:
+    """csv.writer の書き込み先（書いた文字列をそのまま返す）"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(days):
+    """UTF-8 BOM 付きの CSV を1行ずつ返す"""
+    writer = csv.writer(Echo(), lineterminator='\n')
+    yield '\ufeff' + writer.writerow(["名前", "役職"] + day_headers(days))
+    for emp, cells, _ in iter_employee_rows(days):
+        yield writer.writerow([emp.name, emp.get_role_display(), *cells])
+
+
+def month_slices(days):
+    """[((年, 月), 開始位置, 終了位置), ...]（days を月ごとに区切る）"""
+    slices = []
+    start = 0
+    for j in range(1, len(days) + 1):
+        if j == len(days) or (days[j].year, days[j].month) != (days[start].year, days[start].month):
+            slices.append(((days[start].year, days[start].month), start, j))
+            start = j
+    return slices
+
+
+def shift_workbook(days, sheet_title=None, summary=False):
+    """シフト表の Excel（write-only）を作る
+
+    月ごとにシートを分け、summary=True なら最後に勤務時間・給与の集計シートを付ける。
+    シフトは1回のクエリで読み、1人分ずつ各シートに書き出す。
+    """
+    import openpyxl  # 重いので使う時だけ読み込む
+
+    wb = openpyxl.Workbook(write_only=True)
+    slices = month_slices(days)
+    sheets = []
+    for (year, month), start, end in slices:
+        ws = wb.create_sheet(sheet_title or f"{month}月")
+        ws.append(["名前", "役職"] + day_headers(days[start:end]))
+        sheets.append((ws, start, end))
+
+    if summary:
+        summary_ws = wb.create_sheet("集計")
+        summary_ws.append(
+            ["名前", "役職", "時給"]
+            + [f"{month}月(時間)" for (_, month), _, _ in slices]
+            + ["勤務日数", "勤務時間", "給与"]
+        )
+
+    for emp, cells, minutes in iter_employee_rows(days):
+        name, role = emp.name, emp.get_role_display()
+        for ws, start, end in sheets:
+            ws.append([name, role, *cells[start:end]])
+        if summary:
+            rate = float(emp.hourly_rate or 0)
+            month_hours = [round(sum(minutes[start:end]) / 60, 2) for _, start, end in slices]
+            total_hours = sum(minutes) / 60
+            summary_ws.append(
+                [name, role, rate, *month_hours]
+                + [sum(1 for m in minutes if m), round(total_hours, 2), int(round(total_hours * rate))]
+            )
+    return wb
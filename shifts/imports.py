@@ -0,0 +1,398 @@
+"""従業員・希望休・シフトの一括取り込み（CSV・Excel・JSON）
+
+ファイルは1行ずつ読み（Excel は read-only モード、JSON は JSON Lines なら1行ずつ）、
+行の種類（type 列: employee / requested_off / holiday / shift）ごとに値を確かめてから、
+batch_size 件ずつ bulk_create する。従業員は名前→ID の辞書で引くので、行ごとのクエリは出さない。
+取り込み全体を1つのトランザクションで行い、最後に月ごとの集計と日ごとの人数を作り直して
+バージョンを新しくする（bulk_create ではシグナルが出ないため）。
+正しくない行は飛ばして、(ファイル, 行, 理由) を errors に残す。
+"""
+import csv
+import json
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Max, Min
+
+from .cache import bump_employee_version, bump_month_rows_versions, bump_month_versions
+from .exports import OFF_LABEL
+from .models import SHIFT_TIMES, Employee, Holiday, RequestedOff, Shift
+from .signals import bulk_shift_changes
+from .summaries import rebuild_coverage, rebuild_summaries, refresh_pay
+
+SHIFT_BULK_BATCH_SIZE = getattr(settings, 'SHIFT_BULK_BATCH_SIZE', 500)
+
+# type 列・--type・Excel のシート名に使える名前
+RECORD_TYPES = {
+    'employee': 'employee', 'employees': 'employee', '従業員': 'employee',
+    'requested_off': 'requested_off', '希望休': 'requested_off',
+    'holiday': 'holiday', 'holidays': 'holiday', '休日': 'holiday',
+    'shift': 'shift', 'shifts': 'shift', 'シフト': 'shift',
+}
+# 役職はコード（part）でも表示名（アルバイト）でもよい
+ROLES = {**{code: code for code, _ in Employee.ROLE_CHOICES}, **{label: code for code, label in Employee.ROLE_CHOICES}}
+EMPLOYEE_FIELDS = ('role', 'hourly_rate', 'max_days')
+NAME_MAX_LENGTH = Employee._meta.get_field('name').max_length
+HOURLY_RATE_FIELD = Employee._meta.get_field('hourly_rate')
+
+
+class RowError(ValueError):
+    """取り込めない行（エラーの一覧に理由を残して次の行へ進む）"""
+
+
+# ---------- ファイルの読み込み（(行, {列名: 値}) を1行ずつ返す） ----------
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def read_json(path):
+    """JSON の配列（全体を読む）か JSON Lines（1行ずつ読む）"""
+    with open(path, encoding='utf-8-sig') as f:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        f.seek(0)
+        if first == '[':
+            for n, record in enumerate(json.load(f), 1):
+                yield n, record
+            return
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield n, json.loads(line)
+            except ValueError as exc:
+                yield n, RowError(f"JSON として読めません: {exc}")
+
+
+def read_xlsx(path):
+    """各シートの1行目を列名として読む（type 列が無ければシート名を種類にする）"""
+    import openpyxl  # 重いので使う時だけ読み込む
+
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            rows = ws.iter_rows(values_only=True)
+            header = next(rows, None)
+            if not header:
+                continue
+            keys = ['' if h is None else str(h).strip() for h in header]
+            sheet_type = RECORD_TYPES.get(ws.title.strip().lower())
+            for n, values in enumerate(rows, 2):
+                if all(v is None for v in values):
+                    continue
+                record = dict(zip(keys, values))
+                if sheet_type and not record.get('type'):
+                    record['type'] = sheet_type
+                yield f"{ws.title}!{n}", record
+    finally:
+        wb.close()
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+    '.jsonl': read_json,
+    '.ndjson': read_json,
+    '.xlsx': read_xlsx,
+}
+
+
+def read_records(path):
+    reader = READERS.get(Path(path).suffix.lower())
+    if reader is None:
+        raise ValueError(f"対応していないファイルです: {path}（{', '.join(sorted(READERS))}）")
+    return reader(path)
+
+
+# ---------- 値の確認 ----------
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def clean_name(value):
+    if _blank(value):
+        raise RowError("名前がありません")
+    name = str(value).strip()
+    if len(name) > NAME_MAX_LENGTH:
+        raise RowError(f"名前が長すぎます（{NAME_MAX_LENGTH}文字まで）: {name}")
+    return name
+
+
+def clean_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if _blank(value):
+        raise RowError("日付がありません")
+    try:
+        return date.fromisoformat(str(value).strip().replace('/', '-'))
+    except ValueError:
+        raise RowError(f"日付が正しくありません: {value!r}") from None
+
+
+def clean_time_range(value):
+    """勤務時間帯（空欄・「休」は休み＝''）"""
+    if _blank(value) or str(value).strip() == OFF_LABEL:
+        return ''
+    time_range = str(value).strip()
+    if time_range not in SHIFT_TIMES:
+        raise RowError(f"勤務時間帯が正しくありません: {time_range}（{' / '.join(SHIFT_TIMES)}）")
+    return time_range
+
+
+def clean_role(value):
+    role = ROLES.get(str(value).strip())
+    if role is None:
+        raise RowError(f"役職が正しくありません: {value}")
+    return role
+
+
+def clean_hourly_rate(value):
+    """時給（列に入る桁数か、モデルのフィールドで確かめる）"""
+    try:
+        rate = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise RowError(f"時給が正しくありません: {value!r}") from None
+    if not rate.is_finite():
+        raise RowError(f"時給が正しくありません: {value!r}")
+    if rate < 0:
+        raise RowError(f"時給が範囲外です: {value}")
+    try:
+        return HOURLY_RATE_FIELD.clean(rate, None)
+    except ValidationError as exc:
+        raise RowError(f"時給が範囲外です: {value}（{' '.join(exc.messages)}）") from None
+
+
+def clean_max_days(value):
+    try:
+        days = int(float(str(value).strip()))
+    except (ValueError, OverflowError):
+        raise RowError(f"最大勤務日数が正しくありません: {value!r}") from None
+    if not 0 <= days <= 31:
+        raise RowError(f"最大勤務日数が範囲外です: {value}")
+    return days
+
+
+CLEANERS = {'role': clean_role, 'hourly_rate': clean_hourly_rate, 'max_days': clean_max_days}
+
+
+# ---------- 取り込み ----------
+
+class ShiftImporter:
+    """取り込み中の状態（名前→ID の辞書・保存待ちの行・エラー・件数）
+
+    add() で1行ずつ渡し、最後に finish() を呼ぶ。トランザクションは呼び出し側で張る
+    （import_files() を参照）。
+    """
+
+    def __init__(self, batch_size=None, default_type=None):
+        self.batch_size = batch_size or SHIFT_BULK_BATCH_SIZE
+        self.default_type = default_type
+        self.employee_ids = {}        # {名前: 従業員ID}
+        self.ambiguous_names = set()  # 同じ名前の従業員が複数いる（名前では引けない）
+        for emp_id, name in Employee.objects.order_by('id').values_list('id', 'name'):
+            if name in self.employee_ids:
+                self.ambiguous_names.add(name)
+            else:
+                self.employee_ids[name] = emp_id
+
+        self.new_employees = {}       # {名前: 未保存の Employee}
+        self.employee_updates = {}    # {従業員ID: {項目: 値}}
+        self.requested_off = set()    # {(従業員ID, 日付)}
+        self.holidays = set()         # {(従業員ID, 日付)}
+        self.shifts = {}              # {(従業員ID, 日付): 勤務時間帯}
+        self.dates = set()            # シフト・希望休を変えた日
+        self.errors = []              # [(ファイル, 行, 理由)]
+        self.counts = dict.fromkeys(
+            ('rows', 'employees_created', 'employees_updated', 'requested_off', 'holidays', 'shifts', 'shifts_removed'),
+            0,
+        )
+
+    def add(self, source, line, record):
+        """1行を確かめて保存待ちにする（正しくなければ errors に足す）"""
+        self.counts['rows'] += 1
+        try:
+            if isinstance(record, Exception):
+                raise record
+            if not isinstance(record, dict):
+                raise RowError("行の形式が正しくありません")
+            kind = RECORD_TYPES.get(str(record.get('type') or self.default_type or '').strip().lower())
+            if kind is None:
+                raise RowError(f"種類（type）が正しくありません: {record.get('type')!r}")
+            getattr(self, f'add_{kind}')(record)
+        except RowError as exc:
+            self.errors.append((source, line, str(exc)))
+
+    def add_employee(self, record):
+        name = clean_name(record.get('name'))
+        fields = {
+            field: CLEANERS[field](record[field])
+            for field in EMPLOYEE_FIELDS if not _blank(record.get(field))
+        }
+        if name in self.ambiguous_names:
+            raise RowError(f"同じ名前の従業員が複数います: {name}")
+        if name in self.employee_ids:
+            self.employee_updates.setdefault(self.employee_ids[name], {}).update(fields)
+        elif name in self.new_employees:
+            for field, value in fields.items():
+                setattr(self.new_employees[name], field, value)
+        else:
+            self.new_employees[name] = Employee(name=name, **fields)
+            if len(self.new_employees) >= self.batch_size:
+                self.flush_employees()
+
+    def employee_id(self, record):
+        """行の name を従業員IDにする（このファイルで追加した従業員なら先に保存する）"""
+        name = clean_name(record.get('name'))
+        if name in self.ambiguous_names:
+            raise RowError(f"同じ名前の従業員が複数います: {name}")
+        if name in self.new_employees:
+            self.flush_employees()
+        try:
+            return self.employee_ids[name]
+        except KeyError:
+            raise RowError(f"従業員が見つかりません: {name}") from None
+
+    def add_requested_off(self, record):
+        self.requested_off.add((self.employee_id(record), clean_date(record.get('date'))))
+        if len(self.requested_off) >= self.batch_size:
+            self.flush_requested_off()
+
+    def add_holiday(self, record):
+        self.holidays.add((self.employee_id(record), clean_date(record.get('date'))))
+        if len(self.holidays) >= self.batch_size:
+            self.flush_holidays()
+
+    def add_shift(self, record):
+        key = (self.employee_id(record), clean_date(record.get('date')))
+        self.shifts[key] = clean_time_range(record.get('time_range'))
+        if len(self.shifts) >= self.batch_size:
+            self.flush_shifts()
+
+    def flush_employees(self):
+        if not self.new_employees:
+            return
+        created = Employee.objects.bulk_create(list(self.new_employees.values()), batch_size=self.batch_size)
+        for emp in created:
+            self.employee_ids[emp.name] = emp.id
+        self.counts['employees_created'] += len(created)
+        self.new_employees = {}
+
+    def create_days_off(self, model, days):
+        """days（{(従業員ID, 日付)}）のうち、まだ無いものだけ model（希望休・休日）の行を作り、作った件数を返す"""
+        existing = set(
+            model.objects.filter(
+                employee_id__in={emp_id for emp_id, _ in days},
+                date__in={d for _, d in days},
+            ).values_list('employee_id', 'date')
+        )
+        new = [model(employee_id=emp_id, date=d) for emp_id, d in days - existing]
+        model.objects.bulk_create(new, batch_size=self.batch_size)
+        return len(new)
+
+    def flush_requested_off(self):
+        if not self.requested_off:
+            return
+        self.counts['requested_off'] += self.create_days_off(RequestedOff, self.requested_off)
+        self.dates.update(d for _, d in self.requested_off)
+        self.requested_off = set()
+
+    def flush_holidays(self):
+        """休日（従業員の管理画面で編集する）はシフト表に出ないので、バージョンは変えない"""
+        if not self.holidays:
+            return
+        self.counts['holidays'] += self.create_days_off(Holiday, self.holidays)
+        self.holidays = set()
+
+    def flush_shifts(self):
+        """同じ従業員・日のシフトは置き換える（「休」なら消すだけ）"""
+        if not self.shifts:
+            return
+        existing = Shift.objects.filter(
+            employee_id__in={emp_id for emp_id, _ in self.shifts},
+            date__in={d for _, d in self.shifts},
+        ).values_list('id', 'employee_id', 'date')
+        replaced = [pk for pk, emp_id, d in existing if (emp_id, d) in self.shifts]
+        if replaced:
+            Shift.objects.filter(pk__in=replaced).delete()
+        new = [
+            Shift(employee_id=emp_id, date=d, time_range=time_range).fill_times()
+            for (emp_id, d), time_range in self.shifts.items() if time_range
+        ]
+        Shift.objects.bulk_create(new, batch_size=self.batch_size)
+        self.dates.update(d for _, d in self.shifts)
+        self.counts['shifts'] += len(new)
+        self.counts['shifts_removed'] += len(replaced)
+        self.shifts = {}
+
+    def apply_employee_updates(self):
+        """既にいる従業員の役職・時給・最大勤務日数を1回の UPDATE で変える。役職が変わった人の ID を返す"""
+        updates = {emp_id: fields for emp_id, fields in self.employee_updates.items() if fields}
+        if not updates:
+            return set()
+        employees = Employee.objects.in_bulk(list(updates))
+        changed, role_changed, fields_used = [], set(), set()
+        for emp_id, fields in updates.items():
+            emp = employees[emp_id]
+            diff = {field: value for field, value in fields.items() if getattr(emp, field) != value}
+            if not diff:
+                continue
+            if 'role' in diff:
+                role_changed.add(emp_id)
+            for field, value in diff.items():
+                setattr(emp, field, value)
+            fields_used.update(diff)
+            changed.append(emp)
+        if changed:
+            Employee.objects.bulk_update(changed, sorted(fields_used), batch_size=self.batch_size)
+            refresh_pay(changed)  # bulk_update ではシグナルが出ないため
+        self.counts['employees_updated'] += len(changed)
+        return role_changed
+
+    def finish(self):
+        """残りを保存し、変えた期間の集計・人数を作り直してバージョンを新しくする"""
+        self.flush_employees()
+        role_changed = self.apply_employee_updates()
+        self.flush_requested_off()
+        self.flush_holidays()
+        self.flush_shifts()
+
+        shift_dates = set(self.dates)
+        if role_changed:
+            # 役職が変わった人のシフトは、日ごとの役職別の人数を数え直す
+            bounds = Shift.objects.filter(employee_id__in=role_changed).aggregate(start=Min('date'), end=Max('date'))
+            if bounds['start']:
+                shift_dates.update((bounds['start'], bounds['end']))
+        if shift_dates:
+            start, end = min(shift_dates), max(shift_dates)
+            rebuild_summaries(start, end)
+            rebuild_coverage(start, end)
+        if self.dates:
+            bump_month_versions(self.dates)
+            bump_month_rows_versions(self.dates)
+        if self.counts['employees_created'] or self.counts['employees_updated']:
+            bump_employee_version()
+        return self.counts
+
+
+def import_files(paths, default_type=None, batch_size=None):
+    """paths のファイルを順に取り込み、ShiftImporter（件数・エラー）を返す（全体で1トランザクション）"""
+    importer = ShiftImporter(batch_size=batch_size, default_type=default_type)
+    with transaction.atomic(), bulk_shift_changes():
+        for path in paths:
+            source = Path(path).name
+            for line, record in read_records(path):
+                importer.add(source, line, record)
+        importer.finish()
+    return importer
@@ -0,0 +1,211 @@
+"""シフト自動作成のジョブと、期間を指定した作り直し
+
+画面からは enqueue_generation() でジョブを登録するだけにして、
+実際の生成は run_generation_worker コマンド（別プロセス）が行う。
+外部のメッセージブローカーは使わず、GenerationJob テーブルだけで動く（SQLite・PostgreSQL 共通）。
+"""
+import calendar
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Employee, GenerationJob, Shift
+from .scheduling import generate
+from .scheduling.store import build_problem, save_schedule
+
+PROGRESS_INTERVAL = 0.5  # 進捗をDBに書く間隔（秒）
+STALE_JOB_MESSAGE = "ワーカーが停止したため中断しました。もう一度自動作成してください"
+MAX_REGENERATE_DAYS = 31  # 画面から1回に作り直せる日数（1か月分。それより長い期間は月ごとに自動作成する）
+
+
+def generation_mode():
+    return getattr(settings, 'SHIFT_GENERATION_MODE', 'random')
+
+
+def month_days(year, month):
+    num_days = calendar.monthrange(year, month)[1]
+    return [date(year, month, d) for d in range(1, num_days + 1)]
+
+
+def generate_days(days, mode=None, progress=None, **options):
+    """days（連続した日付）のシフトを作って保存し、Result を返す"""
+    employees = list(Employee.objects.order_by(Employee.role_order_expression(), 'id'))
+    problem = build_problem(employees, days)
+    mode = mode or generation_mode()
+    options.setdefault('time_budget', getattr(settings, 'SHIFT_GENERATION_TIME_BUDGET', 2.0))
+    if mode == 'best':
+        options.setdefault('candidates', getattr(settings, 'SHIFT_GENERATION_CANDIDATES', 8))
+        options.setdefault('candidate_mode', getattr(settings, 'SHIFT_GENERATION_CANDIDATE_MODE', 'random'))
+        options.setdefault('workers', getattr(settings, 'SHIFT_GENERATION_WORKERS', 1))
+    result = generate(problem, mode=mode, progress=progress, **options)
+
+    # ✅ まとめて保存（失敗したら前のシフトに戻す）
+    save_schedule(days, result.assignments)
+    return result
+
+
+def generate_month(year, month, mode=None, progress=None, **options):
+    """1か月分のシフトを作って保存し、Result を返す"""
+    return generate_days(month_days(year, month), mode=mode, progress=progress, **options)
+
+
+def regenerate_range(start, end, mode=None, **options):
+    """start〜end の日だけシフトを作り直す（ほかの日のシフトはそのまま）
+
+    前後の確定シフト（前月末を含む）から連勤と月の勤務日数を引き継ぐので、
+    処理量は作り直す日数に比例する。
+    """
+    if start > end:
+        raise ValueError("開始日が終了日より後になっています")
+    mode = mode or generation_mode()
+    days = [start + timedelta(days=n) for n in range((end - start).days + 1)]
+    return generate_days(days, mode=mode, **options)
+
+
+def parse_regenerate_range(params):
+    """画面から送られた start/end（YYYY-MM-DD）を作り直す期間にする
+
+    リクエストの中で作り直すので、不正な値・MAX_REGENERATE_DAYS より長い期間の場合は ValueError。
+    """
+    start = date.fromisoformat(params.get('start', ''))
+    end = date.fromisoformat(params.get('end', ''))
+    if start > end:
+        raise ValueError("開始日が終了日より後になっています")
+    if (end - start).days >= MAX_REGENERATE_DAYS:
+        raise ValueError(f"一度に作り直せるのは {MAX_REGENERATE_DAYS} 日までです")
+    return start, end
+
+
+def requested_off_ranges(entries):
+    """希望休のうち、すでにシフトが入っている日を連続した期間 [(開始日, 終了日), ...] にまとめる"""
+    entries = list(entries)
+    if not entries:
+        return []
+    query = Q()
+    for entry in entries:
+        query |= Q(employee_id=entry.employee_id, date=entry.date)
+    dates = sorted(set(Shift.objects.filter(query).exclude(time_range='').values_list('date', flat=True)))
+    ranges = []
+    for d in dates:
+        if ranges and ranges[-1][1] + timedelta(days=1) == d:
+            ranges[-1][1] = d
+        else:
+            ranges.append([d, d])
+    return [tuple(r) for r in ranges]
+
+
+def regenerate_for_requested_off(entries, mode=None):
+    """追加した希望休の日だけ作り直し、作り直した期間のリストを返す"""
+    ranges = requested_off_ranges(entries)
+    for start, end in ranges:
+        regenerate_range(start, end, mode=mode)
+    return ranges
+
+
+def shortfall_message(result):
+    """人数が足りない日があれば、その内容の文を返す（無ければ空文字）
+
+    flow は {日付: 不足人数}、anneal・best は不足人数の合計を info['shortfall'] に入れる。
+    """
+    shortfall = result.info.get('shortfall')
+    if not shortfall:
+        return ""
+    if not isinstance(shortfall, dict):
+        return f"必要人数に合計{shortfall}人足りません"
+    days_text = "、".join(f"{d.day}日({n}人)" for d, n in sorted(shortfall.items()))
+    return f"必要人数を満たせない日があります: {days_text}"
+
+
+def enqueue_generation(year, month, mode=None):
+    """ジョブを登録して返す（すぐに戻る）"""
+    return GenerationJob.objects.create(
+        year=year,
+        month=month,
+        mode=mode or generation_mode(),
+        days_total=calendar.monthrange(year, month)[1],
+    )
+
+
+def generate_now(year, month, mode=None):
+    """画面からその場で（ワーカーを通さずに）1か月分を作って保存し、Result を返す
+
+    この時もジョブの行を作り、スコア・シードをワーカーの時と同じように残す
+    （best の当選シードで後から作り直せるように）。
+    """
+    job = GenerationJob.objects.create(
+        year=year,
+        month=month,
+        mode=mode or generation_mode(),
+        status='running',
+        days_total=calendar.monthrange(year, month)[1],
+        started_at=timezone.now(),
+    )
+    return run_job(job)
+
+
+def fail_stale_jobs(timeout=None):
+    """実行中のまま timeout 秒を過ぎたジョブ（ワーカーが落ちたもの）を失敗にし、その件数を返す"""
+    if timeout is None:
+        timeout = getattr(settings, 'SHIFT_GENERATION_JOB_TIMEOUT', 900)
+    now = timezone.now()
+    return GenerationJob.objects.filter(
+        status='running', started_at__lt=now - timedelta(seconds=timeout),
+    ).update(status='failed', message=STALE_JOB_MESSAGE, finished_at=now)
+
+
+def claim_next_job():
+    """待機中のジョブを1つ取り出して実行中にする（無ければ None）
+
+    複数のワーカーが同時に動いても、status の条件付き UPDATE で1つのワーカーだけが取れる。
+    取り出す前に、止まったワーカーが実行中のまま残したジョブを失敗にしておく。
+    """
+    fail_stale_jobs()
+    while True:
+        job = GenerationJob.objects.filter(status='queued').order_by('created_at', 'id').first()
+        if job is None:
+            return None
+        claimed = GenerationJob.objects.filter(pk=job.pk, status='queued').update(
+            status='running', started_at=timezone.now(),
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+class ProgressReporter:
+    """生成中の進捗を一定間隔でジョブに書き込む"""
+
+    def __init__(self, job, interval=PROGRESS_INTERVAL):
+        self.job = job
+        self.interval = interval
+        self.last_saved = 0.0
+
+    def __call__(self, days_done, score=None):
+        now = time.monotonic()
+        if now - self.last_saved < self.interval and days_done < self.job.days_total:
+            return
+        self.last_saved = now
+        fields = {'days_done': days_done}
+        if score is not None:
+            fields['score'] = score
+        GenerationJob.objects.filter(pk=self.job.pk).update(**fields)
+
+
+def run_job(job):
+    """ジョブを実行し、結果（完了・失敗）を保存する"""
+    try:
+        result = generate_month(job.year, job.month, mode=job.mode, progress=ProgressReporter(job))
+        message = shortfall_message(result)
+    except Exception as exc:
+        GenerationJob.objects.filter(pk=job.pk).update(
+            status='failed', message=f"{type(exc).__name__}: {exc}", finished_at=timezone.now(),
+        )
+        raise
+    GenerationJob.objects.filter(pk=job.pk).update(
+        status='done', days_done=job.days_total, score=result.score, seed=result.seed,
+        message=message, finished_at=timezone.now(),
+    )
+    return result
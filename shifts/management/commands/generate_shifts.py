@@ -0,0 +1,86 @@
+import calendar
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from shifts.exports import date_range
+from shifts.models import Employee
+from shifts.scheduling import ENGINES
+from shifts.scheduling.batch import generate_months
+from shifts.scheduling.store import build_problem, save_schedule
+
+
+def parse_month(value):
+    try:
+        year, month = map(int, value.split('-'))
+        return date(year, month, 1)
+    except ValueError:
+        raise CommandError(f'Invalid month {value!r} (expected YYYY-MM)') from None
+
+
+def month_end(first):
+    return first.replace(day=calendar.monthrange(first.year, first.month)[1])
+
+
+class Command(BaseCommand):
+    help = 'Generate shifts for a range of months in parallel and save them in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('start', help='First month (YYYY-MM)')
+        parser.add_argument('end', nargs='?', help='Last month (YYYY-MM, defaults to start)')
+        parser.add_argument('--workers', type=int, default=1, help='Number of worker processes')
+        parser.add_argument('--mode', choices=sorted(ENGINES), default=None)
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--time-budget', type=float, default=None, help='Seconds per month for anneal')
+        parser.add_argument('--dry-run', action='store_true', help='Generate without saving')
+
+    def handle(self, *args, **options):
+        start = parse_month(options['start'])
+        end = month_end(parse_month(options['end'] or options['start']))
+        if start > end:
+            raise CommandError('start must not be after end')
+        mode = options['mode'] or getattr(settings, 'SHIFT_GENERATION_MODE', 'random')
+        time_budget = options['time_budget'] or getattr(settings, 'SHIFT_GENERATION_TIME_BUDGET', 2.0)
+
+        total_started = time.perf_counter()
+        days = date_range(start, end)
+        employees = list(Employee.objects.order_by(Employee.role_order_expression(), 'id'))
+        problem = build_problem(employees, days)
+        load_seconds = time.perf_counter() - total_started
+
+        started = time.perf_counter()
+        months, fixup_seconds = generate_months(
+            problem, mode=mode, seed=options['seed'], workers=options['workers'], time_budget=time_budget,
+        )
+        generate_seconds = time.perf_counter() - started
+
+        for month_problem, result, seconds in months:
+            rate = len(result) / seconds if seconds else 0
+            fixed = result.info.get('boundary_fixed_days')
+            line = f'{month_problem.days[0]:%Y-%m}: {len(result)} shifts in {seconds:.2f}s ({rate:,.0f} shifts/s)'
+            if result.score is not None:
+                line += f', score={result.score}'
+            if fixed:
+                line += f', boundary fixed ({fixed} days)'
+            self.stdout.write(line)
+
+        assignments = [a for _, result, _ in months for a in result.assignments]
+        write_seconds = 0.0
+        if not options['dry_run']:
+            started = time.perf_counter()
+            save_schedule(days, assignments)
+            write_seconds = time.perf_counter() - started
+
+        total_seconds = time.perf_counter() - total_started
+        self.stdout.write(
+            f'load {load_seconds:.2f}s, generate {generate_seconds:.2f}s '
+            f'(boundary fixup {fixup_seconds:.2f}s), write {write_seconds:.2f}s'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(assignments)} shifts for {len(employees)} employees over {len(months)} months '
+            f'in {total_seconds:.2f}s ({len(assignments) / total_seconds:,.0f} shifts/s, '
+            f'mode={mode}, workers={options["workers"]})'
+            + (' [dry run]' if options['dry_run'] else '')
+        ))
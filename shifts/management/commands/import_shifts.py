@@ -0,0 +1,61 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from shifts.imports import READERS, RECORD_TYPES, import_files
+
+# 画面に出すエラーの最大数（全部は --errors のファイルに書く）
+SHOWN_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = 'Import employees, requested-off dates and shifts from CSV / XLSX / JSON files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help=f'Files to import ({", ".join(sorted(READERS))})')
+        parser.add_argument('--type', choices=sorted(set(RECORD_TYPES.values())), default=None,
+                            help='Record type for rows without a "type" column')
+        parser.add_argument('--batch-size', type=int, default=None, help='Rows per bulk_create')
+        parser.add_argument('--errors', help='Write every rejected row to this CSV file')
+        parser.add_argument('--strict', action='store_true', help='Roll back everything if any row is rejected')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and import, then roll back')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            with transaction.atomic():
+                importer = import_files(options['files'], default_type=options['type'],
+                                        batch_size=options['batch_size'])
+                rollback = options['dry_run'] or (options['strict'] and importer.errors)
+                if rollback:
+                    transaction.set_rollback(True)
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc)) from exc
+        elapsed = time.perf_counter() - started
+
+        errors = importer.errors
+        if options['errors']:
+            with open(options['errors'], 'w', newline='', encoding='utf-8-sig') as f:
+                writer = csv.writer(f)
+                writer.writerow(['file', 'line', 'error'])
+                writer.writerows(errors)
+        for source, line, message in errors[:SHOWN_ERRORS]:
+            self.stderr.write(f'{source}:{line}: {message}')
+        if len(errors) > SHOWN_ERRORS:
+            self.stderr.write(f'... and {len(errors) - SHOWN_ERRORS} more errors')
+
+        counts = importer.counts
+        rate = counts['rows'] / elapsed if elapsed else 0
+        summary = (
+            f"{counts['rows']} rows in {elapsed:.2f}s ({rate:,.0f} rows/s): "
+            f"{counts['employees_created']} employees created, {counts['employees_updated']} updated, "
+            f"{counts['requested_off']} requested-off dates, {counts['holidays']} holidays, "
+            f"{counts['shifts']} shifts ({counts['shifts_removed']} replaced), {len(errors)} errors"
+        )
+        if options['dry_run']:
+            summary += ' [dry run]'
+        if options['strict'] and errors:
+            raise CommandError(f'{summary} [rolled back]')
+        self.stdout.write(self.style.SUCCESS(summary) if not errors else self.style.WARNING(summary))
@@ -0,0 +1,63 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+
+from shifts.cache import bump_month_rows_versions, bump_month_versions
+from shifts.exports import date_range
+from shifts.models import Shift
+from shifts.summaries import check_coverage, check_summaries, rebuild_coverage, rebuild_summaries, whole_months
+
+
+def parse_month(value):
+    try:
+        year, month = map(int, value.split('-'))
+        return date(year, month, 1)
+    except ValueError:
+        raise CommandError(f'Invalid month {value!r} (expected YYYY-MM)') from None
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or check the monthly employee summaries and daily coverage from shifts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('start', nargs='?', help='First month (YYYY-MM, defaults to the first shift)')
+        parser.add_argument('end', nargs='?', help='Last month (YYYY-MM, defaults to start or the last shift)')
+        parser.add_argument('--check', action='store_true',
+                            help='Only report rows that differ from the shifts (exit status 1 if any)')
+
+    def handle(self, *args, **options):
+        if options['start']:
+            start = parse_month(options['start'])
+            end = parse_month(options['end'] or options['start'])
+        else:
+            bounds = Shift.objects.aggregate(start=Min('date'), end=Max('date'))
+            if bounds['start'] is None:
+                self.stdout.write('No shifts.')
+                return
+            start, end = bounds['start'], bounds['end']
+        start, end = whole_months(start, end)
+        if start > end:
+            raise CommandError('start must not be after end')
+
+        if options['check']:
+            problems = check_summaries(start, end)
+            for (emp_id, year, month), actual, expected in problems:
+                self.stdout.write(f'employee {emp_id} {year}-{month:02d}: stored={actual} expected={expected}')
+            coverage_problems = check_coverage(start, end)
+            for (day, time_range, role), actual, expected in coverage_problems:
+                self.stdout.write(f'coverage {day} {time_range} {role}: stored={actual} expected={expected}')
+            if problems or coverage_problems:
+                raise CommandError(f'{len(problems)} summaries and {len(coverage_problems)} coverage rows are out of date')
+            self.stdout.write(self.style.SUCCESS(f'Summaries for {start:%Y-%m}..{end:%Y-%m} are up to date'))
+            return
+
+        count = rebuild_summaries(start, end)
+        coverage = rebuild_coverage(start, end)
+        # 集計を直したので、キャッシュしたその期間の画面も作り直させる
+        days = date_range(start, end)
+        bump_month_versions(days)
+        bump_month_rows_versions(days)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {count} summaries and {coverage} coverage rows for {start:%Y-%m}..{end:%Y-%m}'
+        ))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from shifts.jobs import claim_next_job, run_job
+
+
+class Command(BaseCommand):
+    help = 'Process queued shift generation jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the queue once and exit')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            # 長く動き続けるので、切れた・古くなった DB 接続は毎回閉じる（次のクエリで繋ぎ直す）
+            close_old_connections()
+            job = None
+            started = time.perf_counter()
+            try:
+                job = claim_next_job()
+                if job is not None:
+                    result = run_job(job)
+            except Exception as exc:
+                if job is not None:
+                    self.stdout.write(self.style.ERROR(f'Job {job.pk} ({job}) failed: {exc}'))
+                    continue
+                # ジョブを取れなかった（DB がロック中・接続が切れたなど）時は、少し待ってやり直す
+                if options['once']:
+                    raise CommandError(f'Could not claim a job: {exc}') from exc
+                self.stdout.write(self.style.ERROR(f'Could not claim a job: {exc}'))
+                time.sleep(options['sleep'])
+                continue
+
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['sleep'])
+                continue
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(
+                f'Job {job.pk} ({job.year}/{job.month}) done in {elapsed:.1f}s: '
+                f'{len(result)} shifts, score={result.score}'
+            ))
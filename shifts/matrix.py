@@ -0,0 +1,143 @@
+"""シフト表（従業員×日）の行の組み立てと、行ごとの HTML のキャッシュ、列形式の API のデータ
+
+各行は日ごとの勤務時間帯のコード（パターン表の添字）の配列で持ち、
+{% shift_row %}（templatetags/shift_extras.py）で <tr> を1回の join で作る。
+行の HTML は (従業員, 月, 行のバージョン) をキーに 'matrix_rows' のキャッシュに置く。
+行のバージョンはその従業員のその月のシフトか、従業員の情報が変わった時だけ新しくなる
+（cache.row_versions / bump_row_versions）ので、表示のたびに描き直すのは変わった行だけになる。
+自動作成などでまとめて変えた時は、その月の全員の行を描き直す（bump_month_rows_versions）。
+"""
+import calendar
+from collections import defaultdict
+from datetime import date
+
+from django.core.cache import caches
+from django.db.models import FilteredRelation, Q
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from .cache import row_versions
+from .models import SHIFT_TIMES, Employee, Shift
+
+ROW_TEMPLATE = 'shifts/shift_matrix_row.html'
+ROW_CACHE = 'matrix_rows'
+# 行の HTML の形を変えた時は先頭の v を上げる（古い HTML を使わないように）
+ROW_KEY = 'shifts:matrix_row:v3:{}:{}-{:02d}:{}:{}:{}'
+ROW_TIMEOUT = 60 * 60 * 24 * 7
+
+# コード 0 は休み。ここに無い勤務時間帯は build_shift_matrix() が後ろに足す
+SHIFT_PATTERNS = ['', *SHIFT_TIMES]
+# API のシフト文字列で使う文字（コード n は n 文字目）
+CODE_CHARS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def new_pattern_table():
+    """パターン表（コード→勤務時間帯のリスト）と、その逆引き {勤務時間帯: コード}"""
+    patterns = list(SHIFT_PATTERNS)
+    return patterns, {pattern: code for code, pattern in enumerate(patterns)}
+
+
+def pattern_code(time_range, patterns, codes):
+    """time_range のコード（パターン表に無ければ後ろに足す）"""
+    code = codes.get(time_range)
+    if code is None:
+        code = codes[time_range] = len(patterns)
+        patterns.append(time_range)
+    return code
+
+
+def build_shift_matrix(employees, month_days, all_employees=True):
+    """従業員×日のシフト表の行と、パターン表（コード→勤務時間帯）を作る
+
+    月のシフトは1回のクエリで従業員順に読み込み、そのままメモリ上で
+    行に振り分ける（従業員や日数が増えてもクエリ数は同じ）。
+    行の 'codes' は日ごとの勤務時間帯のコード（パターン表の添字）。
+    all_employees=False の時は employees の分だけ読む。
+    勤務時間は employees_with_work_minutes() で付けた work_minutes を使う。
+    日ごとの出勤人数は DailyCoverage から読む（coverage_counts）。
+    """
+    month_shifts = Shift.objects.filter(date__range=(month_days[0], month_days[-1]))
+    if not all_employees:
+        month_shifts = month_shifts.filter(employee_id__in=[emp.id for emp in employees])
+    month_shifts = month_shifts.order_by('employee_id', 'date', 'id').values_list('employee_id', 'date', 'time_range')
+    patterns, codes = new_pattern_table()
+    day_index = {d: j for j, d in enumerate(month_days)}
+    emp_codes = defaultdict(lambda: [0] * len(month_days))  # {従業員ID: [コード, ...]}
+    for emp_id, d, time_range in month_shifts:
+        emp_codes[emp_id][day_index[d]] = pattern_code(time_range, patterns, codes)
+
+    shift_matrix = [
+        {
+            'id': emp.id,
+            'name': emp.name,
+            'role': emp.get_role_display(),
+            'work_minutes': emp.work_minutes,
+            'codes': emp_codes[emp.id],
+        }
+        for emp in employees
+    ]
+    return shift_matrix, patterns
+
+
+def render_matrix_rows(employees, month_days):
+    """シフト表の各行（<tr>）の HTML を employees の順に返す
+
+    キャッシュにある行はそのまま使い、無い行（シフトが変わった従業員）だけ
+    シフトを読んで描き、キャッシュに入れる。キャッシュへの問い合わせは
+    バージョンと HTML の get_many が1回ずつ。
+    """
+    year, month = month_days[0].year, month_days[0].month
+    versions = row_versions([emp.id for emp in employees], year, month)
+    keys = {emp.id: ROW_KEY.format(emp.id, year, month, *versions[emp.id]) for emp in employees}
+    row_cache = caches[ROW_CACHE]
+    html = row_cache.get_many(list(keys.values()))
+
+    missing = [emp for emp in employees if keys[emp.id] not in html]
+    if missing:
+        rows, patterns = build_shift_matrix(missing, month_days, all_employees=len(missing) == len(employees))
+        template = get_template(ROW_TEMPLATE)
+        rendered = {keys[row['id']]: template.render({'emp': row, 'patterns': patterns}) for row in rows}
+        row_cache.set_many(rendered, ROW_TIMEOUT)
+        html.update(rendered)
+    return [mark_safe(html[keys[emp.id]]) for emp in employees]
+
+
+def month_columns(year, month):
+    """1か月分のシフトを列形式の dict で返す（API 用。クエリは1回）
+
+    従業員は id・name・role の列に分け、シフトは従業員ごとに1本の文字列
+    （1日1文字。文字は CODE_CHARS の中の位置がパターン表のコード）にする。
+    パターン表が CODE_CHARS より長くなった時だけ、文字列の代わりにコードの配列を返す。
+    """
+    num_days = calendar.monthrange(year, month)[1]
+    first, last = date(year, month, 1), date(year, month, num_days)
+    rows = (
+        Employee.objects.annotate(
+            month_shift=FilteredRelation('shifts', condition=Q(shifts__date__range=(first, last))),
+        )
+        .order_by(Employee.role_order_expression(), 'id', 'month_shift__date', 'month_shift__id')
+        .values_list('id', 'name', 'role', 'month_shift__date', 'month_shift__time_range')
+    )
+
+    patterns, codes = new_pattern_table()
+    ids, names, roles, shifts = [], [], [], []
+    for emp_id, name, role, d, time_range in rows:
+        if not ids or ids[-1] != emp_id:
+            ids.append(emp_id)
+            names.append(name)
+            roles.append(role)
+            shifts.append([0] * num_days)
+        if d is not None:
+            shifts[-1][d.day - 1] = pattern_code(time_range, patterns, codes)
+
+    if len(patterns) <= len(CODE_CHARS):
+        shifts = [''.join(CODE_CHARS[code] for code in emp_codes) for emp_codes in shifts]
+    return {
+        'year': year,
+        'month': month,
+        'days': num_days,
+        'patterns': patterns,
+        'roles': dict(Employee.ROLE_CHOICES),
+        'employees': {'id': ids, 'name': names, 'role': roles},
+        'shifts': shifts,
+    }
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:05
+
+from datetime import time
+
+from django.db import migrations, models
+
+
+def fill_shift_times(apps, schema_editor):
+    """既存シフトの time_range（"9:00-17:00"）から開始・終了時刻と勤務時間を埋める"""
+    Shift = apps.get_model('shifts', 'Shift')
+    batch = []
+    for shift in Shift.objects.exclude(time_range='').only('id', 'time_range').iterator(chunk_size=2000):
+        start, end = shift.time_range.split('-')
+        sh, sm = map(int, start.split(':'))
+        eh, em = map(int, end.split(':'))
+        shift.start_time = time(sh, sm)
+        shift.end_time = time(eh, em)
+        shift.duration_minutes = (eh * 60 + em) - (sh * 60 + sm)
+        batch.append(shift)
+        if len(batch) >= 2000:
+            Shift.objects.bulk_update(batch, ['start_time', 'end_time', 'duration_minutes'])
+            batch = []
+    if batch:
+        Shift.objects.bulk_update(batch, ['start_time', 'end_time', 'duration_minutes'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shifts', '0009_employee_hourly_rate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shift',
+            name='duration_minutes',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='end_time',
+            field=models.TimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='start_time',
+            field=models.TimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='shift',
+            name='time_range',
+            field=models.CharField(blank=True, choices=[('9:00-17:00', '9:00-17:00'), ('11:00-19:00', '11:00-19:00'), ('13:00-21:00', '13:00-21:00')], max_length=20),
+        ),
+        migrations.RunPython(fill_shift_times, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shifts', '0011_generationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='seed',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def fill_summaries(apps, schema_editor):
+    """既存のシフトから従業員・月ごとの集計を作る"""
+    Employee = apps.get_model('shifts', 'Employee')
+    Shift = apps.get_model('shifts', 'Shift')
+    MonthlyEmployeeSummary = apps.get_model('shifts', 'MonthlyEmployeeSummary')
+    rates = dict(Employee.objects.values_list('id', 'hourly_rate'))
+    rows = (
+        Shift.objects.annotate(year=ExtractYear('date'), month=ExtractMonth('date'))
+        .values('employee_id', 'year', 'month')
+        .annotate(days=Count('id', filter=~Q(time_range='')), minutes=Sum('duration_minutes'))
+        .order_by()
+    )
+    MonthlyEmployeeSummary.objects.bulk_create([
+        MonthlyEmployeeSummary(
+            employee_id=row['employee_id'], year=row['year'], month=row['month'],
+            days_worked=row['days'], minutes_worked=row['minutes'] or 0,
+            pay=int(round((row['minutes'] or 0) / 60 * float(rates.get(row['employee_id']) or 0))),
+        )
+        for row in rows
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shifts', '0012_generationjob_seed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyEmployeeSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('month', models.IntegerField()),
+                ('days_worked', models.IntegerField(default=0)),
+                ('minutes_worked', models.IntegerField(default=0)),
+                ('pay', models.IntegerField(default=0)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_summaries', to='shifts.employee')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['year', 'month'], name='shifts_mont_year_8d4955_idx')],
+                'constraints': [models.UniqueConstraint(fields=('employee', 'year', 'month'), name='unique_monthly_summary')],
+            },
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:26
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_coverage(apps, schema_editor):
+    """既存のシフトから日ごと・勤務時間帯ごと・役職ごとの人数を作る"""
+    Shift = apps.get_model('shifts', 'Shift')
+    DailyCoverage = apps.get_model('shifts', 'DailyCoverage')
+    rows = (
+        Shift.objects.exclude(time_range='')
+        .values('date', 'time_range', 'employee__role')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    DailyCoverage.objects.bulk_create([
+        DailyCoverage(date=row['date'], time_range=row['time_range'], role=row['employee__role'], count=row['count'])
+        for row in rows
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shifts', '0013_monthlyemployeesummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCoverage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('time_range', models.CharField(max_length=20)),
+                ('role', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'time_range', 'role'), name='unique_daily_coverage')],
+            },
+        ),
+        migrations.RunPython(fill_coverage, migrations.RunPython.noop),
+    ]
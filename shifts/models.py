@@ -1,5 +1,9 @@
+from datetime import time
+
 from django.db import models
 
+from .scheduling.problem import SHIFT_TIMES, parse_time_range, shift_minutes
+
 WEEKDAYS = [
     (0, '月'),
     (1, '火'),
@@ -17,12 +21,6 @@ class ShiftRequirement(models.Model):
     def __str__(self):
         return f"{self.get_weekday_display()}: {self.min_staff}人"
 
-SHIFT_TIMES = [
-    "9:00-17:00",   # 早番
-    "11:00-19:00",  # 中番
-    "13:00-21:00",  # 遅番
-]
-
 class Employee(models.Model):
     ROLE_CHOICES = [
         ('manager', '正社員'),
@@ -44,6 +42,14 @@ class Employee(models.Model):
         """役職の並び順を返す"""
         return self.ROLE_ORDER.get(self.role, 99)
 
+    @classmethod
+    def role_order_expression(cls, field='role'):
+        """role_order() と同じ並び順を SQL で表す式（order_by に使う）"""
+        return models.Case(
+            *[models.When(**{field: role}, then=models.Value(order)) for role, order in cls.ROLE_ORDER.items()],
+            default=models.Value(99),
+            output_field=models.IntegerField(),
+        )
 
     def __str__(self):
         # 名前 + 役職 を返すようにする
@@ -73,9 +79,99 @@ class Shift(models.Model):
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='shifts')
     date = models.DateField()
     time_range = models.CharField(max_length=20, choices=[(t, t) for t in SHIFT_TIMES], blank=True)
+    # time_range から計算して保存しておく（集計を SQL だけで行うため）
+    start_time = models.TimeField(null=True, blank=True, editable=False)
+    end_time = models.TimeField(null=True, blank=True, editable=False)
+    duration_minutes = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['date']
 
+    def fill_times(self):
+        """time_range から開始・終了時刻と勤務時間（分）を設定する
+
+        bulk_create では save() が呼ばれないので、作成前にこれを呼ぶ。
+        """
+        if self.time_range:
+            (sh, sm), (eh, em) = parse_time_range(self.time_range)
+            self.start_time = time(sh, sm)
+            self.end_time = time(eh, em)
+            self.duration_minutes = shift_minutes(self.time_range)
+        else:
+            self.start_time = self.end_time = None
+            self.duration_minutes = 0
+        return self
+
+    def save(self, *args, **kwargs):
+        self.fill_times()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'time_range' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'start_time', 'end_time', 'duration_minutes'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.employee.name} - {self.date}"
+
+
+class GenerationJob(models.Model):
+    """シフト自動作成のジョブ（run_generation_worker コマンドが順番に処理する）"""
+    STATUS_CHOICES = [
+        ('queued', '待機中'),
+        ('running', '実行中'),
+        ('done', '完了'),
+        ('failed', '失敗'),
+    ]
+
+    year = models.IntegerField()
+    month = models.IntegerField()
+    mode = models.CharField(max_length=20, default='random')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued', db_index=True)
+    days_total = models.PositiveIntegerField(default=0)
+    days_done = models.PositiveIntegerField(default=0)  # 処理済みの日数
+    score = models.FloatField(null=True, blank=True)  # 途中・最終のスコア
+    seed = models.BigIntegerField(null=True, blank=True)  # 同じシフトを作り直す時のシード
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.year}年{self.month}月 ({self.get_status_display()})"
+
+
+class MonthlyEmployeeSummary(models.Model):
+    """従業員ごと・月ごとの勤務日数・勤務時間・給与の集計（shifts.summaries が更新する）"""
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='monthly_summaries')
+    year = models.IntegerField()
+    month = models.IntegerField()
+    days_worked = models.IntegerField(default=0)
+    minutes_worked = models.IntegerField(default=0)
+    pay = models.IntegerField(default=0)  # 勤務時間 × 今の時給（円）
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['employee', 'year', 'month'], name='unique_monthly_summary'),
+        ]
+        indexes = [models.Index(fields=['year', 'month'])]
+
+    def __str__(self):
+        return f"{self.employee_id}: {self.year}年{self.month}月 {self.minutes_worked / 60:.1f}時間"
+
+
+class DailyCoverage(models.Model):
+    """日ごと・勤務時間帯ごと・役職ごとの出勤人数（shifts.summaries が更新する）"""
+    date = models.DateField()
+    time_range = models.CharField(max_length=20)
+    role = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'time_range', 'role'], name='unique_daily_coverage'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.time_range} {self.role}: {self.count}人"
@@ -0,0 +1,18 @@
+"""シフト自動生成エンジン
+
+Django のモデルを使わず、プレーンなデータ（Problem）からシフトを作る。
+DB との読み書きは shifts.scheduling.store を使う。
+"""
+from .engine import ENGINES, generate
+from .problem import Assignment, Problem, Result, Rules, StaffMember, WorkState
+
+__all__ = [
+    'ENGINES',
+    'Assignment',
+    'Problem',
+    'Result',
+    'Rules',
+    'StaffMember',
+    'WorkState',
+    'generate',
+]
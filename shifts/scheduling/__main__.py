@@ -0,0 +1,90 @@
+"""シフト生成エンジンをコマンドラインから動かす（DB不要）
+
+架空の従業員でエンジンだけを実行し、処理時間を表示する。
+
+    python -m shifts.scheduling --employees 5000 --year 2025 --month 10
+    python -m shifts.scheduling --employees 5000 --months 3 --mode vectorized
+    python -m shifts.scheduling --employees 5000 --profile
+    python -m shifts.scheduling --employees 500 --mode best --candidates 16 --workers 4
+"""
+import argparse
+import calendar
+import cProfile
+import pstats
+import random
+import time
+from datetime import date
+
+from .engine import ENGINES, generate
+from .problem import SHIFT_TIMES, Problem, StaffMember
+
+
+def month_range(year, month, months=1):
+    """year/month から months か月分の日付リスト"""
+    days = []
+    for _ in range(months):
+        num_days = calendar.monthrange(year, month)[1]
+        days.extend(date(year, month, d) for d in range(1, num_days + 1))
+        year, month = (year, month + 1) if month < 12 else (year + 1, 1)
+    return days
+
+
+def synthetic_problem(num_employees, year, month, months=1, off_ratio=0.1, seed=0):
+    """架空の従業員・希望休で Problem を作る"""
+    rng = random.Random(seed)
+    days = month_range(year, month, months)
+    roles = ['manager', 'staff', 'part']
+    staff = [StaffMember(i, rng.randint(15, 22), rng.choice(roles)) for i in range(1, num_employees + 1)]
+    absences = {
+        s.id: {d for d in days if rng.random() < off_ratio}
+        for s in staff
+    }
+    return Problem(days, staff, absences, shift_times=SHIFT_TIMES)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m shifts.scheduling', description=__doc__.splitlines()[0])
+    today = date.today()
+    parser.add_argument('--employees', type=int, default=500)
+    parser.add_argument('--year', type=int, default=today.year)
+    parser.add_argument('--month', type=int, default=today.month)
+    parser.add_argument('--months', type=int, default=1, help='何か月分まとめて生成するか')
+    parser.add_argument('--mode', choices=sorted(ENGINES), default='random')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help='計測の繰り返し回数')
+    parser.add_argument('--time-budget', type=float, default=2.0, help='anneal の探索時間（秒）')
+    parser.add_argument('--max-moves', type=int, default=None, help='anneal の最大試行回数')
+    parser.add_argument('--candidates', type=int, default=8, help='best の候補の数')
+    parser.add_argument('--candidate-mode', choices=sorted(set(ENGINES) - {'best'}), default='random',
+                        help='best の候補を作るモード')
+    parser.add_argument('--workers', type=int, default=1, help='best で並列に動かすプロセス数')
+    parser.add_argument('--profile', action='store_true', help='cProfile の結果を表示する')
+    args = parser.parse_args(argv)
+
+    problem = synthetic_problem(args.employees, args.year, args.month, args.months, seed=args.seed)
+    options = {'time_budget': args.time_budget, 'max_moves': args.max_moves}
+    if args.mode == 'best':
+        options.update(candidates=args.candidates, candidate_mode=args.candidate_mode, workers=args.workers)
+
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        generate(problem, mode=args.mode, seed=args.seed, **options)
+        profiler.disable()
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+        return
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        result = generate(problem, mode=args.mode, seed=args.seed, **options)
+        timings.append(time.perf_counter() - start)
+
+    print(f"mode={args.mode} employees={args.employees} days={len(problem.days)}")
+    print(f"assignments={len(result)} best={min(timings) * 1000:.1f}ms")
+    if result.score is not None:
+        print(f"score={result.score} seed={result.seed} {result.info}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,418 @@
+"""焼きなまし法（simulated annealing）でシフトを改善する
+
+ランダム生成の結果を初期解にして、1マス単位の変更（出勤追加・削除・交代・時間帯変更）を
+繰り返しながら、次のペナルティの合計（スコア）を小さくしていく。
+
+- 人数不足: ShiftRequirement.min_staff（未設定の曜日は Rules の最低人数）に足りない人数
+- 人数超過: Rules の最大人数を超えた人数
+- 勤務日数超過: Employee.max_days を超えた日数（月ごと）
+- 連勤超過: Rules.max_consecutive を超えた日数
+- 不公平さ: 従業員ごとの勤務時間の分散（時間²）
+
+スコアは変更のたびに差分だけ計算するので、1回の評価は O(1)（連勤は前後の連続日数分）で済む。
+problem.fixed_shifts があれば、対象期間の前後の確定シフトの連勤と、同じ月の勤務日数も数に入れる。
+"""
+import math
+import time
+
+from .problem import Assignment, Result, shift_minutes
+
+
+class Weights:
+    """スコアの各ペナルティの重み"""
+    __slots__ = ('shortfall', 'overstaff', 'max_days', 'consecutive', 'fairness')
+
+    def __init__(self, shortfall=100.0, overstaff=10.0, max_days=100.0, consecutive=1000.0, fairness=1.0):
+        self.shortfall = shortfall
+        self.overstaff = overstaff
+        self.max_days = max_days
+        self.consecutive = consecutive
+        self.fairness = fairness
+
+
+class Annealer:
+    """シフト表の状態とスコアを持ち、差分更新する
+
+    grid[i * num_days + j] は従業員 i の j 日目の勤務（0=休み、k=shift_times[k-1]）。
+    """
+
+    def __init__(self, problem, weights=None):
+        self.problem = problem
+        self.weights = weights or Weights()
+        rules = problem.rules
+        days = problem.days
+        self.num_staff = n = len(problem.staff)
+        self.num_days = num_days = len(days)
+        self.max_consecutive = rules.max_consecutive
+        self.minutes = [0] + [shift_minutes(t) for t in problem.shift_times]
+
+        # 日ごとの必要人数・上限人数
+        self.targets = []
+        self.caps = []
+        for d in days:
+            min_daily, max_daily = rules.daily_range(d)
+            target = problem.requirements.get(d.weekday(), min_daily)
+            self.targets.append(target)
+            self.caps.append(max(target, max_daily))
+
+        # 日付 → 月の番号（勤務日数の上限は月ごと）
+        months = {}
+        self.day_month = [months.setdefault((d.year, d.month), len(months)) for d in days]
+        self.num_months = len(months)
+
+        # 対象期間の前後に続いている確定シフトの連勤日数
+        fixed = problem.fixed_ordinals()
+        self.runs_before = problem.consecutive_runs_before_start(fixed)
+        self.runs_after = [self.max_consecutive - limit for limit in problem.consecutive_limits_at_end(fixed)]
+
+        # 希望休・休日のマスは出勤にしない
+        day_index = {d: j for j, d in enumerate(days)}
+        self.blocked = bytearray(n * num_days)
+        for i, off_days in enumerate(problem.absence_sets()):
+            for d in off_days:
+                j = day_index.get(d)
+                if j is not None:
+                    self.blocked[i * num_days + j] = 1
+
+        self.max_days = [s.max_days for s in problem.staff]
+        self.grid = [0] * (n * num_days)
+        self.day_counts = [0] * num_days
+        self.day_workers = [[] for _ in range(num_days)]
+        self.positions = [-1] * (n * num_days)  # day_workers 内での位置
+        # 月の勤務日数は、同じ月の確定シフトの日数から数え始める
+        self.month_counts = [0] * (n * self.num_months)
+        for (year, month), k in months.items():
+            for i, count in enumerate(problem.fixed_month_counts(fixed, year, month)):
+                self.month_counts[i * self.num_months + k] = count
+        self.work_minutes = [0] * n
+
+        # スコアの内訳（確定シフトだけで超えている分も含める）
+        self.shortfall = sum(self.targets)
+        self.overstaff = 0
+        self.max_days_excess = sum(
+            max(0, count - self.max_days[cell // self.num_months])
+            for cell, count in enumerate(self.month_counts)
+        )
+        self.consecutive_excess = sum(
+            self._run_excess(run) for run in (*self.runs_before, *self.runs_after)
+        )
+        self.sum_minutes = 0
+        self.sum_squares = 0
+
+    # ---------- 初期解 ----------
+
+    def load(self, assignments):
+        """Assignment のリストを初期状態として読み込む"""
+        staff_index = {s.id: i for i, s in enumerate(self.problem.staff)}
+        day_index = {d: j for j, d in enumerate(self.problem.days)}
+        pattern_index = {t: k for k, t in enumerate(self.problem.shift_times, start=1)}
+        for a in assignments:
+            i = staff_index[a.employee_id]
+            j = day_index[a.date]
+            if not self.grid[i * self.num_days + j]:
+                self.apply(i, j, pattern_index.get(a.time_range, 1))
+
+    def assignments(self, grid=None):
+        grid = grid or self.grid
+        staff = self.problem.staff
+        shift_times = self.problem.shift_times
+        num_days = self.num_days
+        result = []
+        for j, d in enumerate(self.problem.days):
+            for i in range(self.num_staff):
+                p = grid[i * num_days + j]
+                if p:
+                    result.append(Assignment(staff[i].id, d, shift_times[p - 1]))
+        return result
+
+    # ---------- スコア ----------
+
+    def fairness(self, sum_minutes=None, sum_squares=None):
+        """勤務時間の分散（時間²）"""
+        n = self.num_staff or 1
+        s1 = self.sum_minutes if sum_minutes is None else sum_minutes
+        s2 = self.sum_squares if sum_squares is None else sum_squares
+        return (s2 - s1 * s1 / n) / n / 3600.0
+
+    def score(self):
+        w = self.weights
+        return (
+            w.shortfall * self.shortfall
+            + w.overstaff * self.overstaff
+            + w.max_days * self.max_days_excess
+            + w.consecutive * self.consecutive_excess
+            + w.fairness * self.fairness()
+        )
+
+    def breakdown(self):
+        return {
+            'shortfall': self.shortfall,
+            'overstaff': self.overstaff,
+            'max_days_excess': self.max_days_excess,
+            'consecutive_excess': self.consecutive_excess,
+            'hours_variance': round(self.fairness(), 3),
+        }
+
+    def _run_excess(self, length):
+        return max(0, length - self.max_consecutive)
+
+    def _runs_around(self, i, j):
+        """j 日目の前後に続いている連勤日数 (前, 後)
+
+        対象期間の端まで続いていれば、その先の確定シフトの連勤日数も足す。
+        """
+        grid = self.grid
+        base = i * self.num_days
+        left = 0
+        k = j - 1
+        while k >= 0 and grid[base + k]:
+            left += 1
+            k -= 1
+        if k < 0:
+            left += self.runs_before[i]
+        right = 0
+        k = j + 1
+        while k < self.num_days and grid[base + k]:
+            right += 1
+            k += 1
+        if k >= self.num_days:
+            right += self.runs_after[i]
+        return left, right
+
+    def _staff_delta(self, i, j, working):
+        """従業員 i の j 日目を出勤(True)/休み(False)に変えた時の (日数超過, 連勤超過) の変化"""
+        sign = 1 if working else -1
+        count = self.month_counts[i * self.num_months + self.day_month[j]]
+        limit = self.max_days[i]
+        if working:
+            d_max_days = 1 if count + 1 > limit else 0
+        else:
+            d_max_days = -1 if count > limit else 0
+        left, right = self._runs_around(i, j)
+        joined = self._run_excess(left + 1 + right) - self._run_excess(left) - self._run_excess(right)
+        return d_max_days, sign * joined
+
+    def _coverage_delta(self, j, change):
+        count = self.day_counts[j]
+        target = self.targets[j]
+        cap = self.caps[j]
+        d_short = max(0, target - count - change) - max(0, target - count)
+        d_over = max(0, count + change - cap) - max(0, count - cap)
+        return d_short, d_over
+
+    def _fairness_delta(self, changes):
+        """changes: [(従業員, 勤務分数の増減), ...] の時の分散の変化"""
+        s1 = self.sum_minutes
+        s2 = self.sum_squares
+        work_minutes = self.work_minutes
+        for i, dm in changes:
+            m = work_minutes[i]
+            s1 += dm
+            s2 += (m + dm) * (m + dm) - m * m
+        return self.fairness(s1, s2) - self.fairness()
+
+    def delta(self, i, j, p):
+        """従業員 i の j 日目を p に変えた時のスコアの変化"""
+        w = self.weights
+        old = self.grid[i * self.num_days + j]
+        score = 0.0
+        if bool(old) != bool(p):
+            d_short, d_over = self._coverage_delta(j, 1 if p else -1)
+            d_max_days, d_consec = self._staff_delta(i, j, bool(p))
+            score += (
+                w.shortfall * d_short + w.overstaff * d_over
+                + w.max_days * d_max_days + w.consecutive * d_consec
+            )
+        dm = self.minutes[p] - self.minutes[old]
+        if dm:
+            score += w.fairness * self._fairness_delta([(i, dm)])
+        return score
+
+    def swap_delta(self, a, b, j):
+        """j 日目の勤務を a から b に交代した時のスコアの変化（人数は変わらない）"""
+        w = self.weights
+        m = self.minutes[self.grid[a * self.num_days + j]]
+        a_max, a_consec = self._staff_delta(a, j, False)
+        b_max, b_consec = self._staff_delta(b, j, True)
+        return (
+            w.max_days * (a_max + b_max)
+            + w.consecutive * (a_consec + b_consec)
+            + w.fairness * self._fairness_delta([(a, -m), (b, m)])
+        )
+
+    # ---------- 更新 ----------
+
+    def apply(self, i, j, p):
+        """従業員 i の j 日目を p に変更し、スコアの内訳を更新する"""
+        cell = i * self.num_days + j
+        old = self.grid[cell]
+        if bool(old) != bool(p):
+            change = 1 if p else -1
+            d_short, d_over = self._coverage_delta(j, change)
+            d_max_days, d_consec = self._staff_delta(i, j, bool(p))
+            self.shortfall += d_short
+            self.overstaff += d_over
+            self.max_days_excess += d_max_days
+            self.consecutive_excess += d_consec
+            self.day_counts[j] += change
+            self.month_counts[i * self.num_months + self.day_month[j]] += change
+            workers = self.day_workers[j]
+            if p:
+                self.positions[cell] = len(workers)
+                workers.append(i)
+            else:
+                pos = self.positions[cell]
+                last = workers.pop()
+                if last != i:
+                    workers[pos] = last
+                    self.positions[last * self.num_days + j] = pos
+                self.positions[cell] = -1
+        dm = self.minutes[p] - self.minutes[old]
+        if dm:
+            m = self.work_minutes[i]
+            self.sum_minutes += dm
+            self.sum_squares += (m + dm) * (m + dm) - m * m
+            self.work_minutes[i] = m + dm
+        self.grid[cell] = p
+
+    # ---------- 探索 ----------
+
+    def run(self, rng, time_budget=1.0, max_moves=None, start_temperature=50.0, end_temperature=0.05, progress=None):
+        """time_budget 秒（または max_moves 回）まで焼きなましを行い、最良の状態に戻す
+
+        progress を渡すと、1024回ごとに (経過に応じた日数, 現在の最良スコア) で呼ぶ。
+        """
+        n = self.num_staff
+        num_days = self.num_days
+        num_patterns = len(self.minutes) - 1
+        if not n or not num_days or not num_patterns:
+            return {'moves': 0, 'accepted': 0}
+        if not time_budget and not max_moves:
+            time_budget = 1.0
+        grid = self.grid
+        blocked = self.blocked
+        day_workers = self.day_workers
+        random = rng.random
+        randrange = rng.randrange
+
+        current = self.score()
+        best = current
+        # 最良の状態は、その都度コピーせずに「base に journal の先頭 best_length 件を当てた状態」として覚える
+        # （best_length が -1 なら best_grid）。journal が長くなったら best_grid に書き出して base を取り直す
+        best_grid = list(grid)
+        base = list(grid)
+        journal = []  # base からの変更 [(マス, 値), ...]
+        best_length = -1
+        temperature = start_temperature
+        cooling = math.log(end_temperature / start_temperature)
+        started = time.perf_counter()
+        moves = accepted = 0
+
+        while True:
+            if moves & 1023 == 0:
+                fraction = (time.perf_counter() - started) / time_budget if time_budget else 0.0
+                if max_moves:
+                    fraction = max(fraction, moves / max_moves)
+                if fraction >= 1.0:
+                    break
+                temperature = start_temperature * math.exp(cooling * fraction)
+                if len(journal) > len(grid):
+                    if best_length >= 0:
+                        best_grid = replay(base, journal, best_length)
+                    base = list(grid)
+                    journal.clear()
+                    best_length = -1
+                if progress is not None:
+                    progress(int(num_days * fraction), best)
+            moves += 1
+
+            j = randrange(num_days)
+            workers = day_workers[j]
+            kind = random()
+            if kind < 0.2 or not workers:
+                # 出勤を追加
+                i = randrange(n)
+                if grid[i * num_days + j] or blocked[i * num_days + j]:
+                    continue
+                p = randrange(num_patterns) + 1
+                delta = self.delta(i, j, p)
+                move = (i, j, p)
+            elif kind < 0.4:
+                # 出勤を削除
+                i = workers[randrange(len(workers))]
+                delta = self.delta(i, j, 0)
+                move = (i, j, 0)
+            elif kind < 0.85:
+                # 別の人と交代
+                a = workers[randrange(len(workers))]
+                b = randrange(n)
+                if grid[b * num_days + j] or blocked[b * num_days + j]:
+                    continue
+                delta = self.swap_delta(a, b, j)
+                move = None
+            else:
+                # 時間帯を変更
+                if num_patterns < 2:
+                    continue
+                i = workers[randrange(len(workers))]
+                p = randrange(num_patterns) + 1
+                if p == grid[i * num_days + j]:
+                    continue
+                delta = self.delta(i, j, p)
+                move = (i, j, p)
+
+            if delta > 0 and random() >= math.exp(-delta / temperature):
+                continue
+            accepted += 1
+            current += delta
+            if move is None:
+                p = grid[a * num_days + j]
+                self.apply(a, j, 0)
+                self.apply(b, j, p)
+                journal.append((a * num_days + j, 0))
+                journal.append((b * num_days + j, p))
+            else:
+                self.apply(*move)
+                journal.append((move[0] * num_days + j, move[2]))
+            if current < best - 1e-9:
+                best = current
+                best_length = len(journal)
+
+        if best_length >= 0:
+            best_grid = replay(base, journal, best_length)
+        self.restore(best_grid)
+        return {'moves': moves, 'accepted': accepted}
+
+    def restore(self, grid):
+        """別に保存しておいた grid の状態に戻す（スコアも計算し直す）"""
+        fresh = Annealer(self.problem, self.weights)
+        num_days = self.num_days
+        for cell, p in enumerate(grid):
+            if p:
+                fresh.apply(cell // num_days, cell % num_days, p)
+        for name in (
+            'grid', 'day_counts', 'day_workers', 'positions', 'month_counts', 'work_minutes',
+            'shortfall', 'overstaff', 'max_days_excess', 'consecutive_excess', 'sum_minutes', 'sum_squares',
+        ):
+            setattr(self, name, getattr(fresh, name))
+
+
+def replay(base, journal, length):
+    """base に journal の先頭 length 件の変更を当てた grid を返す"""
+    grid = list(base)
+    for cell, p in journal[:length]:
+        grid[cell] = p
+    return grid
+
+
+def generate_annealing(problem, rng, time_budget=1.0, max_moves=None, weights=None, initial=None,
+                       progress=None, **options):
+    """ランダム生成（または initial）から焼きなましでスコアを下げたシフトを返す"""
+    from .engine import generate_random
+
+    annealer = Annealer(problem, weights)
+    annealer.load(generate_random(problem, rng) if initial is None else initial)
+    initial_score = annealer.score()
+    stats = annealer.run(rng, time_budget=time_budget, max_moves=max_moves, progress=progress)
+    info = {'initial_score': round(initial_score, 3), **stats, **annealer.breakdown()}
+    return Result(annealer.assignments(), score=round(annealer.score(), 3), info=info)
@@ -0,0 +1,132 @@
+"""複数か月分のシフトをプロセスを分けて並列に生成する
+
+月ごとの Problem に分けてプロセスプールで同時に生成し、そのあと月の境目だけを
+順番に見直す（前月末からの連勤が上限を超える人がいれば、翌月の最初の数日を作り直す）。
+最初の月は、確定シフト（DB にある前月のシフト）との境目を見直す。
+DB は使わないので、子プロセスでは Django を読み込まない。
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .engine import generate
+from .problem import Problem
+
+
+def split_by_month(problem):
+    """Problem を月ごとの Problem のリストに分ける（確定シフト・希望休はそのまま渡す）"""
+    months = {}
+    for d in problem.days:
+        months.setdefault((d.year, d.month), []).append(d)
+    return [
+        Problem(days, problem.staff, problem.absences, problem.requirements,
+                problem.shift_times, problem.rules, problem.fixed_shifts)
+        for days in months.values()
+    ]
+
+
+def month_seed(seed, index):
+    return None if seed is None else seed + index
+
+
+def run_month(index, problem, mode, seed, options):
+    """1か月分を生成して (index, Result, 秒数) を返す（子プロセスで実行する）"""
+    started = time.perf_counter()
+    result = generate(problem, mode=mode, seed=month_seed(seed, index), **options)
+    return index, result, time.perf_counter() - started
+
+
+def worked_days(assignments):
+    """{従業員ID: {勤務日(toordinal), ...}}"""
+    worked = {}
+    for a in assignments:
+        worked.setdefault(a.employee_id, set()).add(a.date.toordinal())
+    return worked
+
+
+def boundary_violations(prev_worked, next_assignments, boundary, max_consecutive):
+    """boundary（翌月1日）をまたぐ連勤が上限を超える従業員IDの集合
+
+    prev_worked は boundary より前の勤務日 {従業員ID: {勤務日(toordinal), ...}}。
+    """
+    next_worked = worked_days(next_assignments)
+    first = boundary.toordinal()
+    violations = set()
+    for emp_id, before in prev_worked.items():
+        after = next_worked.get(emp_id)
+        if not after or first not in after or first - 1 not in before:
+            continue
+        run = 0
+        while first - 1 - run in before:
+            run += 1
+        day = first
+        while day in after:
+            run += 1
+            day += 1
+        if run > max_consecutive:
+            violations.add(emp_id)
+    return violations
+
+
+def fix_boundary(problem, prev_assignments, result, mode='random', seed=None, **options):
+    """前月末からの連勤が上限を超える人がいれば、この月の最初の数日を作り直す
+
+    前月末の勤務は prev_assignments（前の月の生成結果）と problem.fixed_shifts の両方から数える。
+    作り直すのは最初の max_consecutive 日だけを mode で生成し、前月のシフトとこの月の残りの日は
+    確定として扱う。作り直した日数を返す（問題がなければ0）。
+    """
+    rules = problem.rules
+    boundary = problem.days[0]
+    fixed = {emp_id: set(days) for emp_id, days in problem.fixed_shifts.items()}
+    for a in prev_assignments:
+        fixed.setdefault(a.employee_id, set()).add(a.date)
+    prev_worked = {emp_id: {d.toordinal() for d in days} for emp_id, days in fixed.items()}
+    if not boundary_violations(prev_worked, result.assignments, boundary, rules.max_consecutive):
+        return 0
+
+    window = problem.days[:rules.max_consecutive]
+    window_set = set(window)
+    kept = [a for a in result.assignments if a.date not in window_set]
+    for a in kept:
+        fixed.setdefault(a.employee_id, set()).add(a.date)
+
+    window_problem = Problem(window, problem.staff, problem.absences, problem.requirements,
+                             problem.shift_times, rules, fixed)
+    patch = generate(window_problem, mode=mode, seed=seed, **options)
+    result.assignments = sorted(patch.assignments + kept, key=lambda a: a.date)
+    return len(window)
+
+
+def generate_months(problem, mode='random', seed=None, workers=1, **options):
+    """problem の期間を月ごとに並列で生成し、月の境目を直して月ごとの結果を返す
+
+    戻り値は [(月の Problem, Result, 生成の秒数), ...] と、境目の作り直しにかかった秒数。
+    """
+    month_problems = split_by_month(problem)
+    results = [None] * len(month_problems)
+    timings = [0.0] * len(month_problems)
+
+    if workers > 1 and len(month_problems) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(month_problems))) as pool:
+            futures = [
+                pool.submit(run_month, index, month_problem, mode, seed, options)
+                for index, month_problem in enumerate(month_problems)
+            ]
+            for future in futures:
+                index, result, seconds = future.result()
+                results[index] = result
+                timings[index] = seconds
+    else:
+        for index, month_problem in enumerate(month_problems):
+            _, results[index], timings[index] = run_month(index, month_problem, mode, seed, options)
+
+    # 月の境目は前の月から順番に直す（前の月の最終結果を確定として使う）
+    # 最初の月は前の結果がないので、確定シフトとの境目だけを見る
+    started = time.perf_counter()
+    for index, month_problem in enumerate(month_problems):
+        prev_assignments = results[index - 1].assignments if index else []
+        fixed_days = fix_boundary(month_problem, prev_assignments, results[index],
+                                  mode=mode, seed=month_seed(seed, index), **options)
+        results[index].info['boundary_fixed_days'] = fixed_days
+    fixup_seconds = time.perf_counter() - started
+
+    return list(zip(month_problems, results, timings)), fixup_seconds
@@ -0,0 +1,71 @@
+"""複数の候補を並列に生成し、スコアが一番よいものを選ぶ（best-of-N）
+
+候補ごとに別のシードで生成し、焼きなましと同じスコア（人数不足・人数超過・
+勤務日数超過・連勤超過・勤務時間の分散）で比べる。選んだ候補のシードを
+Result.seed に入れるので、generate(problem, mode=候補のモード, seed=そのシード) で再現できる。
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .annealing import Annealer, Weights
+from .problem import Result
+
+SEED_RANGE = 2 ** 31
+
+
+def score_schedule(problem, assignments, weights=None):
+    """割り当てのスコアと内訳を返す（小さいほどよい）"""
+    annealer = Annealer(problem, weights)
+    annealer.load(assignments)
+    return round(annealer.score(), 3), annealer.breakdown()
+
+
+def run_candidate(problem, mode, seed, weights, options):
+    """1つの候補を生成して採点する（子プロセスで実行する）"""
+    from .engine import generate
+
+    result = generate(problem, mode=mode, seed=seed, **options)
+    result.score, breakdown = score_schedule(problem, result.assignments, weights)
+    result.info.update(breakdown)
+    return result
+
+
+def generate_best(problem, rng, candidates=8, candidate_mode='random', workers=1, weights=None,
+                  progress=None, **options):
+    """candidates 個の候補を作り、スコアが一番小さいものを返す"""
+    if candidate_mode == 'best':
+        raise ValueError("candidate_mode must not be 'best'")
+    candidates = max(1, candidates)
+    weights = weights or Weights()
+    seeds = [rng.randrange(SEED_RANGE) for _ in range(candidates)]
+    days_total = len(problem.days)
+
+    results = []
+
+    def collect(result):
+        results.append(result)
+        if progress:
+            best_score = min(r.score for r in results)
+            progress(days_total * len(results) // candidates, best_score)
+
+    if workers > 1 and candidates > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, candidates)) as pool:
+            futures = [
+                pool.submit(run_candidate, problem, candidate_mode, seed, weights, options)
+                for seed in seeds
+            ]
+            for future in as_completed(futures):
+                collect(future.result())
+    else:
+        for seed in seeds:
+            collect(run_candidate(problem, candidate_mode, seed, weights, options))
+
+    # 同じスコアならシードの並びで先のものを選ぶ（並列でも結果が変わらないように）
+    order = {seed: k for k, seed in enumerate(seeds)}
+    best = min(results, key=lambda r: (r.score, order[r.seed]))
+    info = dict(best.info)
+    info.update(
+        candidate_mode=candidate_mode,
+        candidates=candidates,
+        candidate_scores=sorted(r.score for r in results),
+    )
+    return Result(best.assignments, seed=best.seed, score=best.score, info=info)
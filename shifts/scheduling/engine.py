@@ -0,0 +1,118 @@
+"""シフト自動生成のアルゴリズム本体
+
+どのモードも Problem を受け取って Result を返す。
+"""
+import random
+
+from .problem import Assignment, Result, WorkState
+
+
+def generate_random(problem, rng, progress=None, **options):
+    """日付順にランダムで出勤者を選ぶ（従来のシフト自動作成と同じ方法）
+
+    希望休・連勤上限・月の最大勤務日数を守り、1日の人数は Rules の範囲からランダムに決める。
+    problem.fixed_shifts があれば、対象期間の前後の確定シフトから連勤と勤務日数を引き継ぐ。
+    """
+    rules = problem.rules
+    shift_times = problem.shift_times
+    staff_ids = [s.id for s in problem.staff]
+    max_days = [s.max_days for s in problem.staff]
+    absences = problem.absence_sets()
+    fixed = problem.fixed_ordinals()
+    state = WorkState(len(staff_ids))
+    assigned = state.assigned
+    assignments = []
+    current_month = None
+    max_runs = [rules.max_consecutive] * len(staff_ids)
+    last_day = problem.days[-1] if problem.days else None
+    if problem.days:
+        state.seed(fixed, problem.days[0])
+
+    # ✅ 日付を順番に処理(例：10/1日→2日→3日...)
+    for day_number, d in enumerate(problem.days, start=1):
+        today = d.toordinal()
+        if (d.year, d.month) != current_month:
+            # 勤務日数の上限は月ごと（確定シフトの分は最初から数えておく）
+            current_month = (d.year, d.month)
+            state.reset_assigned(problem.fixed_month_counts(fixed, d.year, d.month))
+        if d == last_day:
+            # 翌日から確定シフトが続く人は、その分だけ連勤の余裕が少ない
+            max_runs = problem.consecutive_limits_at_end(fixed)
+
+        available = [
+            i for i, off_days in enumerate(absences)
+            if d not in off_days
+            and assigned[i] < max_days[i]
+            and state.run_if_working(i, today) <= max_runs[i]
+        ]
+
+        # ランダムに選ぶ
+        if available:
+            min_daily, max_daily = rules.daily_range(d)
+            num_to_assign = min(len(available), rng.randint(min_daily, max_daily))
+            chosen = rng.sample(available, num_to_assign)
+        else:
+            chosen = []
+
+        for i in chosen:
+            assignments.append(Assignment(staff_ids[i], d, rng.choice(shift_times)))
+        state.advance(today, chosen)
+        if progress:
+            progress(day_number, None)
+
+    return assignments
+
+
+def generate_vectorized(problem, rng, progress=None, **options):
+    """NumPy で候補者をまとめて絞り込む（結果は random と同じ）"""
+    from .vectorized import generate_vectorized
+    return generate_vectorized(problem, rng, progress)
+
+
+def generate_annealing(problem, rng, **options):
+    """焼きなまし法で人数・勤務日数・公平さのスコアを最小化する"""
+    from .annealing import generate_annealing
+    return generate_annealing(problem, rng, **options)
+
+
+def generate_flow(problem, rng, **options):
+    """最大流で必要人数・max_days・連勤を守ったシフトを作る"""
+    from .flow import generate_flow
+    return generate_flow(problem, rng, **options)
+
+
+def generate_best(problem, rng, **options):
+    """候補を複数（並列で）作り、スコアが一番よいものを選ぶ"""
+    from .candidates import generate_best
+    return generate_best(problem, rng, **options)
+
+
+ENGINES = {
+    'random': generate_random,
+    'vectorized': generate_vectorized,
+    'anneal': generate_annealing,
+    'flow': generate_flow,
+    'best': generate_best,
+}
+
+
+def generate(problem, mode='random', seed=None, **options):
+    """指定したモードでシフトを生成する
+
+    seed を指定すると同じ入力から同じ結果が得られる（anneal は max_moves で止めた場合）。
+    best は選んだ候補のシードを Result.seed に入れて返す。
+    options はモードごとの設定（anneal の time_budget、best の candidates・workers など）。
+    options['progress'] に関数を渡すと、途中経過 (処理済みの日数, スコア) で呼ばれる。
+    """
+    try:
+        engine = ENGINES[mode]
+    except KeyError:
+        raise ValueError(f"Unknown generation mode: {mode!r}") from None
+    rng = random.Random(seed)
+    result = engine(problem, rng, **options)
+    if not isinstance(result, Result):
+        result = Result(result)
+    if result.seed is None:
+        result.seed = seed
+    result.info['mode'] = mode
+    return result
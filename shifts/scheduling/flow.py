@@ -0,0 +1,325 @@
+"""最大流（Dinic 法）で必要人数を満たすシフトを作る
+
+1か月を次のネットワークとして解く。
+
+    source → (従業員, 月) → (従業員, 区間) → 日 → sink
+
+- (従業員, 月) の容量: その月の勤務日数の上限（max_days から確定シフトの日数を引いたものと、
+  公平さのための上限 U の小さい方）
+- (従業員, 区間) の容量: 連勤防止のため、区間の長さ - 1 日まで（rest_blocks）
+- 従業員 → 日 の辺: 希望休・休日でない日だけ（容量1）
+- 日 → sink の容量: その日の必要人数（ShiftRequirement.min_staff）
+
+区間は長さ L = max_consecutive // 2 + 1 までで、どの区間でも1日は休むので、連勤は隣り合う
+2つの区間にしかまたがらず 2(L - 1) ≤ max_consecutive 日に収まる（max_consecutive が2以上の場合）。
+max_consecutive が1以下の時は、この区間では隣の区間とつながって2連勤になるので、
+長さ1の区間を1日おきに上限1・0にする（働ける日は従業員ごとに偶数日・奇数日に分ける）。
+その分だけ解は狭くなるが、届かなければ下の shortfall として報告する。
+対象期間の前後の確定シフト（problem.fixed_shifts）から続く連勤は、最初と最後の区間を短くして守る。
+最大流が必要人数の合計に届けば、全ての日の必要人数・max_days・希望休・連勤を守ったシフトになる。
+届かない場合は、どの日が何人足りないかを info['shortfall'] に入れて返す。
+U は二分探索で最小にするので、勤務日数はなるべく均等になる。
+"""
+from collections import deque
+
+from .problem import Assignment, Result
+
+
+class FlowNetwork:
+    """Dinic 法の最大流（辺は配列で持つ。e と e ^ 1 が逆辺）"""
+    __slots__ = ('head', 'to', 'cap', 'next')
+
+    def __init__(self, size):
+        self.head = [-1] * size
+        self.to = []
+        self.cap = []
+        self.next = []
+
+    def add_node(self):
+        self.head.append(-1)
+        return len(self.head) - 1
+
+    def add_edge(self, u, v, capacity):
+        """u → v の辺を追加し、その辺の番号を返す"""
+        e = len(self.to)
+        self.to += (v, u)
+        self.cap += (capacity, 0)
+        self.next += (self.head[u], self.head[v])
+        self.head[u] = e
+        self.head[v] = e + 1
+        return e
+
+    def flow_on(self, e):
+        """辺 e に流れている量"""
+        return self.cap[e ^ 1]
+
+    def _levels(self, source, sink):
+        head, to, cap, nxt = self.head, self.to, self.cap, self.next
+        level = [-1] * len(head)
+        level[source] = 0
+        queue = deque([source])
+        while queue:
+            u = queue.popleft()
+            e = head[u]
+            while e != -1:
+                v = to[e]
+                if cap[e] > 0 and level[v] < 0:
+                    level[v] = level[u] + 1
+                    queue.append(v)
+                e = nxt[e]
+        return level if level[sink] >= 0 else None
+
+    def max_flow(self, source, sink):
+        to, cap, nxt = self.to, self.cap, self.next
+        total = 0
+        while True:
+            level = self._levels(source, sink)
+            if level is None:
+                return total
+            current = list(self.head)  # 各頂点で次に調べる辺
+            path = []  # source からの辺
+            u = source
+            while True:
+                if u == sink:
+                    pushed = min(cap[e] for e in path)
+                    for e in path:
+                        cap[e] -= pushed
+                        cap[e ^ 1] += pushed
+                    total += pushed
+                    path.clear()
+                    u = source
+                    continue
+                e = current[u]
+                while e != -1 and not (cap[e] > 0 and level[to[e]] == level[u] + 1):
+                    e = nxt[e]
+                current[u] = e
+                if e != -1:
+                    path.append(e)
+                    u = to[e]
+                    continue
+                # 行き止まり: 1つ戻る
+                if u == source:
+                    break
+                level[u] = -1
+                e = path.pop()
+                u = to[e ^ 1]
+                current[u] = nxt[current[u]]
+
+
+def block_lengths(n, length, head=None, tail=None, split_single=True):
+    """n 日を長さ length までの区間に分けた長さのリスト
+
+    head・tail は最初・最後の区間の長さの上限。split_single なら、余りの長さ1の区間は作らない
+    （両隣に区間があると、長さ1の区間の日は働けないことがある）。
+    """
+    lengths = []
+    if head is not None and n > 0:
+        lengths.append(min(head, n))
+        n -= lengths[-1]
+    last = []
+    if tail is not None and n > 0:
+        last.append(min(tail, n))
+        n -= last[-1]
+    full, rest = divmod(n, length)
+    middle = [length] * full
+    if rest == 1 and full and length >= 3 and split_single:
+        middle[-1:] = [length - 1, 2]
+    elif rest:
+        middle.append(rest)
+    return lengths + middle + last
+
+
+def longest_run(blocks, run_before=0, run_after=0):
+    """区間の上限どおりに働いた時に起こりうる一番長い連勤（前後の確定シフトから続く分を含む）"""
+    longest = run = run_before  # run: 区間の初日の前日まで続いている連勤
+    for start, end, cap in blocks:
+        if cap >= end - start:
+            run += end - start  # 全部働ける区間は連勤がそのまま続く
+        else:
+            longest = max(longest, run + cap)
+            run = cap
+        longest = max(longest, run)
+    return max(longest, run + run_after)
+
+
+def alternate_day_blocks(days, max_consecutive, run_before=0, run_after=0, parity=0):
+    """max_consecutive が1以下の時の区間: 1日ずつ、働ける日（上限1）と休む日（上限0）を交互にする
+
+    parity: 働ける日を偶数番目（0）・奇数番目（1）のどちらにするか。
+    前日まで確定シフトがあれば初日は休みにし、翌日から確定シフトがあれば最終日は休みにする。
+    """
+    if run_before:
+        parity = 1
+    blocks = [(j, j + 1, int(max_consecutive >= 1 and j % 2 == parity)) for j in range(len(days))]
+    if run_after and blocks:
+        blocks[-1] = (blocks[-1][0], blocks[-1][1], 0)
+    return blocks
+
+
+def rest_blocks(days, max_consecutive, run_before=0, run_after=0, parity=0):
+    """連勤防止の区間 [(開始, 終了, 上限日数), ...]
+
+    区間は長さ max_consecutive // 2 + 1 までで、上限は長さ - 1 日（どの区間でも1日は休む）。
+    月が変わる所でも区切る（勤務日数の上限が月ごとのため）。
+    run_before: 初日の前日まで続いている確定シフトの連勤日数、
+    run_after: 最終日の翌日から続く確定シフトの連勤日数（最初・最後の区間をその分だけ短くする）。
+    そのあと、前後とつなげても連勤が上限以内に収まる区間（月末の短い区間など）は全部働けるようにする。
+    max_consecutive が1以下の時は alternate_day_blocks（parity はその時だけ使う）。
+    """
+    if max_consecutive < 2:
+        return alternate_day_blocks(days, max_consecutive, run_before, run_after, parity)
+    length = max_consecutive // 2 + 1
+    segments = []
+    start = 0
+    for j in range(1, len(days) + 1):
+        if j == len(days) or days[j].month != days[start].month:
+            segments.append((start, j))
+            start = j
+
+    blocks = []
+    for k, (start, end) in enumerate(segments):
+        head = min(length, max(max_consecutive - run_before, 0) + 1) if k == 0 and run_before else None
+        tail = min(length, max(max_consecutive - run_after, 0) + 1) if k == len(segments) - 1 and run_after else None
+        for size in block_lengths(end - start, length, head, tail, split_single=k < len(segments) - 1):
+            blocks.append([start, start + size, size - 1])
+            start += size
+    if blocks:
+        blocks[0][2] = max(0, min(blocks[0][2], max_consecutive - run_before))
+        blocks[-1][2] = max(0, min(blocks[-1][2], max_consecutive - run_after))
+
+    # 誰も働けない区間・短い区間から先に広げる
+    for block in sorted(blocks, key=lambda b: (b[2] > 0, b[1] - b[0])):
+        cap = block[2]
+        block[2] = block[1] - block[0]
+        if longest_run(blocks, run_before, run_after) > max_consecutive:
+            block[2] = cap
+    return [tuple(block) for block in blocks]
+
+
+class StaffingFlow:
+    """上限 U を決めてネットワークを作り、最大流を求める"""
+
+    def __init__(self, problem):
+        self.problem = problem
+        days = problem.days
+        rules = problem.rules
+        self.targets = [problem.requirements.get(d.weekday(), rules.daily_range(d)[0]) for d in days]
+        self.demand = sum(self.targets)
+        self.absences = problem.absence_sets()
+
+        # 前後の確定シフトから続く連勤と、月ごとの確定シフトの日数（従業員ごと）
+        fixed = problem.fixed_ordinals()
+        self.runs_before = problem.consecutive_runs_before_start(fixed)
+        self.runs_after = [rules.max_consecutive - limit for limit in problem.consecutive_limits_at_end(fixed)]
+        months = sorted({(d.year, d.month) for d in days})
+        self.fixed_counts = {
+            month: problem.fixed_month_counts(fixed, *month) for month in months
+        }
+        self._blocks = {}
+
+    def blocks(self, i):
+        """従業員 i の連勤防止の区間（前後の確定シフトが同じ人どうしで使い回す）"""
+        # 1日おきの区間（max_consecutive が1以下）の時は、働ける日を従業員ごとに偶数日・奇数日に分ける
+        parity = i % 2 if self.problem.rules.max_consecutive < 2 else 0
+        key = (self.runs_before[i], self.runs_after[i], parity)
+        if key not in self._blocks:
+            self._blocks[key] = rest_blocks(self.problem.days, self.problem.rules.max_consecutive, *key)
+        return self._blocks[key]
+
+    def solve(self, cap):
+        """1か月の勤務日数を cap 日までにした時の最大流を求める"""
+        problem = self.problem
+        days = problem.days
+        num_days = len(days)
+        network = FlowNetwork(num_days + 2)
+        source, sink = num_days, num_days + 1
+        for j, target in enumerate(self.targets):
+            network.add_edge(j, sink, target)
+
+        work_edges = []  # (従業員の番号, 日の番号, 辺の番号)
+        for i, member in enumerate(problem.staff):
+            off_days = self.absences[i]
+            month_node = None
+            month = None
+            for start, end, per_block in self.blocks(i):
+                if (days[start].year, days[start].month) != month:
+                    month = (days[start].year, days[start].month)
+                    limit = max(0, min(member.max_days - self.fixed_counts[month][i], cap))
+                    month_node = network.add_node()
+                    network.add_edge(source, month_node, limit)
+                block_node = network.add_node()
+                network.add_edge(month_node, block_node, per_block)
+                for j in range(start, end):
+                    if days[j] not in off_days:
+                        work_edges.append((i, j, network.add_edge(block_node, j, 1)))
+
+        flow = network.max_flow(source, sink)
+        return flow, network, work_edges
+
+    def available_counts(self):
+        """日ごとの出勤可能な人数（希望休・休日以外）"""
+        return [
+            sum(1 for off_days in self.absences if d not in off_days)
+            for d in self.problem.days
+        ]
+
+
+def generate_flow(problem, rng, progress=None, **options):
+    """必要人数を満たす（満たせない時は最大限に近づける）シフトを最大流で作る"""
+    staffing = StaffingFlow(problem)
+    staff = problem.staff
+    if not staff or not problem.days:
+        return Result([], info={'feasible': staffing.demand == 0})
+
+    # 上限 U を二分探索（小さいほど勤務日数が均等になる）
+    cap = max(1, -(-staffing.demand // len(staff)))
+    highest = max(max(s.max_days for s in staff), cap)
+    best = staffing.solve(cap)
+    if best[0] < staffing.demand and highest > cap:
+        top = staffing.solve(highest)
+        if top[0] == staffing.demand:
+            low, best, cap = cap + 1, top, highest
+            while low < cap:
+                middle = (low + cap) // 2
+                attempt = staffing.solve(middle)
+                if attempt[0] == staffing.demand:
+                    best, cap = attempt, middle
+                else:
+                    low = middle + 1
+        elif top[0] > best[0]:
+            best, cap = top, highest
+
+    flow, network, work_edges = best
+    workers = [[] for _ in problem.days]
+    for i, j, e in work_edges:
+        if network.flow_on(e):
+            workers[j].append(i)
+
+    # 時間帯はその日の出勤者に順番に割り振る（早番・中番・遅番が偏らないように）
+    shift_times = problem.shift_times
+    assignments = []
+    for j, d in enumerate(problem.days):
+        day_workers = workers[j]
+        rng.shuffle(day_workers)
+        for k, i in enumerate(day_workers):
+            assignments.append(Assignment(staff[i].id, d, shift_times[k % len(shift_times)]))
+
+    # 足りない日（解なしの場合の報告）
+    shortfall = {
+        d: staffing.targets[j] - len(workers[j])
+        for j, d in enumerate(problem.days)
+        if len(workers[j]) < staffing.targets[j]
+    }
+    info = {
+        'feasible': not shortfall,
+        'demand': staffing.demand,
+        'assigned': flow,
+        'max_days_cap': cap,
+    }
+    if progress:
+        progress(len(problem.days), sum(shortfall.values()))
+    if shortfall:
+        available = staffing.available_counts()
+        info['shortfall'] = shortfall
+        info['available'] = {d: available[j] for j, d in enumerate(problem.days) if d in shortfall}
+    return Result(assignments, score=sum(shortfall.values()), info=info)
@@ -0,0 +1,194 @@
+"""シフト生成エンジンの入出力データ
+
+Django に依存しないプレーンなデータだけで構成しているので、
+ビューを通さずにベンチマークやチューニングができる。
+"""
+import calendar
+from array import array
+from collections import namedtuple
+from datetime import date
+
+# 従業員（id, 月最大勤務日数, 役職）
+StaffMember = namedtuple('StaffMember', ['id', 'max_days', 'role'], defaults=[22, 'staff'])
+
+# 生成結果の1件（従業員ID, 日付, 勤務時間帯）
+Assignment = namedtuple('Assignment', ['employee_id', 'date', 'time_range'])
+
+NO_DAY = -1  # まだ一度も勤務していない
+
+SHIFT_TIMES = [
+    "9:00-17:00",   # 早番
+    "11:00-19:00",  # 中番
+    "13:00-21:00",  # 遅番
+]
+
+
+def parse_time_range(time_range):
+    """「9:00-17:00」→ ((9, 0), (17, 0))"""
+    start, end = time_range.split('-')
+    sh, sm = map(int, start.split(':'))
+    eh, em = map(int, end.split(':'))
+    return (sh, sm), (eh, em)
+
+
+def shift_minutes(time_range):
+    """「9:00-17:00」のような勤務時間帯の長さ（分）"""
+    (sh, sm), (eh, em) = parse_time_range(time_range)
+    return (eh * 60 + em) - (sh * 60 + sm)
+
+
+class Rules:
+    """1日の出勤人数・連勤などの生成ルール"""
+    __slots__ = ('min_daily', 'max_daily', 'weekend_extra', 'max_consecutive')
+
+    def __init__(self, min_daily=6, max_daily=10, weekend_extra=2, max_consecutive=5):
+        self.min_daily = min_daily
+        self.max_daily = max_daily
+        self.weekend_extra = weekend_extra  # 土日は少し多めに
+        self.max_consecutive = max_consecutive  # 5連勤までOK
+
+    def daily_range(self, d):
+        """その日の最低/最大出勤人数を返す"""
+        if d.weekday() >= 5:
+            return self.min_daily + self.weekend_extra, self.max_daily + self.weekend_extra
+        return self.min_daily, self.max_daily
+
+
+class Problem:
+    """1回分のシフト生成に必要な入力
+
+    - days: 対象日付のリスト（昇順）
+    - staff: StaffMember のリスト（この順番で処理する）
+    - absences: {従業員ID: {休みの日付, ...}}
+    - requirements: {曜日(0=月): 最低人数}（ShiftRequirement）
+    - shift_times: 勤務時間帯のリスト（SHIFT_TIMES）
+    - fixed_shifts: {従業員ID: {勤務日, ...}} 対象期間の外で確定しているシフト
+      （前月末の数日・同じ月の残りの日など）。連勤日数と月の勤務日数はここから引き継ぐ。
+    """
+    __slots__ = ('days', 'staff', 'absences', 'requirements', 'shift_times', 'rules', 'fixed_shifts')
+
+    def __init__(self, days, staff, absences=None, requirements=None, shift_times=(), rules=None,
+                 fixed_shifts=None):
+        self.days = list(days)
+        self.staff = list(staff)
+        self.absences = absences or {}
+        self.requirements = requirements or {}
+        self.shift_times = list(shift_times)
+        self.rules = rules or Rules()
+        self.fixed_shifts = fixed_shifts or {}
+
+    def absence_sets(self):
+        """staff と同じ並びの休み日付セットのリスト"""
+        return [self.absences.get(s.id, frozenset()) for s in self.staff]
+
+    def fixed_ordinals(self):
+        """staff と同じ並びの、確定シフトの日付（toordinal）のセットのリスト"""
+        return [
+            {d.toordinal() for d in self.fixed_shifts.get(s.id, ())}
+            for s in self.staff
+        ]
+
+    def fixed_month_counts(self, fixed, year, month):
+        """その月の確定シフトの日数（月の勤務日数の初期値）"""
+        first = date(year, month, 1).toordinal()
+        last = first + calendar.monthrange(year, month)[1] - 1
+        return [sum(1 for o in worked if first <= o <= last) for worked in fixed]
+
+    def consecutive_runs_before_start(self, fixed):
+        """対象期間の初日の前日まで続いている確定シフトの連勤日数"""
+        if not self.days:
+            return [0] * len(fixed)
+        yesterday = self.days[0].toordinal() - 1
+        runs = []
+        for worked in fixed:
+            run = 0
+            while yesterday - run in worked:
+                run += 1
+            runs.append(run)
+        return runs
+
+    def consecutive_limits_at_end(self, fixed):
+        """対象期間の最終日に出勤できる連勤日数の上限
+
+        最終日の翌日から確定シフトが続いている人は、その日数だけ上限が下がる。
+        """
+        limit = self.rules.max_consecutive
+        if not self.days:
+            return [limit] * len(fixed)
+        day = self.days[-1].toordinal() + 1
+        limits = []
+        for worked in fixed:
+            run = 0
+            while day + run in worked:
+                run += 1
+            limits.append(limit - run)
+        return limits
+
+
+class WorkState:
+    """従業員ごとの勤務状況（最終勤務日・連勤日数・割り当て回数）
+
+    3つの辞書の代わりに、staff の並び順で引ける配列で持つ。
+    日付は date.toordinal() の整数で扱う。
+    """
+    __slots__ = ('last_worked', 'consecutive', 'assigned')
+
+    def __init__(self, size):
+        self.last_worked = array('l', [NO_DAY]) * size
+        self.consecutive = array('l', [0]) * size
+        self.assigned = array('l', [0]) * size
+
+    def reset_assigned(self, counts=None):
+        """割り当て回数を0（または counts）に戻す（月が変わった時）"""
+        if counts is None:
+            self.assigned[:] = array('l', [0]) * len(self.assigned)
+        else:
+            self.assigned[:] = array('l', counts)
+
+    def seed(self, fixed, first_day):
+        """first_day の前日まで続いている確定シフトから、最終勤務日と連勤日数を設定する"""
+        yesterday = first_day.toordinal() - 1
+        for i, worked in enumerate(fixed):
+            run = 0
+            while yesterday - run in worked:
+                run += 1
+            if run:
+                self.last_worked[i] = yesterday
+                self.consecutive[i] = run
+
+    def run_if_working(self, i, today):
+        """今日も働いた場合の連勤日数"""
+        if self.last_worked[i] == today - 1:
+            return self.consecutive[i] + 1
+        return 1
+
+    def advance(self, today, chosen):
+        """今日出勤した人を記録し、働かなかった人の連勤をリセットする"""
+        last_worked = self.last_worked
+        consecutive = self.consecutive
+        assigned = self.assigned
+        yesterday = today - 1
+        for i in chosen:
+            assigned[i] += 1
+            if last_worked[i] == yesterday:
+                consecutive[i] += 1
+            else:
+                consecutive[i] = 1
+            last_worked[i] = today
+        for i in range(len(last_worked)):
+            if last_worked[i] == yesterday:
+                consecutive[i] = 0
+
+
+class Result:
+    """生成結果（割り当て一覧と、再現用のシード・スコアなど）"""
+    __slots__ = ('assignments', 'seed', 'score', 'info')
+
+    def __init__(self, assignments, seed=None, score=None, info=None):
+        self.assignments = assignments
+        self.seed = seed
+        self.score = score
+        self.info = info or {}
+
+    def __len__(self):
+        return len(self.assignments)
@@ -0,0 +1,101 @@
+"""シフト生成エンジンと DB のやりとり
+
+DB から Problem を組み立てる処理と、生成結果を保存する処理をまとめている。
+"""
+import calendar
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+
+from ..cache import bump_month_rows_versions, bump_month_versions
+from ..models import SHIFT_TIMES, Holiday, RequestedOff, Shift, ShiftRequirement
+from ..signals import bulk_shift_changes
+from ..summaries import rebuild_coverage, rebuild_summaries
+from .problem import Problem, Rules, StaffMember
+
+# 一括INSERT時の1回あたりの件数（settings.SHIFT_BULK_BATCH_SIZE で変更可）
+SHIFT_BULK_BATCH_SIZE = getattr(settings, 'SHIFT_BULK_BATCH_SIZE', 500)
+
+
+def load_absence_index(start, end):
+    """期間内の希望休・休日を {従業員ID: {日付, ...}} の形でまとめて取得する
+
+    RequestedOff と Holiday を UNION して1回のクエリで読み込むので、
+    従業員数や日数が増えてもクエリ数は変わらない。
+    """
+    requested = RequestedOff.objects.filter(date__range=(start, end)).values_list('employee_id', 'date')
+    holidays = (
+        Holiday.objects.filter(employee__isnull=False, date__range=(start, end))
+        .values_list('employee_id', 'date')
+    )
+    index = defaultdict(set)
+    for emp_id, d in requested.union(holidays):
+        index[emp_id].add(d)
+    return index
+
+
+def load_requirements():
+    """曜日ごとの最低人数 {曜日: min_staff}"""
+    return dict(ShiftRequirement.objects.values_list('weekday', 'min_staff'))
+
+
+def load_fixed_shifts(start, end, margin):
+    """対象期間の外の確定シフトを {従業員ID: {勤務日, ...}} の形で取得する
+
+    読み込むのは、対象期間を含む月全体（勤務日数の上限用）と、前後 margin 日
+    （連勤の引き継ぎ用。前月末・翌月初めの数日を含む）。対象期間の中は作り直すので含めない。
+    """
+    month_end = end.replace(day=calendar.monthrange(end.year, end.month)[1])
+    load_start = min(start.replace(day=1), start - timedelta(days=margin))
+    load_end = max(month_end, end + timedelta(days=margin))
+    shifts = (
+        Shift.objects.filter(date__range=(load_start, load_end))
+        .exclude(date__range=(start, end))
+        .exclude(time_range='')
+        .values_list('employee_id', 'date')
+    )
+    index = defaultdict(set)
+    for emp_id, d in shifts:
+        index[emp_id].add(d)
+    return index
+
+
+def build_problem(employees, days, rules=None):
+    """従業員（並び順のまま）と対象日付から Problem を作る
+
+    対象期間の前後の確定シフトも読み込むので、月の途中の数日だけを作り直す時も、
+    月全体を作る時も、前月末からの連勤や同じ月の勤務日数が引き継がれる。
+    """
+    rules = rules or Rules()
+    staff = [StaffMember(emp.id, emp.max_days, emp.role) for emp in employees]
+    return Problem(
+        days,
+        staff,
+        absences=load_absence_index(days[0], days[-1]),
+        requirements=load_requirements(),
+        shift_times=SHIFT_TIMES,
+        rules=rules,
+        fixed_shifts=load_fixed_shifts(days[0], days[-1], rules.max_consecutive),
+    )
+
+
+def save_schedule(days, assignments, batch_size=None):
+    """対象期間のシフトを削除し、生成結果を一括登録する
+
+    削除と登録は1つのトランザクションで行うので、途中で失敗しても
+    前のシフトはそのまま残る。月ごとの集計と日ごとの人数は最後にまとめて作り直す。
+    """
+    batch_size = batch_size or SHIFT_BULK_BATCH_SIZE
+    new_shifts = [
+        Shift(employee_id=a.employee_id, date=a.date, time_range=a.time_range).fill_times()
+        for a in assignments
+    ]
+    with transaction.atomic(), bulk_shift_changes():
+        Shift.objects.filter(date__range=(days[0], days[-1])).delete()
+        Shift.objects.bulk_create(new_shifts, batch_size=batch_size)
+        rebuild_summaries(days[0], days[-1])
+        rebuild_coverage(days[0], days[-1])
+        bump_month_versions(days)  # bulk_create ではシグナルが出ないため
+        bump_month_rows_versions(days)
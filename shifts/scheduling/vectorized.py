@@ -0,0 +1,82 @@
+"""NumPy で出勤可能判定をまとめて行うシフト生成
+
+(従業員 × 日) の出勤可能行列と、連勤日数・勤務日数の配列を持ち、
+その日の候補者の絞り込みを1回の配列演算で行う。
+乱数の使い方は engine.generate_random と同じなので、同じシードなら同じ結果になる。
+"""
+import numpy as np
+
+from .problem import Assignment, WorkState
+
+
+def availability_matrix(problem):
+    """希望休・休日を False にした (従業員 × 日) の bool 行列"""
+    day_index = {d: j for j, d in enumerate(problem.days)}
+    rows, cols = [], []
+    for i, off_days in enumerate(problem.absence_sets()):
+        for d in off_days:
+            j = day_index.get(d)
+            if j is not None:
+                rows.append(i)
+                cols.append(j)
+    available = np.ones((len(problem.staff), len(problem.days)), dtype=bool)
+    available[rows, cols] = False
+    return available
+
+
+def generate_vectorized(problem, rng, progress=None):
+    rules = problem.rules
+    shift_times = problem.shift_times
+    staff_ids = [s.id for s in problem.staff]
+    size = len(staff_ids)
+
+    available = availability_matrix(problem)
+    max_days = np.array([s.max_days for s in problem.staff], dtype=np.int64)
+    fixed = problem.fixed_ordinals()
+    state = WorkState(size)
+    if problem.days:
+        state.seed(fixed, problem.days[0])
+    last_worked = np.array(state.last_worked, dtype=np.int64)
+    consecutive = np.array(state.consecutive, dtype=np.int64)
+    assigned = np.zeros(size, dtype=np.int64)
+    max_runs = rules.max_consecutive
+    last_j = len(problem.days) - 1
+    assignments = []
+    current_month = None
+
+    for j, d in enumerate(problem.days):
+        today = d.toordinal()
+        if (d.year, d.month) != current_month:
+            # 勤務日数の上限は月ごと（確定シフトの分は最初から数えておく）
+            current_month = (d.year, d.month)
+            assigned[:] = problem.fixed_month_counts(fixed, d.year, d.month)
+        if j == last_j:
+            max_runs = np.array(problem.consecutive_limits_at_end(fixed), dtype=np.int64)
+
+        worked_yesterday = last_worked == today - 1
+        run = np.where(worked_yesterday, consecutive + 1, 1)
+        candidates = np.flatnonzero(
+            available[:, j] & (run <= max_runs) & (assigned < max_days)
+        ).tolist()
+
+        if candidates:
+            min_daily, max_daily = rules.daily_range(d)
+            num_to_assign = min(len(candidates), rng.randint(min_daily, max_daily))
+            chosen = rng.sample(candidates, num_to_assign)
+        else:
+            chosen = []
+
+        for i in chosen:
+            assignments.append(Assignment(staff_ids[i], d, rng.choice(shift_times)))
+
+        # 昨日働いて今日休んだ人は連勤リセット、今日出勤した人を記録
+        consecutive[worked_yesterday] = 0
+        if chosen:
+            chosen = np.array(chosen)
+            consecutive[chosen] = run[chosen]
+            last_worked[chosen] = today
+            assigned[chosen] += 1
+        if progress:
+            progress(j + 1, None)
+
+    return assignments
@@ -0,0 +1,115 @@
+"""モデルが変わった時の処理（ShiftsConfig.ready() で読み込む）
+
+自動作成などでシフトをまとめて入れ替える時は bulk_shift_changes() の中で行い、
+1件ずつの処理は飛ばして、呼び出し側で月ごとにまとめて更新する。
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models import Max, Min
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import bump_employee_version, bump_month_versions, bump_requirements_version, bump_row_versions
+from .models import Employee, RequestedOff, Shift, ShiftRequirement
+from .summaries import apply_coverage_change, apply_shift_change, rebuild_coverage, refresh_pay
+
+_bulk_changes = ContextVar('shifts_bulk_changes', default=False)
+
+
+@contextmanager
+def bulk_shift_changes():
+    """この中の Shift の保存・削除では、集計・人数・バージョンを1件ずつ更新しない"""
+    token = _bulk_changes.set(True)
+    try:
+        yield
+    finally:
+        _bulk_changes.reset(token)
+
+
+def _worked(time_range, minutes):
+    """集計に足す (勤務日数, 勤務時間（分）)"""
+    return (1 if time_range else 0), minutes
+
+
+@receiver(pre_save, sender=Shift)
+def shift_changing(sender, instance, raw=False, **kwargs):
+    # 変更前の内容を覚えておく（集計から引くため・別の月に移した時は元の月も更新するため）
+    instance._previous = None
+    if instance.pk and not raw and not _bulk_changes.get():
+        instance._previous = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list('employee_id', 'date', 'time_range', 'duration_minutes', 'employee__role')
+            .first()
+        )
+
+
+@receiver(post_save, sender=Shift)
+def shift_saved(sender, instance, raw=False, **kwargs):
+    if raw or _bulk_changes.get():
+        return
+    previous = getattr(instance, '_previous', None)
+    days, minutes = _worked(instance.time_range, instance.duration_minutes)
+    if previous:
+        emp_id, old_date, old_range, old_minutes, old_role = previous
+        apply_coverage_change(old_date, old_range, old_role, -1)
+        old_days, old_minutes = _worked(old_range, old_minutes)
+        same_month = emp_id == instance.employee_id and (old_date.year, old_date.month) == (
+            instance.date.year, instance.date.month)
+        if same_month:
+            days, minutes = days - old_days, minutes - old_minutes
+        else:
+            apply_shift_change(emp_id, old_date, -old_days, -old_minutes)
+            bump_month_versions([old_date])
+        bump_row_versions([emp_id], [old_date])
+    apply_shift_change(instance.employee_id, instance.date, days, minutes)
+    apply_coverage_change(instance.date, instance.time_range, instance.employee.role, 1)
+    bump_month_versions([instance.date])
+    bump_row_versions([instance.employee_id], [instance.date])
+
+
+@receiver(post_delete, sender=Shift)
+def shift_deleted(sender, instance, **kwargs):
+    if _bulk_changes.get():
+        return
+    days, minutes = _worked(instance.time_range, instance.duration_minutes)
+    apply_shift_change(instance.employee_id, instance.date, -days, -minutes)
+    apply_coverage_change(instance.date, instance.time_range, instance.employee.role, -1)
+    bump_month_versions([instance.date])
+    bump_row_versions([instance.employee_id], [instance.date])
+
+
+@receiver([post_save, post_delete], sender=RequestedOff)
+def requested_off_changed(sender, instance, **kwargs):
+    bump_month_versions([instance.date])
+
+
+@receiver([post_save, post_delete], sender=ShiftRequirement)
+def requirement_changed(sender, **kwargs):
+    # 必要人数はシフト表の人数不足の表示に使うので、全ての月が変わる
+    bump_requirements_version()
+
+
+@receiver(pre_save, sender=Employee)
+def employee_changing(sender, instance, raw=False, **kwargs):
+    instance._previous_role = None
+    if instance.pk and not raw:
+        instance._previous_role = sender.objects.filter(pk=instance.pk).values_list('role', flat=True).first()
+
+
+@receiver(post_save, sender=Employee)
+def employee_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_pay([instance])  # 時給が変わっていれば給与も変わる
+        previous_role = getattr(instance, '_previous_role', None)
+        if previous_role and previous_role != instance.role:
+            # 役職ごとの人数は、この人が出勤している期間だけ作り直す
+            bounds = instance.shifts.aggregate(start=Min('date'), end=Max('date'))
+            if bounds['start']:
+                rebuild_coverage(bounds['start'], bounds['end'])
+    bump_employee_version()
+
+
+@receiver(post_delete, sender=Employee)
+def employee_deleted(sender, **kwargs):
+    bump_employee_version()
@@ -0,0 +1,240 @@
+"""シフトの集計テーブルの更新
+
+- MonthlyEmployeeSummary: 従業員ごと・月ごとの勤務日数・勤務時間・給与
+- DailyCoverage: 日ごと・勤務時間帯ごと・役職ごとの出勤人数
+
+Shift が1件変わるたびにシグナルから apply_shift_change() / apply_coverage_change() を呼び、
+差分だけ F() で足し引きする。自動作成・取り込みのようにまとめて変わる時は、
+rebuild_summaries() / rebuild_coverage() で対象の期間を作り直す。
+給与は「勤務時間 × 今の時給」なので、時給が変わったら refresh_pay() で計算し直す。
+"""
+import calendar
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+from .models import DailyCoverage, Employee, MonthlyEmployeeSummary, Shift, ShiftRequirement
+
+
+def monthly_pay(minutes, hourly_rate):
+    """勤務時間（分）と時給から給与（円）を計算する（給与画面と同じ計算）"""
+    return int(round(minutes / 60 * float(hourly_rate or 0)))
+
+
+def apply_shift_change(employee_id, day, days_delta, minutes_delta):
+    """1件のシフトの増減を、その月の集計に反映する"""
+    if not days_delta and not minutes_delta:
+        return
+    with transaction.atomic():
+        rows = MonthlyEmployeeSummary.objects.filter(employee_id=employee_id, year=day.year, month=day.month)
+        updated = rows.update(
+            days_worked=F('days_worked') + days_delta,
+            minutes_worked=F('minutes_worked') + minutes_delta,
+        )
+        if not updated:
+            if days_delta <= 0 and minutes_delta <= 0:
+                return  # 集計行が無い（従業員ごと削除中など）
+            try:
+                with transaction.atomic():
+                    MonthlyEmployeeSummary.objects.create(
+                        employee_id=employee_id, year=day.year, month=day.month,
+                        days_worked=max(days_delta, 0), minutes_worked=max(minutes_delta, 0),
+                    )
+            except IntegrityError:
+                # 同時に別のリクエストが行を作った時は、その行に足す
+                rows.update(
+                    days_worked=F('days_worked') + days_delta,
+                    minutes_worked=F('minutes_worked') + minutes_delta,
+                )
+        summary = rows.select_related('employee').only('minutes_worked', 'employee__hourly_rate').get()
+        rows.update(pay=monthly_pay(summary.minutes_worked, summary.employee.hourly_rate))
+
+
+def refresh_pay(employees):
+    """時給が変わった従業員の、全ての月の給与を計算し直す"""
+    rates = {emp.id: emp.hourly_rate for emp in employees}
+    if not rates:
+        return 0
+    summaries = list(
+        MonthlyEmployeeSummary.objects.filter(employee_id__in=rates).only('employee_id', 'minutes_worked', 'pay')
+    )
+    changed = []
+    for summary in summaries:
+        pay = monthly_pay(summary.minutes_worked, rates[summary.employee_id])
+        if summary.pay != pay:
+            summary.pay = pay
+            changed.append(summary)
+    MonthlyEmployeeSummary.objects.bulk_update(changed, ['pay'], batch_size=500)
+    return len(changed)
+
+
+def aggregate_shifts(start, end):
+    """期間内のシフトを従業員・月ごとに集計した {(従業員ID, 年, 月): (日数, 分)}（1回のクエリ）"""
+    rows = (
+        Shift.objects.filter(date__range=(start, end))
+        .annotate(year=ExtractYear('date'), month=ExtractMonth('date'))
+        .values('employee_id', 'year', 'month')
+        .annotate(
+            days=Count('id', filter=~Q(time_range='')),
+            minutes=Sum('duration_minutes'),
+        )
+        .order_by()
+    )
+    return {
+        (row['employee_id'], row['year'], row['month']): (row['days'], row['minutes'] or 0)
+        for row in rows
+    }
+
+
+def expected_summaries(start, end):
+    """シフトから計算した、あるべき集計行（MonthlyEmployeeSummary の未保存オブジェクト）"""
+    rates = dict(Employee.objects.values_list('id', 'hourly_rate'))
+    return [
+        MonthlyEmployeeSummary(
+            employee_id=emp_id, year=year, month=month, days_worked=days, minutes_worked=minutes,
+            pay=monthly_pay(minutes, rates.get(emp_id)),
+        )
+        for (emp_id, year, month), (days, minutes) in sorted(aggregate_shifts(start, end).items())
+        if days or minutes
+    ]
+
+
+def whole_months(start, end):
+    """start を月初に、end を月末に広げる"""
+    return start.replace(day=1), end.replace(day=calendar.monthrange(end.year, end.month)[1])
+
+
+def _month_filter(start, end):
+    """start〜end の月の集計行を選ぶ Q"""
+    return (
+        Q(year__gt=start.year) | Q(year=start.year, month__gte=start.month)
+    ) & (
+        Q(year__lt=end.year) | Q(year=end.year, month__lte=end.month)
+    )
+
+
+def rebuild_summaries(start, end, batch_size=500):
+    """start〜end を含む月の集計を、シフトから作り直す。作った行数を返す"""
+    start, end = whole_months(start, end)
+    summaries = expected_summaries(start, end)
+    with transaction.atomic():
+        MonthlyEmployeeSummary.objects.filter(_month_filter(start, end)).delete()
+        MonthlyEmployeeSummary.objects.bulk_create(summaries, batch_size=batch_size)
+    return len(summaries)
+
+
+def check_summaries(start, end):
+    """保存されている集計とシフトから計算した値の違いを [(キー, 保存値, 正しい値), ...] で返す"""
+    start, end = whole_months(start, end)
+    fields = ('days_worked', 'minutes_worked', 'pay')
+    stored = {
+        (row[0], row[1], row[2]): row[3:]
+        for row in MonthlyEmployeeSummary.objects.filter(_month_filter(start, end))
+        .values_list('employee_id', 'year', 'month', *fields)
+    }
+    problems = []
+    for summary in expected_summaries(start, end):
+        key = (summary.employee_id, summary.year, summary.month)
+        expected = tuple(getattr(summary, f) for f in fields)
+        actual = stored.pop(key, None)
+        if actual != expected:
+            problems.append((key, actual, expected))
+    for key, actual in stored.items():
+        if any(actual):
+            problems.append((key, actual, (0, 0, 0)))
+    return sorted(problems)
+
+
+# ---------- 日ごとの出勤人数 ----------
+
+def apply_coverage_change(day, time_range, role, delta):
+    """1件のシフトの増減を、その日・時間帯・役職の人数に反映する（休みのシフトは数えない）"""
+    if not time_range or not delta:
+        return
+    with transaction.atomic():
+        rows = DailyCoverage.objects.filter(date=day, time_range=time_range, role=role)
+        updated = rows.update(count=F('count') + delta)
+        if not updated and delta > 0:
+            try:
+                with transaction.atomic():
+                    DailyCoverage.objects.create(date=day, time_range=time_range, role=role, count=delta)
+            except IntegrityError:
+                # 同時に別のリクエストが行を作った時は、その行に足す
+                rows.update(count=F('count') + delta)
+
+
+def expected_coverage(start, end):
+    """シフトから計算した、あるべき人数の行（DailyCoverage の未保存オブジェクト、1回のクエリ）"""
+    rows = (
+        Shift.objects.filter(date__range=(start, end))
+        .exclude(time_range='')
+        .values('date', 'time_range', 'employee__role')
+        .annotate(count=Count('id'))
+        .order_by('date', 'time_range', 'employee__role')
+    )
+    return [
+        DailyCoverage(date=row['date'], time_range=row['time_range'], role=row['employee__role'], count=row['count'])
+        for row in rows
+    ]
+
+
+def rebuild_coverage(start, end, batch_size=500):
+    """start〜end の日の人数を、シフトから作り直す。作った行数を返す"""
+    coverage = expected_coverage(start, end)
+    with transaction.atomic():
+        DailyCoverage.objects.filter(date__range=(start, end)).delete()
+        DailyCoverage.objects.bulk_create(coverage, batch_size=batch_size)
+    return len(coverage)
+
+
+def check_coverage(start, end):
+    """保存されている人数とシフトから計算した値の違いを [(キー, 保存値, 正しい値), ...] で返す"""
+    stored = {
+        (d, time_range, role): count
+        for d, time_range, role, count in DailyCoverage.objects.filter(date__range=(start, end))
+        .values_list('date', 'time_range', 'role', 'count')
+    }
+    problems = []
+    for row in expected_coverage(start, end):
+        key = (row.date, row.time_range, row.role)
+        actual = stored.pop(key, 0)
+        if actual != row.count:
+            problems.append((key, actual, row.count))
+    problems.extend((key, count, 0) for key, count in stored.items() if count)
+    return sorted(problems)
+
+
+def coverage_counts(start, end):
+    """{日付: 出勤人数}（期間内の全ての日。1回のクエリ）"""
+    counts = {start + timedelta(days=n): 0 for n in range((end - start).days + 1)}
+    rows = (
+        DailyCoverage.objects.filter(date__range=(start, end))
+        .values('date').annotate(total=Sum('count')).order_by()
+        .values_list('date', 'total')
+    )
+    for d, total in rows:
+        counts[d] = total
+    return counts
+
+
+def coverage_breakdown(start, end):
+    """{日付: {'time_range': {勤務時間帯: 人数}, 'role': {役職: 人数}}}（1回のクエリ）"""
+    breakdown = defaultdict(lambda: {'time_range': defaultdict(int), 'role': defaultdict(int)})
+    rows = DailyCoverage.objects.filter(date__range=(start, end)).values_list('date', 'time_range', 'role', 'count')
+    for d, time_range, role, count in rows:
+        breakdown[d]['time_range'][time_range] += count
+        breakdown[d]['role'][role] += count
+    return breakdown
+
+
+def understaffed_days(counts):
+    """ShiftRequirement の最低人数に足りない日 {日付: (人数, 必要人数)}（counts は coverage_counts の結果）"""
+    required = dict(ShiftRequirement.objects.values_list('weekday', 'min_staff'))
+    return {
+        d: (count, required[d.weekday()])
+        for d, count in counts.items()
+        if d.weekday() in required and count < required[d.weekday()]
+    }
@@ -1,10 +1,62 @@
+import functools
+
 from django import template
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
 
 register = template.Library()
 
+# 勤務時間帯ごとのセルの CSS クラス（ここに無いもの・休みは shift-holiday）
+SHIFT_CLASSES = {
+    '9:00-17:00': 'shift-early',
+    '11:00-19:00': 'shift-mid',
+    '13:00-21:00': 'shift-late',
+}
+HOLIDAY_CLASS = 'shift-holiday'
+
+
 @register.filter
 def get_item(obj, key):
     try:
         return obj[key]
     except (KeyError, IndexError, TypeError):
         return None
+
+
+@functools.lru_cache(maxsize=64)
+def _cells(patterns):
+    return tuple(
+        format_html('<td class="{}">{}</td>', SHIFT_CLASSES.get(pattern, HOLIDAY_CLASS), pattern or "休")
+        for pattern in patterns
+    )
+
+
+def pattern_cells(patterns):
+    """パターン表の各勤務時間帯の <td>（コードで引くだけにするため、パターン表ごとに1回だけ作る）"""
+    return _cells(tuple(patterns))
+
+
+def format_hours(minutes):
+    """分を小数1桁の時間にする（floatformat:1 と同じ四捨五入を整数で）"""
+    tenths = (minutes * 10 + 30) // 60
+    return f"{tenths // 10}.{tenths % 10}"
+
+
+def render_shift_row(emp, patterns):
+    """従業員1人分の <tr> を1回の join で作る
+
+    emp['codes'] は日ごとの勤務時間帯のコード（patterns の添字）、emp['work_minutes'] はその月の勤務時間（分）。
+    """
+    cells = pattern_cells(patterns)
+    head = format_html(
+        '<tr><td><div class="name-role"><span class="name">{}</span>'
+        '<span class="role">({})</span><span class="work-hours">{}時間</span></div></td>',
+        emp['name'], emp['role'], format_hours(emp['work_minutes']),
+    )
+    return mark_safe(''.join([head, *[cells[code] for code in emp['codes']], '</tr>']))
+
+
+@register.simple_tag
+def shift_row(emp, patterns):
+    """{% shift_row emp patterns %} シフト表の1行（セルごとにテンプレートを通さない）"""
+    return render_shift_row(emp, patterns)
@@ -1,3 +1,1244 @@
-from django.test import TestCase
+import io
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import OperationalError, connection
+from django.db.models import QuerySet
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .cache import MONTH_ROWS_VERSION_KEY, MONTH_VERSION_KEY, ROW_VERSION_KEY, LRUCache
+from .charts import chart_cache
+from .exports import date_range, iter_employee_rows
+from .jobs import claim_next_job, enqueue_generation, regenerate_for_requested_off, regenerate_range
+from .matrix import SHIFT_PATTERNS, build_shift_matrix
+from .templatetags.shift_extras import render_shift_row
+from .models import (
+    DailyCoverage, Employee, GenerationJob, MonthlyEmployeeSummary, Shift, ShiftRequirement, RequestedOff, Holiday,
+)
+from .scheduling import Assignment, Problem, Rules, StaffMember, generate
+from .scheduling.annealing import Annealer
+from .scheduling.batch import fix_boundary, generate_months
+from .scheduling.flow import rest_blocks
+from .summaries import apply_coverage_change, apply_shift_change, check_coverage, check_summaries
+
+# テストでは本物のファイルキャッシュ（開発サーバーと共有）を使わず、プロセス内のメモリに置く
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shifts-tests'},
+    'matrix_rows': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shifts-tests-rows'},
+}
+
+
+def count_selects(queries):
+    return sum(1 for q in queries if q['sql'].lstrip().upper().startswith('SELECT'))
+
+
+def make_employees(count, **kwargs):
+    """テスト用の従業員をまとめて作る"""
+    return Employee.objects.bulk_create(
+        [Employee(name=f"従業員{i}", **kwargs) for i in range(count)]
+    )
+
+
+def created_concurrently(model, **fields):
+    """model の行を作り、最初の UPDATE だけ0件にするパッチを返す
+
+    「こちらの UPDATE の直後に、別のリクエストが同じ行を作った」状態になる。
+    """
+    model.objects.bulk_create([model(**fields)])
+    update = QuerySet.update
+    calls = []
+
+    def update_before_row_exists(queryset, **kwargs):
+        calls.append(kwargs)
+        return 0 if len(calls) == 1 else update(queryset, **kwargs)
+
+    return mock.patch.object(QuerySet, 'update', autospec=True, side_effect=update_before_row_exists)
+
+
+@override_settings(SHIFT_GENERATION_ASYNC=False, CACHES=TEST_CACHES)
+class AutoGenerateTests(TestCase):
+    def setUp(self):
+        self.employees = make_employees(12)
+
+    def post_generate(self, year=2025, month=10):
+        return self.client.post(reverse('shift_matrix'), {
+            'year': year,
+            'month': month,
+            'auto_generate': '1',
+        })
+
+    def test_generate_replaces_month(self):
+        old = Shift.objects.create(employee=self.employees[0], date=date(2025, 10, 1), time_range="9:00-17:00")
+        response = self.post_generate()
+
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Shift.objects.filter(pk=old.pk).exists())
+        self.assertTrue(Shift.objects.filter(date__year=2025, date__month=10).exists())
+
+    @override_settings(SHIFT_GENERATION_MODE='best', SHIFT_GENERATION_CANDIDATES=3, SHIFT_GENERATION_WORKERS=1)
+    def test_generation_is_recorded_with_seed(self):
+        self.post_generate()
+        job = GenerationJob.objects.get()
+        self.assertEqual((job.mode, job.status, job.days_done), ('best', 'done', 31))
+        self.assertIsNotNone(job.seed)
+        self.assertIsNotNone(job.score)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_generated_shifts_have_durations(self):
+        self.post_generate()
+        self.assertFalse(Shift.objects.filter(date__month=10, duration_minutes=0).exists())
+
+    def test_generate_keeps_other_months(self):
+        other = Shift.objects.create(employee=self.employees[0], date=date(2025, 11, 1), time_range="9:00-17:00")
+        self.post_generate()
+        self.assertTrue(Shift.objects.filter(pk=other.pk).exists())
+
+    def test_generate_uses_bulk_insert(self):
+        with mock.patch.object(Shift.objects, 'create') as create:
+            self.post_generate()
+        create.assert_not_called()
+
+    def test_failed_generation_keeps_previous_month(self):
+        old = Shift.objects.create(employee=self.employees[0], date=date(2025, 10, 1), time_range="9:00-17:00")
+        with mock.patch.object(Shift.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.post_generate()
+        self.assertTrue(Shift.objects.filter(pk=old.pk).exists())
+
+    def test_generate_skips_requested_off_and_holidays(self):
+        emp = self.employees[0]
+        off_days = [date(2025, 10, d) for d in range(1, 32)]
+        RequestedOff.objects.bulk_create([RequestedOff(employee=emp, date=d) for d in off_days[:15]])
+        Holiday.objects.bulk_create([Holiday(employee=emp, date=d) for d in off_days[15:]])
+
+        self.post_generate()
+        self.assertFalse(Shift.objects.filter(employee=emp).exists())
+
+    def test_generate_reads_are_constant(self):
+        def selects_for_generation():
+            with CaptureQueriesContext(connection) as ctx:
+                self.post_generate()
+            return count_selects(ctx.captured_queries)
+
+        small = selects_for_generation()
+        make_employees(40)
+        for emp in Employee.objects.all():
+            RequestedOff.objects.create(employee=emp, date=date(2025, 10, 3))
+        self.assertEqual(selects_for_generation(), small)
+
+
+@override_settings(SHIFT_GENERATION_ASYNC=True, CACHES=TEST_CACHES)
+class GenerationJobTests(TestCase):
+    def setUp(self):
+        self.employees = make_employees(12)
+
+    def test_post_enqueues_job_without_generating(self):
+        response = self.client.post(reverse('shift_matrix'), {'year': 2025, 'month': 10, 'auto_generate': '1'})
+
+        job = GenerationJob.objects.get()
+        self.assertRedirects(response, f"{reverse('shift_matrix')}?year=2025&month=10&job={job.pk}")
+        self.assertEqual((job.status, job.days_total), ('queued', 31))
+        self.assertFalse(Shift.objects.exists())
+
+    @override_settings(SHIFT_GENERATION_MODE='flow')
+    def test_post_uses_current_generation_mode(self):
+        self.client.post(reverse('shift_matrix'), {'year': 2025, 'month': 10, 'auto_generate': '1'})
+        self.assertEqual(GenerationJob.objects.get().mode, 'flow')
+
+    def test_worker_runs_queued_job(self):
+        job = enqueue_generation(2025, 10, mode='random')
+        call_command('run_generation_worker', once=True, stdout=io.StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.days_done, 31)
+        self.assertIsNotNone(job.finished_at)
+        self.assertTrue(Shift.objects.filter(date__year=2025, date__month=10).exists())
+
+    def test_best_mode_job_stores_seed(self):
+        job = enqueue_generation(2025, 10, mode='best')
+        with self.settings(SHIFT_GENERATION_CANDIDATES=3, SHIFT_GENERATION_WORKERS=1):
+            call_command('run_generation_worker', once=True, stdout=io.StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertIsNotNone(job.seed)
+        self.assertIsNotNone(job.score)
+
+    def test_failed_job_is_marked(self):
+        job = enqueue_generation(2025, 10)
+        with mock.patch.object(Shift.objects, 'bulk_create', side_effect=RuntimeError("boom")):
+            call_command('run_generation_worker', once=True, stdout=io.StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('boom', job.message)
+
+    def test_worker_survives_claim_errors(self):
+        class Stop(Exception):
+            pass
+
+        out = io.StringIO()
+        worker = 'shifts.management.commands.run_generation_worker'
+        with mock.patch(f'{worker}.claim_next_job', side_effect=[OperationalError("database is locked"), None]) as claim, \
+                mock.patch(f'{worker}.close_old_connections') as close, \
+                mock.patch('time.sleep', side_effect=[None, Stop]):
+            with self.assertRaises(Stop):
+                call_command('run_generation_worker', stdout=out)
+        self.assertEqual(claim.call_count, 2)
+        self.assertEqual(close.call_count, 2)
+        self.assertIn('database is locked', out.getvalue())
+
+    def test_job_is_claimed_once(self):
+        job = enqueue_generation(2025, 10)
+        self.assertEqual(claim_next_job().pk, job.pk)
+        self.assertIsNone(claim_next_job())
+
+    def test_stale_running_job_is_failed(self):
+        stale = enqueue_generation(2025, 9)
+        GenerationJob.objects.filter(pk=stale.pk).update(
+            status='running', started_at=timezone.now() - timedelta(hours=1),
+        )
+        job = enqueue_generation(2025, 10)
+        with self.settings(SHIFT_GENERATION_JOB_TIMEOUT=600):
+            self.assertEqual(claim_next_job().pk, job.pk)
+
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, 'failed')
+        self.assertIsNotNone(stale.finished_at)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'running')
+
+    def test_matrix_ignores_bad_job_id(self):
+        for value in ('abc', '-1', ''):
+            response = self.client.get(reverse('shift_matrix'), {'year': 2025, 'month': 10, 'job': value})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotContains(response, 'id="job-progress"')
+        job = enqueue_generation(2025, 10)
+        response = self.client.get(reverse('shift_matrix'), {'year': 2025, 'month': 10, 'job': job.pk})
+        self.assertContains(response, reverse('generation_job_status', args=[job.pk]))
+
+    def test_status_endpoint(self):
+        job = enqueue_generation(2025, 10)
+        data = self.client.get(reverse('generation_job_status', args=[job.pk])).json()
+        self.assertEqual(data['status'], 'queued')
+        self.assertEqual(data['percent'], 0)
+
+        self.assertEqual(self.client.get(reverse('generation_job_status', args=[job.pk + 1])).status_code, 404)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class PartialRegenerationTests(TestCase):
+    def setUp(self):
+        self.employees = make_employees(12)
+
+    def test_regenerate_range_keeps_other_days(self):
+        keep = Shift.objects.create(employee=self.employees[0], date=date(2025, 10, 1), time_range="9:00-17:00")
+        old = Shift.objects.create(employee=self.employees[0], date=date(2025, 10, 10), time_range="9:00-17:00")
+        regenerate_range(date(2025, 10, 8), date(2025, 10, 14), mode='random')
+
+        self.assertTrue(Shift.objects.filter(pk=keep.pk).exists())
+        self.assertFalse(Shift.objects.filter(pk=old.pk).exists())
+        dates = set(Shift.objects.exclude(pk=keep.pk).values_list('date', flat=True))
+        self.assertTrue(dates)
+        self.assertTrue(all(date(2025, 10, 8) <= d <= date(2025, 10, 14) for d in dates))
+
+    def test_previous_month_run_is_respected(self):
+        emp = self.employees[0]
+        Shift.objects.bulk_create([
+            Shift(employee=emp, date=date(2025, 9, d), time_range="9:00-17:00").fill_times()
+            for d in range(26, 31)
+        ])
+        for seed in range(5):
+            regenerate_range(date(2025, 10, 1), date(2025, 10, 3), seed=seed)
+            self.assertFalse(Shift.objects.filter(employee=emp, date=date(2025, 10, 1)).exists())
+
+    def test_requested_off_regenerates_only_affected_days(self):
+        emp = self.employees[0]
+        Shift.objects.create(employee=emp, date=date(2025, 10, 6), time_range="9:00-17:00")
+        other = Shift.objects.create(employee=emp, date=date(2025, 10, 20), time_range="9:00-17:00")
+        off = RequestedOff.objects.create(employee=emp, date=date(2025, 10, 6))
+        free = RequestedOff.objects.create(employee=emp, date=date(2025, 10, 7))
+
+        ranges = regenerate_for_requested_off([off, free])
+        self.assertEqual(ranges, [(date(2025, 10, 6), date(2025, 10, 6))])
+        self.assertFalse(Shift.objects.filter(employee=emp, date=date(2025, 10, 6)).exists())
+        self.assertTrue(Shift.objects.filter(pk=other.pk).exists())
+
+    def test_view_rejects_reversed_range(self):
+        response = self.client.post(reverse('shift_matrix'), {
+            'year': 2025, 'month': 10, 'regenerate_range': '1', 'start': '2025-10-10', 'end': '2025-10-01',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Shift.objects.exists())
+
+    def test_view_rejects_too_long_range(self):
+        make_employees(12)
+        with mock.patch('shifts.views.regenerate_range') as regenerate:
+            response = self.client.post(reverse('shift_matrix'), {
+                'year': 2025, 'month': 10, 'regenerate_range': '1', 'start': '2025-01-01', 'end': '2027-12-31',
+            }, follow=True)
+        regenerate.assert_not_called()
+        self.assertContains(response, "31 日まで")
+        self.assertFalse(Shift.objects.exists())
+
+
+@override_settings(CACHES=TEST_CACHES)
+class GenerateShiftsCommandTests(TestCase):
+    def test_generates_month_range(self):
+        make_employees(12)
+        out = io.StringIO()
+        call_command('generate_shifts', '2025-10', '2025-12', seed=1, stdout=out)
+
+        months = set(Shift.objects.values_list('date__month', flat=True))
+        self.assertEqual(months, {10, 11, 12})
+        self.assertIn('2025-11:', out.getvalue())
+
+    def test_rejects_bad_month(self):
+        with self.assertRaises(CommandError):
+            call_command('generate_shifts', '2025/10', stdout=io.StringIO())
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ImportShiftsCommandTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.existing = Employee.objects.create(name="山田", role='manager', hourly_rate=1000)
+
+    def write(self, name, text):
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def run_import(self, *paths, **options):
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_shifts', *paths, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_with_all_record_types(self):
+        path = self.write('data.csv', (
+            "type,name,role,hourly_rate,max_days,date,time_range\n"
+            "employee,佐藤,アルバイト,1200,20,,\n"
+            "employee,山田,,1500,,,\n"
+            "requested_off,佐藤,,,,2025/10/03,\n"
+            "shift,佐藤,,,,2025-10-01,9:00-17:00\n"
+            "shift,山田,,,,2025-10-01,13:00-21:00\n"
+            "shift,鈴木,,,,2025-10-02,9:00-17:00\n"
+            "shift,佐藤,,,,2025-10-02,25:00-26:00\n"
+            "holiday,佐藤,,,,2025-10-02,\n"
+            "employee,高橋,,9999.999,,,\n"
+            "employee,高橋,,NaN,,,\n"
+            "employee,高橋,,,inf,,\n"
+        ))
+        errors = os.path.join(self.dir.name, 'errors.csv')
+        out, err = self.run_import(path, errors=errors)
+
+        sato = Employee.objects.get(name="佐藤")
+        self.assertEqual((sato.role, sato.hourly_rate, sato.max_days), ('part', 1200, 20))
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.hourly_rate, 1500)
+        self.assertEqual(
+            set(RequestedOff.objects.filter(employee=sato).values_list('date', flat=True)),
+            {date(2025, 10, 3)},
+        )
+        self.assertEqual(list(sato.holidays.values_list('date', flat=True)), [date(2025, 10, 2)])
+        self.assertFalse(Employee.objects.filter(name="高橋").exists())
+        self.assertEqual(
+            set(Shift.objects.values_list('employee__name', 'date', 'time_range')),
+            {("佐藤", date(2025, 10, 1), "9:00-17:00"), ("山田", date(2025, 10, 1), "13:00-21:00")},
+        )
+        self.assertEqual(check_summaries(date(2025, 10, 1), date(2025, 10, 31)), [])
+        self.assertEqual(check_coverage(date(2025, 10, 1), date(2025, 10, 31)), [])
+        # 時給の変更は給与にも反映する
+        summary = MonthlyEmployeeSummary.objects.get(employee=self.existing, year=2025, month=10)
+        self.assertEqual(summary.pay, 8 * 1500)
+
+        self.assertIn('5 errors', out)
+        self.assertIn('data.csv:7: 従業員が見つかりません: 鈴木', err)
+        with open(errors, encoding='utf-8-sig') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], 'file,line,error')
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], ['7', '8', '10', '11', '12'])
+
+    def test_reimport_replaces_shifts(self):
+        Shift.objects.create(employee=self.existing, date=date(2025, 10, 1), time_range="9:00-17:00")
+        Shift.objects.create(employee=self.existing, date=date(2025, 10, 2), time_range="9:00-17:00")
+        path = self.write('shifts.csv', (
+            "name,date,time_range\n"
+            "山田,2025-10-01,13:00-21:00\n"
+            "山田,2025-10-02,休\n"
+        ))
+        out, _ = self.run_import(path, type='shift')
+
+        self.assertEqual(
+            list(Shift.objects.values_list('date', 'time_range')), [(date(2025, 10, 1), "13:00-21:00")],
+        )
+        self.assertIn('(2 replaced)', out)
+        self.assertEqual(check_summaries(date(2025, 10, 1), date(2025, 10, 31)), [])
+        self.assertEqual(check_coverage(date(2025, 10, 1), date(2025, 10, 31)), [])
+
+    def test_json_lines_and_array(self):
+        lines = self.write('data.jsonl', (
+            '{"type": "employee", "name": "佐藤", "role": "part"}\n'
+            '\n'
+            '{"type": "shift", "name": "佐藤", "date": "2025-10-01", "time_range": "9:00-17:00"}\n'
+            '{broken\n'
+        ))
+        array = self.write('data.json', '[{"type": "requested_off", "name": "佐藤", "date": "2025-10-05"}]')
+        out, err = self.run_import(lines, array)
+
+        self.assertTrue(Shift.objects.filter(employee__name="佐藤", date=date(2025, 10, 1)).exists())
+        self.assertTrue(RequestedOff.objects.filter(employee__name="佐藤", date=date(2025, 10, 5)).exists())
+        self.assertIn('1 errors', out)
+        self.assertIn('data.jsonl:4:', err)
+
+    def test_xlsx_sheet_name_gives_type(self):
+        import openpyxl
+
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "従業員"
+        ws.append(["name", "role"])
+        ws.append(["佐藤", "正社員"])
+        ws = wb.create_sheet("シフト")
+        ws.append(["name", "date", "time_range"])
+        ws.append(["佐藤", date(2025, 10, 1), "11:00-19:00"])
+        path = os.path.join(self.dir.name, 'data.xlsx')
+        wb.save(path)
+
+        out, _ = self.run_import(path)
+        self.assertEqual(Employee.objects.get(name="佐藤").role, 'manager')
+        self.assertEqual(Shift.objects.get(employee__name="佐藤").date, date(2025, 10, 1))
+        self.assertIn('0 errors', out)
+
+    def test_strict_and_dry_run_roll_back(self):
+        path = self.write('data.csv', (
+            "type,name,date,time_range\n"
+            "shift,山田,2025-10-01,9:00-17:00\n"
+            "shift,鈴木,2025-10-01,9:00-17:00\n"
+        ))
+        with self.assertRaises(CommandError):
+            self.run_import(path, strict=True)
+        self.assertFalse(Shift.objects.exists())
+
+        out, _ = self.run_import(path, dry_run=True)
+        self.assertIn('[dry run]', out)
+        self.assertFalse(Shift.objects.exists())
+        self.assertFalse(MonthlyEmployeeSummary.objects.exists())
+
+    def test_rejects_unknown_file_type(self):
+        with self.assertRaises(CommandError):
+            self.run_import(self.write('data.txt', 'name\n'))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ShiftMatrixViewTests(TestCase):
+    def setUp(self):
+        # 行のバージョンと HTML のキャッシュを前のテストから持ち越さない
+        cache.clear()
+        caches['matrix_rows'].clear()
+        self.employees = make_employees(3)
+
+    def get_matrix(self, year=2025, month=10):
+        return self.client.get(reverse('shift_matrix'), {'year': year, 'month': month})
+
+    def test_rows_hours_and_attendance(self):
+        emp = self.employees[0]
+        Shift.objects.create(employee=emp, date=date(2025, 10, 1), time_range="9:00-17:00")
+        Shift.objects.create(employee=emp, date=date(2025, 10, 2), time_range="13:00-21:00")
+        Shift.objects.create(employee=self.employees[1], date=date(2025, 10, 1), time_range="11:00-19:00")
+        Shift.objects.create(employee=emp, date=date(2025, 11, 1), time_range="9:00-17:00")
+
+        response = self.get_matrix()
+        rows = response.context['matrix_rows']
+        self.assertIn('16.0時間', rows[0])
+        self.assertIn('13:00-21:00', rows[0])
+        self.assertIn(self.employees[2].name, rows[2])
+        self.assertNotIn('shift-early', rows[2])
+        counts = response.context['attendance_counts']
+        self.assertEqual(counts[date(2025, 10, 1)], 2)
+        self.assertEqual(counts[date(2025, 10, 3)], 0)
+
+    def test_query_count_does_not_grow_with_roster(self):
+        def matrix_queries():
+            with CaptureQueriesContext(connection) as ctx:
+                self.get_matrix()
+            return len(ctx.captured_queries)
+
+        small = matrix_queries()
+        for emp in make_employees(30):
+            Shift.objects.create(employee=emp, date=date(2025, 10, 5), time_range="9:00-17:00")
+        self.assertEqual(matrix_queries(), small)
+        self.assertLessEqual(small, 4)  # 従業員・シフト・出勤人数・必要人数
+
+    def test_rows_rerender_only_when_employee_shifts_change(self):
+        self.get_matrix()
+        with mock.patch('shifts.matrix.build_shift_matrix', wraps=build_shift_matrix) as build:
+            self.get_matrix()
+            build.assert_not_called()
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Shift.objects.create(employee=self.employees[1], date=date(2025, 10, 3), time_range="9:00-17:00")
+            response = self.get_matrix()
+        self.assertEqual([emp.id for emp in build.call_args.args[0]], [self.employees[1].id])
+        self.assertIn('9:00-17:00', response.context['matrix_rows'][1])
+        self.assertNotIn('9:00-17:00', response.context['matrix_rows'][0])
+
+    def test_evicted_row_version_does_not_reuse_old_row(self):
+        emp = self.employees[0]
+        # bulk_create ではシグナルが出ないので、従業員ごとの行のバージョンはまだ無い
+        Shift.objects.bulk_create([Shift(employee=emp, date=date(2025, 10, 3), time_range="9:00-17:00")])
+        self.assertIn('9:00-17:00', self.get_matrix().context['matrix_rows'][0])
+        with self.captureOnCommitCallbacks(execute=True):
+            Shift.objects.get(employee=emp).delete()
+        # 行のバージョンがキャッシュから追い出されても、前の HTML には戻らない
+        cache.delete(ROW_VERSION_KEY.format(emp.id, 2025, 10))
+        self.assertNotIn('9:00-17:00', self.get_matrix().context['matrix_rows'][0])
+
+    def test_schedule_save_rerenders_month(self):
+        self.get_matrix()
+        self.get_matrix(month=11)
+        with self.captureOnCommitCallbacks(execute=True):
+            regenerate_range(date(2025, 10, 1), date(2025, 10, 3))
+        with mock.patch('shifts.matrix.build_shift_matrix', wraps=build_shift_matrix) as build:
+            self.get_matrix()
+            self.get_matrix(month=11)
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(len(build.call_args.args[0]), 3)
+
+    def test_employee_change_rerenders_rows(self):
+        self.get_matrix()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.employees[0].name = "山田"
+            self.employees[0].save()
+        self.assertIn("山田", self.get_matrix().context['matrix_rows'][0])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class VirtualMatrixTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['matrix_rows'].clear()
+        self.part = Employee.objects.create(name="佐藤", role='part')
+        self.manager = Employee.objects.create(name="山田", role='manager')
+        self.staff = Employee.objects.create(name="鈴木", role='staff')
+        Shift.objects.create(employee=self.part, date=date(2025, 10, 2), time_range="13:00-21:00")
+
+    def get_rows(self, **params):
+        return self.client.get(reverse('shift_matrix_rows', args=[2025, 10]), params)
+
+    def test_page_renders_header_only(self):
+        def page_queries():
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse('shift_matrix'), {'year': 2025, 'month': 10, 'view': 'virtual'})
+            return response, len(ctx.captured_queries)
+
+        response, small = page_queries()
+        self.assertEqual(response.context['matrix_rows'], [])
+        self.assertEqual(response.context['employee_count'], 3)
+        self.assertContains(response, reverse('shift_matrix_rows', args=[2025, 10]))
+        self.assertNotContains(response, "佐藤")
+
+        make_employees(30)
+        self.assertEqual(page_queries()[1], small)
+
+    def test_rows_paginated_by_role_then_id(self):
+        data = self.get_rows(offset=0, limit=2).json()
+        self.assertEqual(data['total'], 3)
+        self.assertEqual(len(data['rows']), 2)
+        self.assertIn("山田", data['rows'][0])
+        self.assertIn("鈴木", data['rows'][1])
+
+        data = self.get_rows(offset=2, limit=2).json()
+        self.assertEqual(len(data['rows']), 1)
+        self.assertIn("13:00-21:00", data['rows'][0])
+        self.assertEqual(self.get_rows(offset=10).json()['rows'], [])
+        self.assertEqual(self.get_rows(offset='x').status_code, 400)
+
+    def test_rows_not_modified(self):
+        first = self.get_rows(offset=0)
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                reverse('shift_matrix_rows', args=[2025, 10]), {'offset': 0}, HTTP_IF_NONE_MATCH=first['ETag'],
+            )
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ShiftMonthApiTests(TestCase):
+    def setUp(self):
+        self.part = Employee.objects.create(name="佐藤", role='part')
+        self.manager = Employee.objects.create(name="山田", role='manager')
+        Shift.objects.create(employee=self.part, date=date(2025, 10, 2), time_range="13:00-21:00")
+        Shift.objects.create(employee=self.manager, date=date(2025, 10, 1), time_range="9:00-17:00")
+        Shift.objects.create(employee=self.manager, date=date(2025, 10, 31), time_range="11:00-19:00")
+        Shift.objects.create(employee=self.manager, date=date(2025, 11, 1), time_range="11:00-19:00")
+        self.url = reverse('shift_month_api', args=[2025, 10])
+
+    def test_columnar_month_in_one_query(self):
+        with self.assertNumQueries(1):
+            data = self.client.get(self.url).json()
+        self.assertEqual(data['patterns'], ['', "9:00-17:00", "11:00-19:00", "13:00-21:00"])
+        self.assertEqual(data['employees'], {
+            'id': [self.manager.id, self.part.id], 'name': ["山田", "佐藤"], 'role': ['manager', 'part'],
+        })
+        self.assertEqual(data['shifts'], ['1' + '0' * 29 + '2', '03' + '0' * 29])
+        self.assertEqual(data['days'], 31)
+
+    def test_gzip_and_not_modified(self):
+        first = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Shift.objects.create(employee=self.part, date=date(2025, 10, 3), time_range="9:00-17:00")
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_bad_month(self):
+        self.assertEqual(self.client.get(reverse('shift_month_api', args=[2025, 13])).status_code, 404)
+
+
+class ShiftRowTagTests(SimpleTestCase):
+    def test_row_uses_class_table(self):
+        patterns = SHIFT_PATTERNS + ['<b>10:00-18:00</b>']
+        emp = {'name': '<佐藤>', 'role': 'アルバイト', 'work_minutes': 435, 'codes': [1, 0, 3, 4]}
+        html = render_shift_row(emp, patterns)
+        self.assertTrue(html.startswith('<tr><td>'))
+        self.assertIn('&lt;佐藤&gt;', html)
+        self.assertIn('7.3時間', html)
+        self.assertIn('<td class="shift-early">9:00-17:00</td><td class="shift-holiday">休</td>'
+                      '<td class="shift-late">13:00-21:00</td>', html)
+        self.assertIn('<td class="shift-holiday">&lt;b&gt;10:00-18:00&lt;/b&gt;</td></tr>', html)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.emp = make_employees(2, hourly_rate=1000)[0]
+
+    def revalidate(self, url, params, response, queries=0):
+        with self.assertNumQueries(queries):
+            return self.client.get(url, params, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_matrix_not_modified_until_month_changes(self):
+        url, params = reverse('shift_matrix'), {'year': 2025, 'month': 10}
+        self.client.get(url, params)  # CSRF クッキーを受け取る（ETag に含まれる）
+        first = self.client.get(url, params)
+        self.assertIn('ETag', first)
+        self.assertIn('Last-Modified', first)
+        self.assertEqual(self.revalidate(url, params, first).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Shift.objects.create(employee=self.emp, date=date(2025, 11, 1), time_range="9:00-17:00")
+        self.assertEqual(self.revalidate(url, params, first).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RequestedOff.objects.create(employee=self.emp, date=date(2025, 10, 3))
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_requirement_change_invalidates_matrix(self):
+        url, params = reverse('shift_matrix'), {'year': 2025, 'month': 10}
+        self.client.get(url, params)
+        first = self.client.get(url, params)
+        self.assertEqual(self.revalidate(url, params, first).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            requirement = ShiftRequirement.objects.create(weekday=date(2025, 10, 1).weekday(), min_staff=2)
+        second = self.client.get(url, params, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertTrue({d['date']: d for d in second.context['month_days']}[date(2025, 10, 1)]['understaffed'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            requirement.delete()
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=second['ETag']).status_code, 200)
+
+    def test_employee_change_invalidates_every_month(self):
+        url, params = reverse('salary_view'), {'year': 2025, 'month': 10}
+        with mock.patch('shifts.charts.render_salary_chart', return_value='png'):
+            self.client.get(url, params)
+            first = self.client.get(url, params)
+            self.assertEqual(self.revalidate(url, params, first).status_code, 304)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.emp.name = "改名"
+                self.emp.save()
+            self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_exports_not_modified(self):
+        for url, params in [
+            (reverse('export_csv'), {'start': '2025-10-01', 'end': '2025-12-31'}),
+            (reverse('export_excel'), {'year': 2025, 'period': 'year'}),
+        ]:
+            first = self.client.get(url, params)
+            # データの無い月はバージョンを作らないので、そのたびに1回のクエリで確かめる
+            self.assertEqual(self.revalidate(url, params, first, queries=1).status_code, 304)
+
+    def test_schedule_save_invalidates_month(self):
+        url, params = reverse('export_csv'), {'year': 2025, 'month': 10}
+        first = self.client.get(url, params)
+        with self.captureOnCommitCallbacks(execute=True):
+            regenerate_range(date(2025, 10, 5), date(2025, 10, 6))
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class MonthlySummaryTests(TestCase):
+    def setUp(self):
+        self.emp = make_employees(1, hourly_rate=1200)[0]
+
+    def summary(self, year=2025, month=10):
+        return MonthlyEmployeeSummary.objects.filter(employee=self.emp, year=year, month=month).values_list(
+            'days_worked', 'minutes_worked', 'pay').first()
+
+    def test_shift_changes_update_summary(self):
+        shift = Shift.objects.create(employee=self.emp, date=date(2025, 10, 1), time_range="9:00-17:00")
+        Shift.objects.create(employee=self.emp, date=date(2025, 10, 2), time_range="13:00-21:00")
+        self.assertEqual(self.summary(), (2, 960, 19200))
+
+        shift.time_range = ""
+        shift.save()
+        self.assertEqual(self.summary(), (1, 480, 9600))
+
+        shift.time_range = "11:00-19:00"
+        shift.date = date(2025, 11, 3)
+        shift.save()
+        self.assertEqual(self.summary(), (1, 480, 9600))
+        self.assertEqual(self.summary(month=11), (1, 480, 9600))
+
+        shift.delete()
+        self.assertEqual(self.summary(month=11), (0, 0, 0))
+
+    def test_row_created_concurrently_is_added_to(self):
+        with created_concurrently(MonthlyEmployeeSummary, employee=self.emp, year=2025, month=10,
+                                  days_worked=1, minutes_worked=480):
+            apply_shift_change(self.emp.id, date(2025, 10, 2), 1, 480)
+        # 給与も足した後の勤務時間から計算する
+        self.assertEqual(self.summary(), (2, 960, 19200))
+
+    def test_rate_change_updates_pay(self):
+        Shift.objects.create(employee=self.emp, date=date(2025, 10, 1), time_range="9:00-17:00")
+        self.client.post(reverse('salary_view') + '?year=2025&month=10', {f'hourly_{self.emp.id}': '1500'})
+        self.assertEqual(self.summary(), (1, 480, 12000))
+
+        self.emp.hourly_rate = 1000
+        self.emp.save()
+        self.assertEqual(self.summary(), (1, 480, 8000))
+
+    def test_generation_rebuilds_and_command_checks(self):
+        make_employees(11)
+        regenerate_range(date(2025, 10, 1), date(2025, 10, 31))
+        self.assertEqual(check_summaries(date(2025, 10, 1), date(2025, 10, 31)), [])
+
+        MonthlyEmployeeSummary.objects.filter(year=2025, month=10).update(minutes_worked=1)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_summaries', '2025-10', check=True, stdout=io.StringIO())
+        keys = [MONTH_VERSION_KEY.format(2025, 10), MONTH_ROWS_VERSION_KEY.format(2025, 10)]
+        before = cache.get_many(keys)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rebuild_summaries', stdout=io.StringIO())
+        after = cache.get_many(keys)
+        self.assertEqual(set(after), set(keys))
+        self.assertFalse({key for key in keys if before.get(key) == after[key]})
+        call_command('rebuild_summaries', '2025-10', check=True, stdout=io.StringIO())
+
+    def test_salary_page_does_not_scan_shifts(self):
+        Shift.objects.create(employee=self.emp, date=date(2025, 10, 1), time_range="9:00-17:00")
+        with mock.patch('shifts.charts.render_salary_chart', return_value='png'):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse('salary_view'), {'year': 2025, 'month': 10})
+        self.assertEqual(response.context['employees'][0].work_minutes, 480)
+        self.assertFalse([q for q in ctx.captured_queries if 'shifts_shift' in q['sql']])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class DailyCoverageTests(TestCase):
+    def setUp(self):
+        self.emp = make_employees(1)[0]
+
+    def coverage(self):
+        return sorted(DailyCoverage.objects.filter(count__gt=0).values_list('date', 'time_range', 'role', 'count'))
+
+    def test_shift_changes_update_coverage(self):
+        shift = Shift.objects.create(employee=self.emp, date=date(2025, 10, 1), time_range="9:00-17:00")
+        Shift.objects.create(employee=make_employees(1, role='part')[0], date=date(2025, 10, 1), time_range="9:00-17:00")
+        self.assertEqual(self.coverage(), [
+            (date(2025, 10, 1), "9:00-17:00", 'part', 1),
+            (date(2025, 10, 1), "9:00-17:00", 'staff', 1),
+        ])
+
+        shift.time_range = "13:00-21:00"
+        shift.date = date(2025, 10, 2)
+        shift.save()
+        self.assertEqual(self.coverage(), [
+            (date(2025, 10, 1), "9:00-17:00", 'part', 1),
+            (date(2025, 10, 2), "13:00-21:00", 'staff', 1),
+        ])
+
+        self.emp.role = 'manager'
+        self.emp.save()
+        self.assertIn((date(2025, 10, 2), "13:00-21:00", 'manager', 1), self.coverage())
+
+        shift.delete()
+        self.assertEqual(self.coverage(), [(date(2025, 10, 1), "9:00-17:00", 'part', 1)])
+        self.assertEqual(check_coverage(date(2025, 10, 1), date(2025, 10, 31)), [])
+
+    def test_row_created_concurrently_is_added_to(self):
+        with created_concurrently(DailyCoverage, date=date(2025, 10, 1), time_range="9:00-17:00", role='staff',
+                                  count=1):
+            apply_coverage_change(date(2025, 10, 1), "9:00-17:00", 'staff', 1)
+        self.assertEqual(self.coverage(), [(date(2025, 10, 1), "9:00-17:00", 'staff', 2)])
+
+    def test_generation_rebuilds_and_command_checks(self):
+        make_employees(11)
+        regenerate_range(date(2025, 10, 1), date(2025, 10, 31))
+        self.assertEqual(check_coverage(date(2025, 10, 1), date(2025, 10, 31)), [])
+
+        DailyCoverage.objects.filter(date=date(2025, 10, 1)).delete()
+        with self.assertRaises(CommandError):
+            call_command('rebuild_summaries', '2025-10', check=True, stdout=io.StringIO())
+        call_command('rebuild_summaries', '2025-10', stdout=io.StringIO())
+        call_command('rebuild_summaries', '2025-10', check=True, stdout=io.StringIO())
+
+    def test_matrix_marks_understaffed_days(self):
+        ShiftRequirement.objects.create(weekday=date(2025, 10, 1).weekday(), min_staff=2)
+        Shift.objects.create(employee=self.emp, date=date(2025, 10, 1), time_range="9:00-17:00")
+        response = self.client.get(reverse('shift_matrix'), {'year': 2025, 'month': 10})
+        days = {d['date']: d for d in response.context['month_days']}
+        self.assertTrue(days[date(2025, 10, 1)]['understaffed'])
+        self.assertFalse(days[date(2025, 10, 2)]['understaffed'])
+        self.assertEqual(response.context['attendance_counts'][date(2025, 10, 1)], 1)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ShiftTimesTests(TestCase):
+    def test_save_fills_times(self):
+        emp = make_employees(1)[0]
+        shift = Shift.objects.create(employee=emp, date=date(2025, 10, 1), time_range="11:00-19:00")
+        shift.refresh_from_db()
+        self.assertEqual((shift.start_time.hour, shift.end_time.hour, shift.duration_minutes), (11, 19, 480))
+
+        shift.time_range = ''
+        shift.save(update_fields=['time_range'])
+        shift.refresh_from_db()
+        self.assertEqual((shift.start_time, shift.duration_minutes), (None, 0))
+
+    def test_salary_uses_stored_minutes(self):
+        emp = make_employees(1, hourly_rate=1000)[0]
+        Shift.objects.create(employee=emp, date=date(2025, 10, 1), time_range="9:00-17:00")
+        Shift.objects.create(employee=emp, date=date(2025, 10, 2), time_range="13:00-21:00")
+        Shift.objects.create(employee=emp, date=date(2025, 9, 30), time_range="13:00-21:00")
+
+        response = self.client.get(reverse('salary_view'), {'year': 2025, 'month': 10})
+        self.assertEqual(response.context['employees'][0].work_minutes, 960)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SalaryChartCacheTests(TestCase):
+    def setUp(self):
+        chart_cache.clear()
+        self.emp = make_employees(1, hourly_rate=1000)[0]
+
+    def get_salary(self):
+        return self.client.get(reverse('salary_view'), {'year': 2025, 'month': 10})
+
+    def test_chart_rendered_once_until_data_changes(self):
+        with mock.patch('shifts.charts.render_salary_chart', return_value='png') as render:
+            self.get_salary()
+            response = self.get_salary()
+            self.assertEqual(render.call_count, 1)
+            self.assertEqual(response.context['chart'], 'png')
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Shift.objects.create(employee=self.emp, date=date(2025, 10, 1), time_range="9:00-17:00")
+            self.get_salary()
+            self.assertEqual(render.call_count, 2)
+
+    def test_lru_evicts_oldest(self):
+        lru = LRUCache(maxsize=2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+
+
+class StartupTests(SimpleTestCase):
+    def test_heavy_modules_not_loaded_at_startup(self):
+        code = (
+            "import sys\n"
+            "import shift_manager.wsgi\n"
+            "from importlib import import_module\n"
+            "from django.conf import settings\n"
+            "import_module(settings.ROOT_URLCONF)\n"
+            "print(','.join(m for m in ('matplotlib', 'openpyxl', 'numpy') if m in sys.modules))\n"
+        )
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='shift_manager.settings', SHIFTS_PRELOAD='')
+        output = subprocess.run(
+            [sys.executable, '-c', code], cwd=settings.BASE_DIR, env=env,
+            capture_output=True, text=True, check=True,
+        ).stdout
+        self.assertEqual(output.strip(), '')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CsvExportTests(TestCase):
+    def setUp(self):
+        self.part = Employee.objects.create(name="佐藤", role='part')
+        self.manager = Employee.objects.create(name="山田", role='manager')
+        Shift.objects.create(employee=self.part, date=date(2025, 10, 2), time_range="13:00-21:00")
+        Shift.objects.create(employee=self.manager, date=date(2025, 10, 1), time_range="9:00-17:00")
+        Shift.objects.create(employee=self.manager, date=date(2025, 11, 1), time_range="11:00-19:00")
+
+    def get_csv(self, **params):
+        response = self.client.get(reverse('export_csv'), params)
+        return response, b''.join(response.streaming_content).decode('utf-8')
+
+    def test_month_export_keeps_format(self):
+        response, body = self.get_csv(year=2025, month=10)
+        lines = body.split('\n')
+        self.assertTrue(body.startswith('\ufeff名前,役職,1日(水),2日(木),3日(金)'))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename=shift_2025_10.csv')
+        self.assertTrue(lines[1].startswith('山田,正社員,9:00-17:00,休,休'))
+        self.assertTrue(lines[2].startswith('佐藤,アルバイト,休,13:00-21:00,休'))
+        self.assertEqual(len(lines[1].split(',')), 2 + 31)
+
+    def test_range_export_spans_months(self):
+        _, body = self.get_csv(start='2025-10-31', end='2025-11-01')
+        lines = body.split('\n')
+        self.assertEqual(lines[0], '\ufeff名前,役職,10月31日(金),11月1日(土)')
+        self.assertEqual(lines[1], '山田,正社員,休,11:00-19:00')
+
+    def test_query_count_is_constant(self):
+        for emp in make_employees(20):
+            Shift.objects.create(employee=emp, date=date(2025, 10, 3), time_range="9:00-17:00")
+        # バージョンの無い月にデータがあるかの確認・従業員・シフト
+        with self.assertNumQueries(3):
+            self.get_csv(start='2025-01-01', end='2025-12-31')
+
+    def test_bad_range(self):
+        response = self.client.get(reverse('export_csv'), {'start': '2025-10-05', 'end': '2025-10-01'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_range_longer_than_a_year(self):
+        response = self.client.get(reverse('export_csv'), {'start': '0001-01-01', 'end': '9999-12-31'})
+        self.assertEqual(response.status_code, 400)
+        response, _ = self.get_csv(start='2024-01-01', end='2024-12-31')  # うるう年の366日まで
+        self.assertEqual(response.status_code, 200)
+
+    def test_empty_months_get_no_version_keys(self):
+        cache.clear()
+        self.get_csv(start='2025-01-01', end='2025-12-31')
+        self.assertEqual(
+            set(cache.get_many([MONTH_VERSION_KEY.format(2025, month) for month in range(1, 13)])),
+            {MONTH_VERSION_KEY.format(2025, month) for month in (10, 11)},
+        )
+
+    def test_rows_skip_shifts_of_unlisted_employees(self):
+        # 従業員を読んだ後に増えた人のシフトがあっても、後ろの人の行がずれない
+        rows = list(iter_employee_rows(date_range(date(2025, 10, 1), date(2025, 10, 2)), employees=[self.part]))
+        self.assertEqual(rows[0][1], ["休", "13:00-21:00"])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ExcelExportTests(TestCase):
+    def setUp(self):
+        self.emp = Employee.objects.create(name="山田", role='manager', hourly_rate=1000)
+        Shift.objects.create(employee=self.emp, date=date(2025, 1, 2), time_range="9:00-17:00")
+        Shift.objects.create(employee=self.emp, date=date(2025, 10, 1), time_range="13:00-21:00")
+
+    def get_workbook(self, **params):
+        import openpyxl
+        response = self.client.get(reverse('export_excel'), params)
+        return openpyxl.load_workbook(io.BytesIO(response.content))
+
+    def test_month_export(self):
+        wb = self.get_workbook(year=2025, month=10)
+        self.assertEqual(wb.sheetnames, ["2025年10月シフト"])
+        rows = list(wb.active.values)
+        self.assertEqual(rows[0][:3], ("名前", "役職", "1日(水)"))
+        self.assertEqual(rows[1][:4], ("山田", "正社員", "13:00-21:00", "休"))
+
+    def test_year_export_has_month_sheets_and_summary(self):
+        make_employees(5)
+        with self.assertNumQueries(3):
+            self.client.get(reverse('export_excel'), {'year': 2025, 'period': 'year'})
+        wb = self.get_workbook(year=2025, period='year')
+        self.assertEqual(wb.sheetnames, [f"{m}月" for m in range(1, 13)] + ["集計"])
+        self.assertEqual(list(wb["1月"].values)[1][:4], ("山田", "正社員", "休", "9:00-17:00"))
+        summary = list(wb["集計"].values)
+        self.assertEqual(summary[0][-3:], ("勤務日数", "勤務時間", "給与"))
+        self.assertEqual(summary[1][-3:], (2, 16, 16000))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class HourlyRateUpdateTests(TestCase):
+    def setUp(self):
+        self.employees = make_employees(50, hourly_rate=1000)
+
+    def post_rates(self, rates):
+        data = {f"hourly_{emp.id}": "1000" for emp in self.employees}
+        data.update({f"hourly_{emp_id}": value for emp_id, value in rates.items()})
+        return self.client.post(reverse('salary_view') + '?year=2025&month=10', data)
+
+    def test_only_changed_rates_are_written(self):
+        target = self.employees[3]
+        with mock.patch('shifts.charts.render_salary_chart', return_value='png'):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.post_rates({target.id: "1250.7"})
+
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertLessEqual(len(ctx.captured_queries), 5)
+        target.refresh_from_db()
+        self.assertEqual(target.hourly_rate, 1250)
+        self.assertEqual(response.context['hourly_rates'][target.id], 1250)
+
+    def test_unchanged_form_writes_nothing(self):
+        with mock.patch('shifts.charts.render_salary_chart', return_value='png'):
+            with CaptureQueriesContext(connection) as ctx:
+                self.post_rates({})
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')])
+
+    def test_invalid_rate_becomes_zero(self):
+        with mock.patch('shifts.charts.render_salary_chart', return_value='png'):
+            self.post_rates({self.employees[0].id: "abc"})
+        self.employees[0].refresh_from_db()
+        self.assertEqual(self.employees[0].hourly_rate, 0)
+
+
+def month_problem(num_staff=12, year=2025, month=10, absences=None, **kwargs):
+    days = [date(year, month, d) for d in range(1, 32)]
+    staff = [StaffMember(i) for i in range(1, num_staff + 1)]
+    return Problem(days, staff, absences, shift_times=["9:00-17:00", "13:00-21:00"], **kwargs)
+
+
+class SchedulingEngineTests(SimpleTestCase):
+    def test_same_seed_same_schedule(self):
+        problem = month_problem()
+        first = generate(problem, seed=42).assignments
+        self.assertEqual(generate(problem, seed=42).assignments, first)
+
+    def test_respects_absences(self):
+        problem = month_problem(absences={1: {date(2025, 10, d) for d in range(1, 32)}})
+        worked = {a.employee_id for a in generate(problem, seed=1).assignments}
+        self.assertNotIn(1, worked)
+
+    def test_respects_consecutive_limit(self):
+        problem = month_problem(num_staff=3, rules=Rules(min_daily=3, max_daily=3, max_consecutive=2))
+        worked = {}
+        for a in generate(problem, seed=3).assignments:
+            worked.setdefault(a.employee_id, set()).add(a.date.toordinal())
+        for days in worked.values():
+            for day in days:
+                self.assertFalse({day + 1, day + 2} <= days)
+
+    def test_respects_max_days(self):
+        problem = month_problem(num_staff=8)
+        problem.staff = [StaffMember(s.id, max_days=5) for s in problem.staff]
+        counts = {}
+        for a in generate(problem, seed=5).assignments:
+            counts[a.employee_id] = counts.get(a.employee_id, 0) + 1
+        self.assertLessEqual(max(counts.values()), 5)
+
+    def test_vectorized_matches_random(self):
+        for seed in range(5):
+            problem = month_problem(
+                num_staff=10 + seed * 7,
+                absences={i: {date(2025, 10, i), date(2025, 10, i + 1)} for i in range(1, 20)},
+            )
+            problem.staff[0] = StaffMember(problem.staff[0].id, max_days=3)
+            self.assertEqual(
+                generate(problem, mode='vectorized', seed=seed).assignments,
+                generate(problem, mode='random', seed=seed).assignments,
+            )
+
+    def test_anneal_meets_requirements(self):
+        problem = month_problem(num_staff=20, requirements={d: 9 for d in range(7)})
+        result = generate(problem, mode='anneal', seed=1, time_budget=None, max_moves=50000)
+
+        self.assertLessEqual(result.score, result.info['initial_score'])
+        self.assertEqual(result.info['shortfall'], 0)
+        self.assertEqual(result.info['max_days_excess'], 0)
+        per_day = {}
+        for a in result.assignments:
+            per_day[a.date] = per_day.get(a.date, 0) + 1
+        self.assertTrue(all(per_day.get(d, 0) >= 9 for d in problem.days))
+
+    def test_anneal_with_move_limit_is_reproducible(self):
+        problem = month_problem(num_staff=15)
+        first = generate(problem, mode='anneal', seed=7, time_budget=None, max_moves=20000)
+        second = generate(problem, mode='anneal', seed=7, time_budget=None, max_moves=20000)
+        self.assertEqual(first.assignments, second.assignments)
+        self.assertEqual(first.score, second.score)
+
+    def test_anneal_keeps_best_state_between_checkpoints(self):
+        problem = month_problem(num_staff=15)
+        visited = []
+
+        class RecordingAnnealer(Annealer):
+            def apply(self, i, j, p):
+                super().apply(i, j, p)
+                # 交代の途中（p=0 の片側だけ当てた状態）は実際には訪れない状態なので記録しない
+                if p:
+                    visited.append(self.score())
+
+        annealer = RecordingAnnealer(problem)
+        annealer.load(generate(problem, seed=3).assignments)
+        visited.clear()
+        annealer.run(random.Random(3), time_budget=None, max_moves=3000,
+                     start_temperature=50.0, end_temperature=50.0)
+        self.assertLessEqual(annealer.score(), min(visited) + 1e-6)
+
+    def test_flow_meets_requirements_and_limits(self):
+        problem = month_problem(
+            num_staff=12,
+            requirements={d: 5 for d in range(7)},
+            absences={1: {date(2025, 10, d) for d in range(1, 11)}},
+        )
+        result = generate(problem, mode='flow', seed=1)
+        self.assertTrue(result.info['feasible'])
+
+        per_day, worked = {}, {}
+        for a in result.assignments:
+            per_day[a.date] = per_day.get(a.date, 0) + 1
+            worked.setdefault(a.employee_id, set()).add(a.date.toordinal())
+        self.assertTrue(all(per_day[d] == 5 for d in problem.days))
+        self.assertFalse({d for d in worked.get(1, ()) if d < date(2025, 10, 11).toordinal()})
+        for days in worked.values():
+            self.assertLessEqual(len(days), 22)
+            for day in days:
+                self.assertFalse(set(range(day, day + 6)) <= days)
+
+    def test_flow_rest_blocks_bound_runs_across_boundaries(self):
+        # 月末の短い区間・前後の確定シフトの連勤も含めて、区間の上限どおりのどの働き方でも上限を超えない
+        days = [date(2025, 10, 27) + timedelta(days=n) for n in range(8)]
+        for max_consecutive in range(1, 7):
+            for before in range(max_consecutive + 1):
+                for after in range(max_consecutive + 1):
+                    for parity in (0, 1):
+                        blocks = rest_blocks(days, max_consecutive, before, after, parity)
+                        for mask in range(1 << len(days)):
+                            if any(bin(mask >> start & ((1 << (end - start)) - 1)).count('1') > cap
+                                   for start, end, cap in blocks):
+                                continue
+                            pattern = '1' * before + format(mask, f'0{len(days)}b')[::-1] + '1' * after
+                            self.assertLessEqual(max(map(len, pattern.split('0'))), max_consecutive)
+
+        # 1か月を作る時は、どの日も誰かが働ける
+        october = [date(2025, 10, d) for d in range(1, 32)]
+        for max_consecutive in range(2, 7):
+            self.assertTrue(all(cap for _, _, cap in rest_blocks(october, max_consecutive)))
+
+    def test_flow_without_consecutive_days(self):
+        # max_consecutive=1: 2日続けて働く人がいないこと（前月末の確定シフトからの連勤も含む）
+        problem = month_problem(
+            num_staff=12,
+            requirements={d: 3 for d in range(7)},
+            rules=Rules(max_consecutive=1),
+            fixed_shifts={1: {date(2025, 9, 30)}},
+        )
+        result = generate(problem, mode='flow', seed=1)
+        self.assertTrue(result.info['feasible'])
+        worked = {(a.employee_id, a.date.toordinal()) for a in result.assignments}
+        self.assertNotIn((1, date(2025, 10, 1).toordinal()), worked)
+        self.assertFalse({(e, d) for e, d in worked if (e, d + 1) in worked})
+
+        # 1日おきにしか働けないので、足りない時は feasible にしない
+        problem = month_problem(num_staff=2, requirements={d: 2 for d in range(7)}, rules=Rules(max_consecutive=1))
+        result = generate(problem, mode='flow', seed=1)
+        self.assertFalse(result.info['feasible'])
+        worked = {(a.employee_id, a.date.toordinal()) for a in result.assignments}
+        self.assertFalse({(e, d) for e, d in worked if (e, d + 1) in worked})
+
+    def test_flow_reports_infeasible_days(self):
+        problem = month_problem(
+            num_staff=3,
+            requirements={d: 2 for d in range(7)},
+            absences={1: {date(2025, 10, 5)}, 2: {date(2025, 10, 5)}},
+        )
+        result = generate(problem, mode='flow', seed=1)
+        self.assertFalse(result.info['feasible'])
+        self.assertEqual(result.info['shortfall'], {date(2025, 10, 5): 1})
+        self.assertEqual(result.info['available'], {date(2025, 10, 5): 1})
+
+    def test_fixed_shifts_carry_over(self):
+        rules = Rules(min_daily=4, max_daily=4, max_consecutive=5)
+        days = [date(2025, 10, d) for d in range(10, 16)]
+        staff = [StaffMember(i, max_days=22) for i in range(1, 7)]
+        staff[1] = StaffMember(2, max_days=3)
+        fixed = {
+            1: {date(2025, 10, d) for d in range(5, 10)},   # 直前に5連勤
+            2: {date(2025, 10, d) for d in (1, 2, 3)},      # 月の上限まで勤務済み
+            3: {date(2025, 10, d) for d in range(16, 21)},  # 直後に5連勤
+        }
+        for mode in ('random', 'vectorized', 'flow', 'anneal', 'best'):
+            problem = Problem(days, staff, shift_times=["9:00-17:00"], rules=rules, fixed_shifts=fixed)
+            result = generate(problem, mode=mode, seed=2, time_budget=None, max_moves=20000)
+            worked = {(a.employee_id, a.date) for a in result.assignments}
+            self.assertNotIn((1, date(2025, 10, 10)), worked)
+            self.assertNotIn((3, date(2025, 10, 15)), worked)
+            # anneal は勤務日数の超過をペナルティとして扱うので、超えた場合はその日数がスコアに入っていること
+            self.assertEqual(len({d for e, d in worked if e == 2}), result.info.get('max_days_excess', 0))
+
+    def test_months_in_parallel_respect_boundaries(self):
+        days = [date(2025, 9, 20) + timedelta(days=n) for n in range(40)]
+        staff = [StaffMember(i) for i in range(1, 5)]
+        problem = Problem(days, staff, shift_times=["9:00-17:00"],
+                          rules=Rules(min_daily=3, max_daily=3, max_consecutive=2))
+
+        serial, _ = generate_months(problem, seed=4, workers=1)
+        parallel, _ = generate_months(problem, seed=4, workers=2)
+        self.assertEqual([r.assignments for _, r, _ in parallel], [r.assignments for _, r, _ in serial])
+
+        worked = {}
+        for _, result, _ in serial:
+            for a in result.assignments:
+                worked.setdefault(a.employee_id, set()).add(a.date.toordinal())
+        for ordinals in worked.values():
+            for day in ordinals:
+                self.assertFalse({day + 1, day + 2} <= ordinals)
+
+    def test_first_month_boundary_is_fixed_against_previous_shifts(self):
+        days = [date(2025, 10, d) for d in range(1, 32)]
+        staff = [StaffMember(i) for i in range(1, 5)]
+        fixed = {1: {date(2025, 9, d) for d in range(26, 31)}}  # 前月末に5連勤（DB のシフト）
+        problem = Problem(days, staff, shift_times=["9:00-17:00"],
+                          rules=Rules(min_daily=2, max_daily=2, max_consecutive=5), fixed_shifts=fixed)
+        result = generate(problem, mode='flow', seed=1)
+        result.assignments.append(Assignment(1, date(2025, 10, 1), "9:00-17:00"))
+
+        with mock.patch('shifts.scheduling.batch.generate', wraps=generate) as patched:
+            self.assertEqual(fix_boundary(problem, [], result, mode='flow', seed=1), 5)
+        self.assertEqual(patched.call_args.kwargs['mode'], 'flow')
+        self.assertNotIn((1, date(2025, 10, 1)), {(a.employee_id, a.date) for a in result.assignments})
+
+    def test_best_of_candidates_is_reproducible(self):
+        problem = month_problem(num_staff=15, requirements={d: 7 for d in range(7)})
+        result = generate(problem, mode='best', seed=3, candidates=6)
+
+        self.assertEqual(result.info['candidates'], 6)
+        self.assertEqual(result.score, min(result.info['candidate_scores']))
+        again = generate(problem, mode='random', seed=result.seed)
+        self.assertEqual(again.assignments, result.assignments)
+        parallel = generate(problem, mode='best', seed=3, candidates=6, workers=2)
+        self.assertEqual((parallel.seed, parallel.assignments), (result.seed, result.assignments))
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            generate(month_problem(), mode='nope')
@@ -1,26 +1,79 @@
 from django.shortcuts import render, redirect
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.urls import reverse
-from .models import Employee, Shift
-from datetime import date, timedelta
+from django.conf import settings
+from django.contrib import messages
+from django.db import transaction
+from django.db.models import F, FilteredRelation, Q
+from django.db.models.functions import Coalesce
+from django.views.decorators.gzip import gzip_page
+from .cache import bump_employee_version
+from .conditional import (
+    conditional_on_months, month_from_params, month_from_url, months_for_export, months_for_matrix,
+)
+from .exports import WEEK_NAMES, date_range, iter_csv, parse_export_range, shift_workbook
+from .jobs import enqueue_generation, generate_now, parse_regenerate_range, regenerate_range, shortfall_message
+from .matrix import month_columns, render_matrix_rows
+from .models import Employee, GenerationJob
+from .summaries import coverage_counts, monthly_pay, refresh_pay, understaffed_days
+from datetime import date
 import calendar
-import random
-import openpyxl
-import csv
-import io  # メモリ上でファイルのようにデータを扱うためのモジュール
-import base64  # バイナリデータ(画像やファイルなど)を文字列に変換して、テキストとして扱えるようにする
-import matplotlib
-matplotlib.use('Agg')  # 画面に表示せず画像だけ作るモード
-import matplotlib.pyplot as plt
-import japanize_matplotlib
-
-WEEK_NAMES = ['月', '火', '水', '木', '金', '土', '日']
-SHIFT_TIMES = ["9:00-17:00", "11:00-19:00", "13:00-21:00"]
+
+
+# API の JSON は空白を入れず、日本語もそのまま出す
+COMPACT_JSON = {'separators': (',', ':'), 'ensure_ascii': False}
+
+# ?view=virtual のシフト表で、1回に読み込む行数（と上限）
+ROW_BLOCK_SIZE = getattr(settings, 'SHIFT_MATRIX_ROW_BLOCK_SIZE', 50)
+MAX_ROW_BLOCK_SIZE = 200
+
+def employees_with_work_minutes(year, month):
+    """従業員ごとにその月の勤務時間（分）と給与を work_minutes・pay として付けて返す
+
+    シフトは数えず、月ごとの集計（MonthlyEmployeeSummary）を1行ずつ結合するだけなので、
+    読む行数は従業員数に比例する。
+    """
+    return Employee.objects.annotate(
+        summary=FilteredRelation(
+            'monthly_summaries', condition=Q(monthly_summaries__year=year, monthly_summaries__month=month),
+        ),
+        work_minutes=Coalesce(F('summary__minutes_worked'), 0),
+        pay=Coalesce(F('summary__pay'), 0),
+    ).order_by('id')
+
+
+def update_hourly_rates(employees, data):
+    """フォームの時給（hourly_<ID>）と今の値を比べ、変わった従業員だけ1回の UPDATE で保存する
+
+    employees のオブジェクトも新しい値に書き換える。変更した従業員のリストを返す。
+    """
+    changed = []
+    for emp in employees:
+        key = f"hourly_{emp.id}"
+        if key not in data:
+            continue
+        try:
+            rate = int(float(data[key]))
+        except (ValueError, OverflowError):
+            rate = 0
+        if emp.hourly_rate is None or emp.hourly_rate != rate:
+            emp.hourly_rate = rate
+            changed.append(emp)
+
+    if changed:
+        with transaction.atomic():
+            Employee.objects.bulk_update(changed, ['hourly_rate'])
+            refresh_pay(changed)  # bulk_update ではシグナルが出ないため
+            bump_employee_version()
+    return changed
+
 
 def index(request):
     return render(request, 'index.html')
 
 # ✅　シフト表ページを表示・自動生成する処理
+# （データが変わっていなければ 304 を返す）
+@conditional_on_months(months_for_matrix, per_user=True)
 def shift_matrix_view(request):
     today = date.today()
     # 年月取得
@@ -43,122 +96,73 @@ def shift_matrix_view(request):
     prev_month, prev_year = (month-1, year) if month > 1 else (12, year-1)
     next_month, next_year = (month+1, year) if month < 12 else (1, year+1)
 
-    # 従業員
-    employees = list(Employee.objects.all())
-    employees.sort(key=lambda e: e.role_order())
-
     # =====================================
     # ✅　シフト自動生成ボタンを押した時の処理
     # =====================================
     if request.method == 'POST' and 'auto_generate' in request.POST:
-        Shift.objects.filter(date__year=year, date__month=month).delete()
-
-        emp_last_worked = {emp.id: None for emp in employees} # 最後に勤務した日
-        emp_consecutive = {emp.id: 0 for emp in employees} # 連続勤務日数
-        emp_assigned_count = {emp.id: 0 for emp in employees} # 割り当て回数
-
-        # ✅ 1日の最低/最大出勤人数 /最大連勤日数
-        min_daily = 6
-        max_daily = 10
-        MAX_CONSECUTIVE_DAYS = 5  # 5連勤までOK
-
-        # ✅ 日付を順番に処理(例：10/1日→2日→3日...)
-        for d in month_days:
-            available_emps = []
-            for emp in employees:
-                # 希望休は休み
-                if d in {off.date for off in emp.requested_off_dates.all()}:
-                    continue
-
-                last_day = emp_last_worked[emp.id]
-                consecutive = emp_consecutive[emp.id]
-
-                # 昨日も働いていたら+1、そうでなければリセット
-                if last_day == d - timedelta(days=1):
-                    consecutive += 1
-                else:
-                    consecutive = 1
-
-                # ✅ 設定した連勤可能日数以上の連勤防止
-                if consecutive > MAX_CONSECUTIVE_DAYS:
-                    continue
-
-                # まだOKなら候補へ
-                available_emps.append(emp)
-
-            # ✅ 土日は少し多めに(月曜を０から数えたら　土曜＝５，日曜＝６)
-            if d.weekday() >= 5:
-                min_daily_for_day = min_daily + 2
-                max_daily_for_day = max_daily + 2
-            else:
-                min_daily_for_day = min_daily
-                max_daily_for_day = max_daily
-
-            # ランダムに選ぶ
-            if available_emps:
-                num_to_assign = min(len(available_emps), random.randint(min_daily_for_day, max_daily_for_day))
-                chosen_emps = random.sample(available_emps, num_to_assign)
-            else:
-                chosen_emps = []
-
-            # 出勤登録 & カウント更新
-            for emp in chosen_emps:
-                Shift.objects.create(employee=emp, date=d, time_range=random.choice(SHIFT_TIMES))
-                emp_assigned_count[emp.id] += 1
-                if emp_last_worked[emp.id] == d - timedelta(days=1):
-                    emp_consecutive[emp.id] += 1
-                else:
-                    emp_consecutive[emp.id] = 1
-                emp_last_worked[emp.id] = d
-
-            # 働かなかった人は連勤リセット
-            chosen_ids = {e.id for e in chosen_emps}
-            for emp in employees:
-                if emp.id not in chosen_ids:
-                    if emp_last_worked[emp.id] and emp_last_worked[emp.id] == d - timedelta(days=1):
-                        emp_consecutive[emp.id] = 0
-
-        return redirect(f"{reverse('shift_matrix')}?year={year}&month={month}")
+        matrix_url = f"{reverse('shift_matrix')}?year={year}&month={month}"
+        if getattr(settings, 'SHIFT_GENERATION_ASYNC', False):
+            # ✅ ジョブを登録するだけですぐ戻る（生成は run_generation_worker が行う）
+            job = enqueue_generation(year, month)
+            return redirect(f"{matrix_url}&job={job.pk}")
+
+        # ✅ 生成してまとめて保存（失敗したら前のシフトに戻す）。結果はジョブとしても残す
+        result = generate_now(year, month)
+        if result.score is not None:
+            seed_text = f"、シード: {result.seed}" if result.info.get('candidates') else ""
+            messages.info(request, f"シフトを作成しました（スコア: {result.score}{seed_text}）")
+        warning = shortfall_message(result)
+        if warning:
+            messages.warning(request, warning)
+
+        return redirect(matrix_url)
+
+    # =====================================
+    # ✅　期間を指定して作り直す（ほかの日はそのまま）
+    # =====================================
+    if request.method == 'POST' and 'regenerate_range' in request.POST:
+        matrix_url = f"{reverse('shift_matrix')}?year={year}&month={month}"
+        try:
+            start, end = parse_regenerate_range(request.POST)
+            result = regenerate_range(start, end)
+        except ValueError as exc:
+            messages.error(request, f"期間の指定が正しくありません: {exc}")
+            return redirect(matrix_url)
+        messages.info(request, f"{start:%m/%d}〜{end:%m/%d} のシフトを作り直しました（{len(result)}件）")
+        warning = shortfall_message(result)
+        if warning:
+            messages.warning(request, warning)
+        return redirect(matrix_url)
 
     # ==============================
     # シフト表作成
     # ==============================
-    shift_matrix = []
-    for emp in employees:
-        emp_shift_qs = emp.shifts.filter(date__month=month, date__year=year)
-        total_hours = 0
-        for s in emp_shift_qs:
-            if s.time_range:
-                start, end = s.time_range.split('-')
-                sh, sm = map(int, start.split(':'))
-                eh, em = map(int, end.split(':'))
-                total_hours += (eh + em/60) - (sh + sm/60)
-
-        emp_shifts = {s.date: s.time_range for s in emp_shift_qs}
-        emp_row = {
-            'id': emp.id,
-            'name': emp.name,
-            'role': emp.get_role_display(),
-            'work_hours': total_hours,
-            'shifts': []
-        }
-
-        for d in month_days:
-            emp_row['shifts'].append({
-                'date': d,
-                'is_weekend': d.weekday() >= 5,
-                'time_range': emp_shifts.get(d, '')
-            })
-
-        shift_matrix.append(emp_row)
-
-    attendance_counts = {
-        d: Shift.objects.filter(date=d).exclude(time_range='').count()
-        for d in month_days
-    }
+    # ✅ ?view=virtual ではヘッダーだけ描き、行は画面に見える分だけ shift_matrix_rows から読む
+    virtual = request.GET.get('view') == 'virtual'
+    if virtual:
+        matrix_rows = []
+        employee_count = Employee.objects.count()
+    else:
+        # ✅ 行は従業員ごとにキャッシュし、シフトが変わった人の行だけ描き直す
+        employees = list(employees_with_work_minutes(year, month))
+        employees.sort(key=lambda e: e.role_order())
+        matrix_rows = render_matrix_rows(employees, month_days)
+        employee_count = len(employees)
+
+    # ✅ 出勤人数は DailyCoverage を1回読むだけ（最低人数に足りない日は色を変える）
+    attendance_counts = coverage_counts(month_days[0], month_days[-1])
+    understaffed = understaffed_days(attendance_counts)
+    for d in header_days:
+        d['understaffed'] = d['date'] in understaffed
+
+    # ✅ 進捗を表示するジョブ（正の整数でなければ無視する）
+    try:
+        job_id = max(int(request.GET.get('job', '')), 0) or ''
+    except ValueError:
+        job_id = ''
 
     context = {
-        'shift_matrix': shift_matrix,
+        'matrix_rows': matrix_rows,
         'month_days': header_days,
         'year': year,
         'month': month,
@@ -167,38 +171,93 @@ def shift_matrix_view(request):
         'next_year': next_year,
         'next_month': next_month,
         'attendance_counts': attendance_counts,
+        'job_id': job_id,
+        'month_start': month_days[0],
+        'month_end': month_days[-1],
+        'virtual': virtual,
+        'employee_count': employee_count,
+        'row_block_size': ROW_BLOCK_SIZE,
     }
 
     return render(request, 'shifts/shift_matrix.html', context)
 
 
+@gzip_page
+@conditional_on_months(month_from_url)
+def shift_matrix_rows(request, year, month):
+    """シフト表の行を ?offset= から ?limit= 件、HTML の配列で返す（?view=virtual の画面から呼ばれる）
+
+    並び順は通常の表と同じ（役職順、同じ役職は ID 順）。行の HTML は通常の表と同じキャッシュを使う。
+    """
+    if not 1 <= month <= 12:
+        raise Http404("月が正しくありません")
+    try:
+        offset = max(0, int(request.GET.get('offset', 0)))
+        limit = min(max(1, int(request.GET.get('limit', ROW_BLOCK_SIZE))), MAX_ROW_BLOCK_SIZE)
+    except ValueError:
+        return HttpResponseBadRequest("offset・limit は整数で指定してください")
+
+    employees = list(
+        employees_with_work_minutes(year, month)
+        .order_by(Employee.role_order_expression(), 'id')[offset:offset + limit]
+    )
+    days = date_range(date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1]))
+    rows = render_matrix_rows(employees, days) if employees else []
+    return JsonResponse(
+        {'offset': offset, 'total': Employee.objects.count(), 'rows': rows},
+        json_dumps_params=COMPACT_JSON,
+    )
+
+
+# =========================
+# 自動作成ジョブの状態
+# =========================
+def generation_job_status(request, pk):
+    """ジョブの進捗を JSON で返す（画面から定期的に呼ばれる）"""
+    job = (
+        GenerationJob.objects.filter(pk=pk)
+        .values('id', 'year', 'month', 'mode', 'status', 'days_total', 'days_done', 'score', 'seed', 'message')
+        .first()
+    )
+    if job is None:
+        raise Http404("ジョブが見つかりません")
+    job['status_display'] = dict(GenerationJob.STATUS_CHOICES)[job['status']]
+    job['percent'] = int(100 * job['days_done'] / job['days_total']) if job['days_total'] else 0
+    return JsonResponse(job)
+
+
+# =========================
+# シフトの読み出し API（スマホ・キオスク端末用）
+# =========================
+@gzip_page
+@conditional_on_months(month_from_url)
+def shift_month_api(request, year, month):
+    """1か月分のシフトを列形式の JSON で返す（従業員の列・パターン表・従業員ごとのシフト文字列）"""
+    if not 1 <= month <= 12:
+        raise Http404("月が正しくありません")
+    return JsonResponse(month_columns(year, month), json_dumps_params=COMPACT_JSON)
+
+
 # =========================
 # Excel出力
 # =========================
+@conditional_on_months(months_for_export, create_empty=False)
 def export_excel(request):
+    """シフト表をExcelで出力（?period=year なら1年分を月ごとのシート＋集計シートで）"""
     today = date.today()
     year = int(request.GET.get('year', today.year))
-    month = int(request.GET.get('month', today.month))
-    num_days = calendar.monthrange(year, month)[1]
-    month_days = [date(year, month, d) for d in range(1, num_days + 1)]
-    employees = sorted(Employee.objects.all(), key=lambda e: e.role_order())
-
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = f"{year}年{month}月シフト"
-
-    headers = ["名前", "役職"] + [f"{d.day}日({WEEK_NAMES[d.weekday()]})" for d in month_days]
-    ws.append(headers)
 
-    for emp in employees:
-        row = [emp.name, emp.get_role_display()]
-        emp_shifts = {s.date: s.time_range for s in emp.shifts.filter(date__month=month, date__year=year)}
-        for d in month_days:
-            row.append(emp_shifts.get(d, "休"))
-        ws.append(row)
+    if request.GET.get('period') == 'year':
+        wb = shift_workbook(date_range(date(year, 1, 1), date(year, 12, 31)), summary=True)
+        filename = f"shift_{year}.xlsx"
+    else:
+        month = int(request.GET.get('month', today.month))
+        num_days = calendar.monthrange(year, month)[1]
+        wb = shift_workbook(date_range(date(year, month, 1), date(year, month, num_days)), f"{year}年{month}月シフト")
+        filename = f"shift_{year}_{month}.xlsx"
 
     response = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-    response['Content-Disposition'] = f'attachment; filename=shift_{year}_{month}.xlsx'
+    response['Content-Disposition'] = f'attachment; filename={filename}'
     wb.save(response)
     return response
 
@@ -206,97 +265,55 @@ def export_excel(request):
 # =========================
 # CSV出力
 # =========================
+@conditional_on_months(months_for_export, create_empty=False)
 def export_csv(request):
-    today = date.today()
-    year = int(request.GET.get('year', today.year))
-    month = int(request.GET.get('month', today.month))
-    num_days = calendar.monthrange(year, month)[1]
-    month_days = [date(year, month, d) for d in range(1, num_days + 1)]
-    employees = sorted(Employee.objects.all(), key=lambda e: e.role_order())
-
-    # UTF-8 BOM付き
-    response = HttpResponse(content_type='text/csv; charset=utf-8')
-    response['Content-Disposition'] = f'attachment; filename=shift_{year}_{month}.csv'
-    response.write('\ufeff')  # BOMを追加
-    writer = csv.writer(response, lineterminator='\n')
+    """シフト表をCSVで出力（?year=&month= か ?start=YYYY-MM-DD&end=YYYY-MM-DD）
 
-    # ヘッダ行
-    headers = ["名前", "役職"] + [f"{d.day}日({WEEK_NAMES[d.weekday()]})" for d in month_days]
-    writer.writerow(headers)
+    行ができた順にストリーミングで返すので、長い期間でもすぐにダウンロードが始まる。
+    """
+    try:
+        start, end = parse_export_range(request.GET)
+    except ValueError:
+        return HttpResponseBadRequest("期間の指定が正しくありません")
 
-    # データ行
-    for emp in employees:
-        row = [emp.name, emp.get_role_display()]
-        emp_shifts = {s.date: s.time_range for s in emp.shifts.filter(date__month=month, date__year=year)}
-        for d in month_days:
-            row.append(emp_shifts.get(d, "休"))
-        writer.writerow(row)
+    if 'start' in request.GET or 'end' in request.GET:
+        filename = f"shift_{start:%Y%m%d}_{end:%Y%m%d}.csv"
+    else:
+        filename = f"shift_{start.year}_{start.month}.csv"
 
+    # UTF-8 BOM付き
+    response = StreamingHttpResponse(iter_csv(date_range(start, end)), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename={filename}'
     return response
 
 
 # =========================
 # ✅ 給与グラフ表示
 # =========================
+@conditional_on_months(month_from_params, per_user=True)
 def salary_view(request):
     today = date.today()
     year = int(request.GET.get('year', today.year))
     month = int(request.GET.get('month', today.month))
-    employees = Employee.objects.all()
-    chart_base64 = None
+    employees = list(employees_with_work_minutes(year, month))
     hourly_rates = {}  # 従業員ごとの時給を保持する辞書
 
     # フォームがPOST送信された場合（時給の更新）
     if request.method == "POST":
-        for emp in employees:
-            rate_str = request.POST.get(f"hourly_{emp.id}", "")
-            try:
-                emp.hourly_rate = int(float(rate_str))
-            except ValueError:
-                emp.hourly_rate = 0
-            emp.save()
-
-        # 更新後の従業員情報を再取得
-        employees = Employee.objects.all()
+        # 変わった人だけまとめて更新し、読み込み済みの従業員をそのまま使う
+        update_hourly_rates(employees, request.POST)
 
     # グラフ用のデータを作成
     names, salaries = [], []
     for emp in employees:
-        total_hours = 0
-        emp_shifts = emp.shifts.filter(date__year=year, date__month=month)
-        for s in emp_shifts:
-            if s.time_range:  # 勤務時間を計算 （例："9:00-17:00"の場合）
-                # 「9:00-17:00」のような文字列を「-」で分けて、開始と終了の時刻に分解
-                start, end = s.time_range.split('-')
-                # さらに「9:00」→「9」と「0」に分けて、整数として取り出す
-                sh, sm = map(int, start.split(':'))  # sh: 開始時, sm: 開始分
-                eh, em = map(int, end.split(':'))  # eh: 終了時, em: 終了分
-                total_hours += (eh + em/60) - (sh + sm/60)
-
-        salary = int(round(float(total_hours) * float(emp.hourly_rate or 0)))
+        # 勤務時間は月ごとの集計から（時給はこの画面で変わることがあるので給与はここで計算）
+        salary = monthly_pay(emp.work_minutes, emp.hourly_rate)
         names.append(emp.name)
         salaries.append(salary)
 
-    # グラフ描画
-    plt.figure(figsize=(10, 6))
-    bars = plt.barh(names, salaries, color="#ffa94d")  # 横棒グラフ
-
-    # グラフのタイトル・軸ラベル
-    plt.title(f"{year}年{month}月の給与", fontsize=14)
-    plt.xlabel("金額（円）", fontsize=12)
-    plt.yticks(rotation=0, ha="right")
-
-    # 棒の横に給与金額を表示
-    for bar, value in zip(bars, salaries):
-        plt.text(value + 1000, bar.get_y() + bar.get_height()/2, f"{int(value):,}円", va='center', fontsize=10)
-
-    plt.tight_layout()
-    buf = io.BytesIO()  # 一時的なメモリ領域（仮のファイル）を作る
-    plt.savefig(buf, format='png')  # グラフをPNG画像としてメモリ上に保存
-    buf.seek(0)  # メモリ内の読み取り位置を先頭に戻す（最初から読むため）
-    chart_base64 = base64.b64encode(buf.read()).decode()  # 画像データをBase64形式の文字列に変換
-    buf.close()  # メモリ領域を閉じて片付ける
-    plt.close()  # グラフを閉じてメモリを解放する
+    # グラフ描画（同じ月・同じデータならキャッシュを使う）
+    from .charts import salary_chart  # matplotlib は重いので使う時だけ読み込む
+    chart_base64 = salary_chart(year, month, names, salaries)
 
     # 従業員の時給情報をテンプレート用に整形
     for emp in employees:
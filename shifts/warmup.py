@@ -0,0 +1,32 @@
+"""重いライブラリの事前読み込み
+
+ビューは matplotlib・openpyxl・numpy を使う時まで読み込まないので、ワーカーはすぐ起動できる。
+最初のグラフ表示や Excel 出力も速くしたい場合は SHIFTS_PRELOAD=1 にすると、
+起動後にバックグラウンドで読み込んでおく（gunicorn の post_fork フックなどから preload() を呼んでもよい）。
+"""
+import importlib
+import threading
+import time
+
+# 読み込んでおくモジュール（順番に読み込む）
+PRELOAD_MODULES = [
+    'openpyxl',
+    'numpy',
+    'shifts.charts',  # matplotlib と日本語フォント
+]
+
+
+def preload(modules=None):
+    """モジュールを読み込み、{モジュール名: 秒} を返す"""
+    timings = {}
+    for name in modules or PRELOAD_MODULES:
+        start = time.perf_counter()
+        importlib.import_module(name)
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+def preload_in_background(modules=None):
+    thread = threading.Thread(target=preload, args=(modules,), name='shifts-preload', daemon=True)
+    thread.start()
+    return thread